@@ -0,0 +1,156 @@
+from refprop_utils import *
+import refprop_utils
+import time
+import numpy as np
+
+# Mezcla de referencia de los benchmarks
+FLUIDO = ["PROPANE", "BUTANE"]
+MEZCLA = [0.5, 0.5]
+
+def puntos_saturados_ciclo(n_ciclos: int = 200) -> list[float]:
+    """
+    Los puntos saturados que calcula calcular_ciclo en cada ciclo: burbuja y rocío de la condensación
+    (desde T con Q = 0) y de la evaporación, con H / S de los cuatro puntos
+    """
+    resultados = []
+    for t_cond in np.linspace(25, 60, n_ciclos):
+        sat_k = estado_saturacion(FLUIDO, MEZCLA, T = t_cond)
+        sat_0 = estado_saturacion(FLUIDO, MEZCLA, T = t_cond - 40, Q = 1)
+        resultados.extend([sat_k.P, sat_0.T_rocio])
+        for punto in (*sat_k, *sat_0):
+            resultados.extend([punto.H, punto.S])
+    return resultados
+
+def curvas_saturadas(n_puntos: int = 60) -> list[float]:
+    """
+    Las curvas de líquido y vapor saturado de generar_curvas_saturadas (2 x n_puntos estados)
+    """
+    P_sat = np.geomspace(1, 35, n_puntos)
+    consulta = RPQuery(FLUIDO, "H", MEZCLA, "QP")
+    H_liq = consulta.calcular_array(0, P_sat)[0][:, 0]
+    H_vap = consulta.calcular_array(1, P_sat)[0][:, 0]
+    return H_liq.tolist() + H_vap.tolist()
+
+def medir(funcion, repeticiones: int = 3) -> tuple[float, list[float]]:
+    """
+    Mejor tiempo de varias repeticiones (s) y el resultado de la última
+    """
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor, resultado
+
+def benchmark_splines_saturacion() -> None:
+    """
+    Comparar los puntos saturados con el flash normal y con los splines de saturación (SATSPLN)
+    """
+    print("Splines de saturación (SATSPLN)")
+    if "sintetico" in refprop_utils.BACKEND or refprop_utils.BACKEND.startswith("reproducir"):
+        # El backend sintético no tiene splines (SATSPLNdll no hace nada) y la reproducción solo repite
+        # lo grabado: los dos tiempos miden el mismo cálculo
+        print(f"  Aviso: con el backend {refprop_utils.BACKEND} la mejora de los splines no es significativa, "
+              f"solo tiene sentido con el DLL de REFPROP")
+    for nombre, funcion in [("puntos saturados de calcular_ciclo", puntos_saturados_ciclo),
+                            ("curvas saturadas del diagrama P-H", curvas_saturadas)]:
+        # Volver a configurar la mezcla (SETUP) para descartar los splines de la vuelta anterior
+        CACHE_MEZCLAS.reiniciar()
+        activar_splines_saturacion(False)
+        t_flash, exactos = medir(funcion)
+
+        # La generación de los splines se cuenta aparte
+        activar_splines_saturacion(True)
+        inicio = time.perf_counter()
+        CACHE_MEZCLAS.cargar(";".join(FLUIDO), len(FLUIDO))
+        CACHE_MEZCLAS.cargar_splines(";".join(FLUIDO), MEZCLA)
+        t_generar = time.perf_counter() - inicio
+        t_splines, aproximados = medir(funcion)
+        activar_splines_saturacion(False)
+
+        diferencia = np.nanmax(np.abs(np.asarray(exactos) - np.asarray(aproximados)))
+        print(f"  {nombre}: flash {t_flash * 1e3:.1f} ms | splines {t_splines * 1e3:.1f} ms "
+              f"(+{t_generar * 1e3:.1f} ms al generarlos) | x{t_flash / t_splines:.1f} | "
+              f"diferencia máxima {diferencia:.2e}")
+
+def barrido_mezclas(n_composiciones: int = 5) -> list[tuple]:
+    """
+    Casos de un barrido binario como el de calcular_mezclas
+    """
+    casos = []
+    for par in (["PROPANE", "BUTANE"], ["PROPYLENE", "ISOBUTANE"], ["DME", "PROPANE"]):
+        for x in np.linspace(0.1, 0.9, n_composiciones):
+            casos.append((par, [round(x, 3), round(1 - x, 3)], "baja"))
+    return casos
+
+def benchmark_ciclo() -> None:
+    """
+    Tiempo de calcular_ciclo_basico de extremo a extremo, en serie y repartido en un pool de procesos
+    """
+    from ciclo_basico_binario import calcular_ciclo_basico, worker_calcular
+
+    casos = barrido_mezclas()
+    print(f"Barrido de {len(casos)} ciclos (calcular_ciclo_basico)")
+
+    inicio = time.perf_counter()
+    # El backend sintético cuenta sus llamadas (RP se lee del módulo, cambia en init_refprop)
+    llamadas = getattr(refprop_utils.RP, "llamadas", None)
+    for caso in casos:
+        calcular_ciclo_basico(*caso)
+    t_serie = time.perf_counter() - inicio
+    texto_llamadas = f" | {refprop_utils.RP.llamadas - llamadas} llamadas a REFPROPdll" if llamadas is not None else ""
+    print(f"  en serie: {t_serie:.2f} s ({t_serie / len(casos) * 1e3:.1f} ms por ciclo){texto_llamadas}")
+
+    inicio = time.perf_counter()
+    with crear_pool(compartir_cache = False) as pool:
+        list(pool.map(worker_calcular, casos))
+    t_pool = time.perf_counter() - inicio
+    print(f"  pool de procesos: {t_pool:.2f} s (x{t_serie / t_pool:.1f}, incluye arrancar los workers)")
+
+# Módulos pesados que no deberían cargarse solo por importar el código de cálculo
+MODULOS_PESADOS = ["numpy", "pandas", "openpyxl", "matplotlib", "tqdm", "ctREFPROP", "subprocess"]
+
+def benchmark_importacion(repeticiones: int = 5) -> None:
+    """
+    Tiempo de importar los módulos de cálculo en un intérprete nuevo (lo que paga cada worker del pool
+    al arrancar) y qué dependencias pesadas se cargan con ellos
+    """
+    import subprocess, sys, os
+
+    # Los módulos se importan desde la carpeta del proyecto aunque el benchmark se lance desde otra
+    carpeta = os.path.dirname(os.path.abspath(__file__))
+    print("Tiempo de importación (intérprete nuevo)")
+    codigo = ("import sys, time\n"
+              "inicio = time.perf_counter()\n"
+              "import {modulo}\n"
+              "print(time.perf_counter() - inicio)\n"
+              "print(','.join(m for m in {pesados!r} if m in sys.modules))")
+    for modulo in ("refprop_utils", "ciclo_basico_binario", "ciclo_basico_ternario"):
+        mejor = float("inf")
+        for _ in range(repeticiones):
+            salida = subprocess.run([sys.executable, "-c", codigo.format(modulo=modulo, pesados=MODULOS_PESADOS)],
+                                    capture_output=True, text=True, check=True, cwd=carpeta).stdout
+            tiempo, cargados = salida.splitlines()
+            mejor = min(mejor, float(tiempo))
+        print(f"  {modulo}: {mejor * 1e3:.1f} ms | dependencias pesadas: {cargados or 'ninguna'}")
+
+def main():
+    # El backend se elige con REFPROP_BACKEND, por ejemplo "sintetico" o "sintetico:0.0005" sin el DLL,
+    # o "grabar:trazas/bench" y después "reproducir:trazas/bench" para repetir la ejecución sin el DLL
+    benchmark_importacion()
+
+    init_refprop()
+    print(f"Backend: {refprop_utils.BACKEND} ({refprop_utils.RP.RPVersion()})")
+    # Sin cachés para medir solo REFPROP
+    configurar_cache_rprop(activa = False)
+
+    benchmark_splines_saturacion()
+    benchmark_ciclo()
+
+    # Con "grabar:" el tiempo dentro del DLL; con "reproducir:" lo que costaron las llamadas grabadas.
+    # Comparado con el tiempo total da el coste del envoltorio y del resto del programa.
+    if hasattr(refprop_utils.RP, "estadisticas"):
+        print(f"Tiempo en el backend (proceso principal): {refprop_utils.RP.estadisticas()}")
+
+if __name__ == "__main__":
+    main()
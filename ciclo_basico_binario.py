@@ -1,55 +1,182 @@
 from refprop_utils import * 
 from typing import Any
-import numpy as np
-import pandas as pd
-from openpyxl.utils import get_column_letter
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Alignment, Font
-import matplotlib.pyplot as plt
-from concurrent.futures import ProcessPoolExecutor
-from tqdm import tqdm
+import json, os
 from pprint import pprint
 
+# numpy, pandas, openpyxl, matplotlib y tqdm se importan dentro de las funciones que los usan:
+# los workers del pool solo necesitan calcular_ciclo_basico y así arrancan mucho más rápido.
+
+# Parámetros fijos del ciclo (forman parte de la clave de los valores de referencia guardados)
+AP_0 = 3                    # Approach del evaporador (K)
+SH = 5                      # Recalentamiento (K)
+SUB = 1                     # Subenfriamiento (K)
+REND_ISO_H = 0.6            # Rendimiento isentrópico del compresor
+APPROACH_INI = 6.5          # Rango de búsqueda del approach del condensador (K)
+APPROACH_MAX = 20
+TOLERANCIA_APPROACH = 0.05
+PINCH_MIN = 1               # Pinch mínimo en el condensador (K)
+MARGEN_VCC = 0.3            # VCC admitida respecto a la del propano (+-30%)
+
+RUTA_VALORES_REFERENCIA = os.path.join("resultados_ciclo_basico", "valores_referencia.json")
+
 def calcular_ciclo_basico(
     fluido: str | list[str],
     mezcla: list[float],
     water_config: str,
-    approach_ini: float = 6.5, # Provar
-    approach_max: float = 20,
-    step: float = 0.5
+    approach_ini: float = APPROACH_INI, # Provar
+    approach_max: float = APPROACH_MAX,
+    tolerancia: float = TOLERANCIA_APPROACH,
+    pinch_min: float = PINCH_MIN
 ) -> CicloOutput:
+    """
+    Ciclo con el menor approach de condensación entre approach_ini y approach_max que da un pinch
+    >= pinch_min, buscado con regula falsi (Illinois) y bisección sobre pinch(approach) - pinch_min.
+    Devuelve el ciclo del extremo que cumple, a menos de tolerancia (K) del approach mínimo.
+
+    Un ciclo con error (transcrítico, bifásico, REFPROP…) se trata como el lado que para la búsqueda:
+    si aparece antes de llegar al pinch se devuelve ese error, igual que al subir el approach paso a
+    paso. Si ni con approach_max se llega al pinch se devuelve "PinchBajo" tras dos ciclos.
+    """
+    # Extremo bajo: si ya cumple (o falla) no hace falta buscar
+    resultado = calcular_ciclo(fluido, mezcla, water_config, approach_ini)
+    if resultado.error is not None or resultado.pinch >= pinch_min:
+        return resultado
+    a_bajo, g_bajo = approach_ini, resultado.pinch - pinch_min
+
+    # Extremo alto
+    alto = calcular_ciclo(fluido, mezcla, water_config, approach_max)
+    if alto.error is None and alto.pinch < pinch_min:
+        return CicloOutput(fluido=resultado.fluido,
+                           mezcla=resultado.mezcla,
+                           water_config=water_config,
+                           error="PinchBajo")
+    a_alto = approach_max
+    g_alto = None if alto.error is not None else alto.pinch - pinch_min
+
+    lado = 0  # Extremo que se ha movido en la iteración anterior (Illinois)
+    while a_alto - a_bajo > tolerancia:
+        if g_alto is None:
+            # Sin pinch en el extremo alto no hay secante: bisección
+            approach = 0.5 * (a_bajo + a_alto)
+        else:
+            approach = a_bajo - g_bajo * (a_alto - a_bajo) / (g_alto - g_bajo)
+            # No acercarse tanto a un extremo que el intervalo deje de encogerse
+            margen = min(0.1 * (a_alto - a_bajo), 0.5 * tolerancia)
+            approach = min(max(approach, a_bajo + margen), a_alto - margen)
+
+        ciclo = calcular_ciclo(fluido, mezcla, water_config, approach)
+        if ciclo.error is None and ciclo.pinch < pinch_min:
+            a_bajo, g_bajo = approach, ciclo.pinch - pinch_min
+            if lado == -1 and g_alto is not None:
+                g_alto /= 2
+            lado = -1
+        else:
+            a_alto, alto = approach, ciclo
+            g_alto = None if ciclo.error is not None else ciclo.pinch - pinch_min
+            if lado == 1:
+                g_bajo /= 2
+            lado = 1
 
-    approach = approach_ini
-
-    while approach < approach_max:
-        resultado = calcular_ciclo(fluido, mezcla, water_config, approach)
-
-        if resultado.error is not None:
-            return resultado
+    return alto
 
-        if resultado.pinch >= 1:
-            return resultado
+# Valores de referencia ya calculados en este proceso, por clave de parámetros
+VALORES_REFERENCIA: dict[str, list[float]] = {}
 
-        approach += step
+def _clave_referencia(water_config: str) -> str:
+    """
+    Todo lo que cambia el ciclo de referencia, como texto JSON
+    """
+    import refprop_utils
 
-    return CicloOutput(fluido=resultado.fluido,
-                       mezcla=resultado.mezcla,
-                       water_config=water_config,
-                       error="PinchBajo")
+    # Versión y DLL de REFPROP como en CacheDisco y TablaPH: con servidor, las del servidor
+    if refprop_utils.CLIENTE_SERVIDOR is not None:
+        servidor = refprop_utils.CLIENTE_SERVIDOR.estadisticas()
+        refprop = {clave: servidor[clave] for clave in ("backend", "version_refprop", "ruta_dll")}
+    else:
+        rp = refprop_utils._rp()
+        refprop = {"backend": refprop_utils.BACKEND, "version_refprop": rp.RPVersion() if rp is not None else None,
+                   "ruta_dll": refprop_utils.RUTA_DLL}
+
+    # Modos que cambian los resultados de REFPROP: splines de saturación, tabla P-H del propano
+    # (por su carpeta, que es el hash de sus parámetros) y tolerancia de la caché en memoria
+    fluidos_refprop, _ = refprop_utils._convertir_fluidos("PROPANE")
+    tabla = refprop_utils.TABLAS_PH.get((fluidos_refprop, (1.0,)))
+    cache = refprop_utils.CACHE_RESULTADOS
+    modos = {
+        "splines": refprop_utils.SATURACION_SPLINES,
+        "tabla_ph": os.path.basename(tabla.ruta) if tabla is not None else None,
+        "cache_activa": cache.activa, "cache_tolerancia": cache.tolerancia,
+    }
+
+    parametros = {
+        "fluido": "PROPANE",
+        "water_config": water_config,
+        "temperaturas_agua": WATER_CONFIG[water_config],
+        "ap_0": AP_0, "SH": SH, "SUB": SUB, "rend_iso_h": REND_ISO_H,
+        "approach_ini": APPROACH_INI, "approach_max": APPROACH_MAX,
+        "tolerancia": TOLERANCIA_APPROACH, "pinch_min": PINCH_MIN,
+        "margen_vcc": MARGEN_VCC,
+        **refprop,
+        **modos,
+    }
+    return json.dumps(parametros, sort_keys=True)
+
+def _leer_valores_referencia() -> dict[str, dict[str, Any]]:
+    try:
+        with open(RUTA_VALORES_REFERENCIA, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def _guardar_valores_referencia(datos: dict[str, dict[str, Any]]) -> None:
+    # Escribir en un temporal y renombrar: otro proceso nunca lee el fichero a medias
+    os.makedirs(os.path.dirname(RUTA_VALORES_REFERENCIA), exist_ok=True)
+    temporal = f"{RUTA_VALORES_REFERENCIA}.{os.getpid()}.tmp"
+    with open(temporal, "w", encoding="utf-8") as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+    os.replace(temporal, RUTA_VALORES_REFERENCIA)
 
 def calcular_valores_referencia(water_config: str) -> list[float]:
-
-    # Calcular VCC de referencia
-    margen_vcc = 0.3
-    vcc_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).VCC
-    vcc_min = (1 - margen_vcc) * vcc_propano
-    vcc_max = (1 + margen_vcc) * vcc_propano
-    # Calcular COP de propano
-    cop_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).COP
-    
-    return [vcc_min, vcc_max, cop_propano]
+    """
+    [vcc_min, vcc_max, cop_propano] del ciclo de referencia (propano puro) de la water_config.
+
+    El ciclo se calcula una sola vez y los valores se guardan en memoria y en RUTA_VALORES_REFERENCIA
+    con los parámetros del ciclo como clave: si cambia alguno (temperaturas, approach, pinch, backend,
+    versión o DLL de REFPROP, splines, tabla P-H, tolerancia de la caché…) se vuelve a calcular. Para forzarlo, invalidar_valores_referencia.
+    """
+    clave = _clave_referencia(water_config)
+    valores = VALORES_REFERENCIA.get(clave)
+    if valores is None:
+        guardados = _leer_valores_referencia()
+        if clave in guardados:
+            valores = guardados[clave]["valores"]
+        else:
+            propano = calcular_ciclo_basico("PROPANE", [1.0], water_config)
+            if propano.error is not None:
+                raise RuntimeError(f"El ciclo de referencia del propano ({water_config}) falla: {propano.error}")
+            valores = [(1 - MARGEN_VCC) * propano.VCC, (1 + MARGEN_VCC) * propano.VCC, propano.COP]
+            guardados[clave] = {"water_config": water_config, "valores": valores}
+            _guardar_valores_referencia(guardados)
+        VALORES_REFERENCIA[clave] = valores
+
+    return list(valores)
+
+def invalidar_valores_referencia(water_config: str | None = None) -> None:
+    """
+    Olvidar los valores de referencia de una water_config (o de todas), en memoria y en disco
+    """
+    if water_config is None:
+        VALORES_REFERENCIA.clear()
+        if os.path.exists(RUTA_VALORES_REFERENCIA):
+            os.remove(RUTA_VALORES_REFERENCIA)
+        return
+
+    for clave in [clave for clave in VALORES_REFERENCIA if json.loads(clave)["water_config"] == water_config]:
+        del VALORES_REFERENCIA[clave]
+    guardados = _leer_valores_referencia()
+    restantes = {clave: dato for clave, dato in guardados.items() if dato["water_config"] != water_config}
+    if len(restantes) != len(guardados):
+        _guardar_valores_referencia(restantes)
 
 def filtrar(resultados: list[CicloOutput], vcc_min, vcc_max) -> list[CicloOutput]:
     filtros = [
@@ -68,6 +195,15 @@ def filtrar(resultados: list[CicloOutput], vcc_min, vcc_max) -> list[CicloOutput
 
     return sorted(resultados, key = lambda r: r.COP, reverse=True)
 
+def contar_errores(resultados: list[CicloOutput]) -> dict[str | None, int]:
+    """
+    Número de ciclos de un barrido por tipo de error (None: ciclos sin error)
+    """
+    conteo: dict[str | None, int] = {}
+    for r in resultados:
+        conteo[r.error] = conteo.get(r.error, 0) + 1
+    return conteo
+
 def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
                    water_config: str, approach_k: float) -> CicloOutput:
     
@@ -81,26 +217,31 @@ def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
 
     [t_hw_in, t_hw_out] = temperaturas_agua["t_hw"]
     [t_cw_in, t_cw_out] = temperaturas_agua["t_cw"]
+    # Agua y glicol precalculados: no dependen del refrigerante
+    secundario = modelo_secundario(water_config)
 
     ap_k = approach_k
-    ap_0 = 3
+    ap_0 = AP_0
 
-    SH = 5
-    SUB = 1
+    # Consulta compilada una vez por fluido (compilar_consulta): la composición va en cada llamada
+    consulta_H_PS = compilar_consulta(fluido, "H", ("P", "S"))
 
     t3 = t_hw_in + ap_k
-    T_crit = rprop(fluido, "Tcrit", mezcla, T = 0, H = 0)
+    T_crit = punto_critico(fluido, mezcla)[0]
 
     try:
         if t3 > T_crit:
             raise ErrorTemperaturaTranscritica(f"Temperatura transcrítica en el punto de descarga: {t3:.1f}ºC > {T_crit:.1f}ºC")
 
-        PK = rprop(fluido, "P", mezcla, T = t3 + SUB, Q = 0)
-
-        # Punto 3
-        P3 = TPoint(fluido, mezcla, T = t3, P = PK)
-        P3.calcular("H", "D")
+        # Condensación: burbuja a t3 + SUB y rocío a la misma presión. El rocío y el punto 3 solo
+        # dependen de PK: se resuelven juntos al salir del lote
+        with LoteTPoint():
+            sat_k = estado_saturacion(fluido, mezcla, T = t3 + SUB)
+            PK = sat_k.P
 
+            # Punto 3
+            P3 = TPoint(fluido, mezcla, T = t3, P = PK)
+            P3.pedir("H", "D")
 
         # Punto 4
         P4 = TPoint(fluido, mezcla, H = P3.H, T = t_cw_out - ap_0)
@@ -108,15 +249,19 @@ def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
         P0 = P4.P
 
         # Rendimiento isentrópico
-        rend_iso_h = 0.6
+        rend_iso_h = REND_ISO_H
+
+        # Evaporación: burbuja y rocío a P0, en una sola pasada
+        with LoteTPoint():
+            sat_0 = estado_saturacion(fluido, mezcla, P = P0)
 
         # Punto 1
-        t_sat_1 = rprop(fluido, "T", mezcla, P = P0, Q = 1)
+        t_sat_1 = sat_0.T_rocio
         P1 = TPoint(fluido, mezcla, T = t_sat_1 + SH, P = P0)
         P1.calcular("H", "S", "V")
 
         # Punto 2
-        h_2_s = rprop(fluido, "H", mezcla, P = PK, S = P1.S)
+        h_2_s = consulta_H_PS(PK, P1.S, mezcla)
         h_2 = P1.H + (h_2_s - P1.H)/rend_iso_h
         P2 = TPoint(fluido, mezcla, P = PK, H = h_2)
         P2.calcular("H", "Q", "D", "T")
@@ -128,35 +273,26 @@ def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
         VCC = (P2.H - P1.H)/P1.V
 
         # Puntos saturados
-        Pk_liq_sat = TPoint(fluido, mezcla, P = PK, Q = 0)
-        Pk_vap_sat = TPoint(fluido, mezcla, P = PK, Q = 1)
-
-        P0_liq_sat = TPoint(fluido, mezcla, P = P0, Q = 0)
-        P0_vap_sat = TPoint(fluido, mezcla, P = P0, Q = 1)
+        Pk_liq_sat, Pk_vap_sat = sat_k
+        P0_liq_sat, P0_vap_sat = sat_0
 
         puntos_saturados = [Pk_liq_sat, Pk_vap_sat, P0_liq_sat, P0_vap_sat]
-        # Caudales
-        P_hw_in = TPoint("WATER", P = 1, T = t_hw_in)
-        P_hw_out = TPoint("WATER", P = 1, T = t_hw_out)
-        P_cw_in = TPoint("ETHYLENEGLYCOL", P = 1, T = t_cw_in)
-        P_cw_out = TPoint("ETHYLENEGLYCOL", P = 1, T = t_cw_out)
 
         # Relaciones másicas
-        ratio_m_GlycolHot_R = (P2.H - P3.H)/(P_hw_out.H - P_hw_in.H)
-        ratio_m_GlycolCold_R = (P1.H - P4.H)/(P_cw_in.H - P_cw_out.H)
+        ratio_m_GlycolHot_R = (P2.H - P3.H)/(secundario.h_hw_out - secundario.h_hw_in)
+        ratio_m_GlycolCold_R = (P1.H - P4.H)/(secundario.h_cw_in - secundario.h_cw_out)
 
         # Relaciones volumétricas
-        ratio_v_GlycolHot_R = ratio_m_GlycolHot_R * P2.D/P_hw_in.D
-        ratio_v_GlycolCold_R = ratio_m_GlycolCold_R * P3.D/P_cw_in.D
+        ratio_v_GlycolHot_R = ratio_m_GlycolHot_R * P2.D/secundario.d_hw_in
+        ratio_v_GlycolCold_R = ratio_m_GlycolCold_R * P3.D/secundario.d_cw_in
 
         # Pinch
-        h_water_pinch = P_hw_out.H - 1/ratio_m_GlycolHot_R * (P2.H - Pk_vap_sat.H)
-        P_water_pinch = TPoint("WATER", P = 1, H = h_water_pinch)
-        pinch = Pk_vap_sat.T - P_water_pinch.T
+        h_water_pinch = secundario.h_hw_out - 1/ratio_m_GlycolHot_R * (P2.H - Pk_vap_sat.H)
+        pinch = Pk_vap_sat.T - secundario.T_agua(h_water_pinch)
 
         # Glide
-        glide_k = Pk_vap_sat.T - Pk_liq_sat.T
-        glide_0 = P0_vap_sat.T - P4.T
+        glide_k = sat_k.glide
+        glide_0 = sat_0.T_rocio - P4.T
 
         puntos = {
             "1": P1,
@@ -197,6 +333,11 @@ def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
         resultado = resultado_basico | {"error": "División 0"}
         output = CicloOutput(**resultado)
 
+    except ErrorRefprop as e:
+        # Primer estado que REFPROP no ha podido calcular: el ciclo se aborta ahí
+        resultado = resultado_basico | {"error": f"REFPROP {e.categoria}"}
+        output = CicloOutput(**resultado)
+
     except RuntimeError:
         resultado = resultado_basico | {"error": "REFPROP"}
         output = CicloOutput(**resultado)
@@ -204,17 +345,23 @@ def calcular_ciclo(fluido: str | list[str], mezcla: list[float],
     return output
 
 def worker_calcular(args):
-    # Check REFPROP handle in the refprop_utils module (initializer sets this per process)
+    # Check REFPROP handle in the refprop_utils module (initializer sets this per process / per thread)
     import refprop_utils
-    if refprop_utils.RP is None:
+    if not refprop_utils.refprop_inicializado():
         raise RuntimeError("REFPROP no inicializado en el worker")
 
     fluido, mezcla, temperaturas_agua = args
     res = calcular_ciclo_basico(fluido, mezcla, temperaturas_agua)
+    # En un pool de hilos el resultado se devuelve tal cual (deserializar lo deja igual)
+    if getattr(refprop_utils._LOCAL, "rp", None) is not None:
+        return res
     return serializar(res)
 
 # Cálculo bruto
 def calcular_mezclas(posibles_refrigerantes: list[str], water_config: str):
+    import numpy as np
+    from tqdm import tqdm
+
     fichero_json = "resultados.json"
     path_json = os.path.join("resultados_ciclo_basico", water_config, "binarias", fichero_json)
     n_calcs = 41
@@ -231,6 +378,7 @@ def calcular_mezclas(posibles_refrigerantes: list[str], water_config: str):
     print("### CÁLCULO BRUTO ###")
     n = len(posibles_refrigerantes)
     total = n * (n - 1) // 2
+    errores_barrido: dict[str | None, int] = {}
 
     with tqdm(total = total) as pbar:
         for index_a, ref_a in enumerate(posibles_refrigerantes[:-1]):
@@ -249,9 +397,13 @@ def calcular_mezclas(posibles_refrigerantes: list[str], water_config: str):
                 cpu = os.cpu_count() // 2 or 1 # Usar la mitad de núcleos de la CPU
                 chunksize = 2 # Está bien para la duración de la función (aprox 1s)
 
-                with ProcessPoolExecutor(max_workers=cpu, initializer=init_refprop) as ex:
+                # Calcular aquí el agua / glicol para que crear_pool lo pase a los workers
+                modelo_secundario(water_config)
+                with crear_pool(cpu) as ex:
                     res = list(ex.map(worker_calcular, lista_inputs, chunksize=chunksize)) # Devuelve ya serializado
                 res: list[CicloOutput] = deserializar(res)
+                for error, n_ciclos in contar_errores(res).items():
+                    errores_barrido[error] = errores_barrido.get(error, 0) + n_ciclos
                 for index, resultado in enumerate(res):
 
                     resultados[ref_a][ref_b][index] = resultado
@@ -259,6 +411,7 @@ def calcular_mezclas(posibles_refrigerantes: list[str], water_config: str):
                 
                 pbar.update(1)
 
+    print(f"Ciclos por tipo de error: {errores_barrido}")
  
     # Guardar resultados en json
     os.makedirs(os.path.dirname(path_json), exist_ok=True)
@@ -266,6 +419,11 @@ def calcular_mezclas(posibles_refrigerantes: list[str], water_config: str):
         json.dump(serializar(resultados), f, ensure_ascii=False, indent=2)
 
 def json_a_excel(water_config: str):
+    import pandas as pd
+    from openpyxl import load_workbook
+    from openpyxl.styles import Alignment
+    from openpyxl.utils import get_column_letter
+
     fichero_json = "resultados.json"
     path_json = os.path.join("resultados_ciclo_basico", water_config, "binarias", fichero_json)
 
@@ -391,6 +549,11 @@ def json_a_excel(water_config: str):
     wb.save(path_excel)
 
 def json_a_excel_filtrado(water_config: str) -> None:
+    import pandas as pd
+    from openpyxl import load_workbook
+    from openpyxl.styles import Alignment
+    from openpyxl.utils import get_column_letter
+
     PASO = 0.025
 
     fichero_json_filtrado = "resultados_filtrados.json"
@@ -507,15 +670,8 @@ def refinar_mezclas(water_config: str):
 
     refrigerantes_revisados: set[str] = set()
 
-    # Calcular VCC de referencia
-    margen_vcc = 0.3
-    vcc_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).VCC
-    vcc_min = (1 - margen_vcc) * vcc_propano
-    vcc_max = (1 + margen_vcc) * vcc_propano
-    # Calcular COP de propano
-    cop_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).COP
+    # Valores de referencia del propano
+    [vcc_min, vcc_max, cop_propano] = calcular_valores_referencia(water_config)
 
     salto = 0.025
 
@@ -668,6 +824,9 @@ def json_a_excel_fino(
     ancho_col_value: float = 30,
     ancho_col_separador: float = 5,
 ) -> None:
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment, Font
+    from openpyxl.utils import get_column_letter
 
     fichero_json_fino = "resultados_finos.json"
     path_json_fino = os.path.join("resultados_ciclo_basico", water_config, "binarias", fichero_json_fino)
@@ -766,6 +925,8 @@ def json_a_excel_fino(
 
 # Generar gráficos
 def generar_graficos_binarios(casos, valor_referencia, water_config):
+    import matplotlib.pyplot as plt
+
     output_folder = os.path.join("resultados_ciclo_basico", water_config, "binarias", "graficos")
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
@@ -957,6 +1118,10 @@ def crear_excel(
     ancho_columna: float = 14,
     ancho_separador: float = 4
 ):
+    from openpyxl import Workbook
+    from openpyxl.styles import Alignment
+    from openpyxl.utils import get_column_letter
+
     fichero_excel_resumen = "resumen_resultados.xlsx"
     path_excel_resumen = os.path.join(
         "resultados_ciclo_basico",
@@ -1069,7 +1234,7 @@ def crear_excel(
 
 
 def main():
-    init_refprop()
+    init_refprop(ruta_cache_disco=RUTA_CACHE_DISCO)
     
     # DATOS
     water_config = "baja" # "baja" / "intermedia" / "media" / "alta"
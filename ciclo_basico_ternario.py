@@ -1,12 +1,8 @@
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import ternary
 from refprop_utils import *
-from ciclo_basico_binario import calcular_ciclo_basico, worker_calcular
-import numpy as np
+from ciclo_basico_binario import worker_calcular, contar_errores, calcular_valores_referencia
 import json, os
-from concurrent.futures import ProcessPoolExecutor
-from tqdm import tqdm
+
+# numpy, matplotlib, ternary y tqdm se importan dentro de las funciones que los usan
 
 # Cálculo bruto
 
@@ -25,6 +21,8 @@ def crear_lista_3_ref(posibles_refrigerantes: list[str]) -> list[list[str]]:
     return lista_refrigerantes
 
 def crear_props_3_ref(n_prop: int) -> list[list[float]]:
+    import numpy as np
+
     lista_props = []
     props = [float(x) for x in list(np.linspace(0, 1, n_prop))]
     for index_a, prop_a in enumerate(props):
@@ -53,6 +51,8 @@ def mostrar_resultado(res: CicloOutput, decimales: int | None = 0) -> None:
         print(string_comp + f"ERROR = {res.error}")
     
 def calcular_resultados(posibles_refrigerantes: list[str], water_config: str, n_prop: int) -> list[CicloOutput]:
+    from tqdm import tqdm
+
     combinaciones_ref = crear_lista_3_ref(posibles_refrigerantes)
     rango_proporciones = crear_props_3_ref(n_prop)
 
@@ -71,10 +71,14 @@ def calcular_resultados(posibles_refrigerantes: list[str], water_config: str, n_
 
         print("### CÁLCULO BRUTO ###")
 
-        with ProcessPoolExecutor(max_workers=cpu, initializer=init_refprop) as ex:
+        # Calcular aquí el agua / glicol para que crear_pool lo pase a los workers
+        modelo_secundario(water_config)
+        with crear_pool(cpu) as ex:
             resultados = list(tqdm(ex.map(worker_calcular, lista_inputs, chunksize=chunksize), total=len(lista_inputs))) # Devuelve ya serializado
-    
-    return deserializar(resultados)
+
+    resultados = deserializar(resultados)
+    print(f"Ciclos por tipo de error: {contar_errores(resultados)}")
+    return resultados
 
 def pasar_a_diccionario(resultados: list[CicloOutput]) -> dict[str, dict[str, dict[str, list[CicloOutput]]]]:
 
@@ -155,20 +159,6 @@ def filtrar(resultados: list[CicloOutput], vcc_min, vcc_max) -> list[CicloOutput
 
     return sorted(resultados, key = lambda r: r.COP, reverse=True) # Si no hay ninguno devolverá []
 
-def calcular_valores_referencia(water_config: str) -> list[float]:
-
-    # Calcular VCC de referencia
-    margen_vcc = 0.3
-    vcc_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).VCC
-    vcc_min = (1 - margen_vcc) * vcc_propano
-    vcc_max = (1 + margen_vcc) * vcc_propano
-    # Calcular COP de propano
-    cop_propano = calcular_ciclo_basico("PROPANE", [1.0],
-                                        water_config).COP
-    
-    return [vcc_min, vcc_max, cop_propano]
-
 def crear_rango_composiciones(resultados: list[CicloOutput]) -> list[list[list[float]]]:
     props: list[list[float]] = [r.mezcla[:2] for r in resultados]
     comps: list[list[list[float]]] = []
@@ -274,6 +264,7 @@ def mostrar_mejor_resultado(res: CicloOutput, cop_propano: float) -> None:
         print("\n" + string_comp + f"COP {-proporcion:.2f}% más PEQUEÑO que el propano\n")
     
 def refinar_mezclas(water_config: str) -> list[CicloOutput]:
+    from tqdm import tqdm
 
     [vcc_min, vcc_max, cop_propano] = calcular_valores_referencia(water_config)
 
@@ -317,7 +308,9 @@ def refinar_mezclas(water_config: str) -> list[CicloOutput]:
     chunksize = 2 # Está bien para la duración de la función (aprox 1s)
 
     # Ejecutar cálculo paralelo
-    with ProcessPoolExecutor(max_workers=cpu, initializer=init_refprop) as ex:
+    # Calcular aquí el agua / glicol para que crear_pool lo pase a los workers
+    modelo_secundario(water_config)
+    with crear_pool(cpu) as ex:
         resultados_finos = list(tqdm(ex.map(worker_calcular, lista_inputs, chunksize=chunksize), total=len(lista_inputs)))
 
 
@@ -394,7 +387,11 @@ def pasar_a_json_fino(dic_resultados: Any, water_config: str) -> None:
 
 # Generar gráficos
 def generar_graficos_ternarios(lista_casos, config, water_config) -> None:
-    
+    import numpy as np
+    import matplotlib.pyplot as plt
+    import matplotlib.colors as mcolors
+    import ternary
+    from tqdm import tqdm
     import warnings
     warnings.filterwarnings("ignore", category=UserWarning, message=".*No data for colormapping provided.*")
     
@@ -571,17 +568,8 @@ def obtener_casos(water_config) -> tuple[list[dict[tuple, dict[str, float]]], di
 
     return (casos, config_mag)
 
-init_refprop()
-
-water_config = "intermedia"
-
-(datos_casos, config_mag) = obtener_casos(water_config)
-
-generar_graficos_ternarios(datos_casos, config_mag, water_config)
-
-
 def main():
-    init_refprop()
+    init_refprop(ruta_cache_disco=RUTA_CACHE_DISCO)
     
     # DATOS
     water_config = "media" # "baja" / "intermedia" / "media" / "alta"
@@ -618,8 +606,11 @@ def main():
 
 
 if __name__ == "__main__":
-    ...
-
+    # Regenerar solo los gráficos ternarios a partir de los resultados guardados
+    init_refprop()
 
+    water_config = "intermedia"
 
+    (datos_casos, config_mag) = obtener_casos(water_config)
 
+    generar_graficos_ternarios(datos_casos, config_mag, water_config)
@@ -0,0 +1,224 @@
+import asyncio, os
+from refprop_utils import compilar_consulta, crear_pool, deserializar
+
+# Versión asyncio de rprop y calcular_ciclo_basico para usarlas desde un servicio sin bloquear el
+# bucle de eventos. Los cálculos se hacen en un pool de workers con REFPROP (crear_pool, de procesos
+# o de hilos según REFPROP_POOL) y el proceso principal solo reparte trabajo y espera:
+#
+#   init_refprop()
+#   H = await arprop("PROPANE", "H", P = 10, T = 40)
+#   ciclo = await acalcular_ciclo_basico(["PROPANE", "BUTANE"], [0.5, 0.5], "baja")
+#   async for indice, ciclo in abarrido_ciclos(casos):
+#       ...
+
+def _evaluar_lote(peticiones: list[tuple]) -> list:
+    """
+    Evaluar en un worker un lote de consultas de rprop. Devuelve el resultado o la excepción de cada una.
+    """
+    resultados = []
+    for fluidos, salida, entrada, a, b, mezcla in peticiones:
+        try:
+            resultados.append(compilar_consulta(fluidos, salida, entrada)(a, b, mezcla))
+        except Exception as e:
+            resultados.append(e)
+    return resultados
+
+class ServicioRefprop:
+    """
+    Pool de workers con REFPROP detrás de una API asyncio.
+
+    Las consultas de arprop que llegan casi a la vez se agrupan en lotes (hasta tamano_lote, esperando
+    como mucho espera_lote segundos) que se envían al pool como un único trabajo, ordenadas por fluido
+    y composición para cargar cada mezcla una sola vez. Los ciclos se envían de uno en uno, ya tardan
+    lo suficiente.
+
+    Contrapresión: como mucho max_pendientes consultas o ciclos a la vez; el resto espera en el await
+    sin ocupar memoria en la cola. Cancelación: una consulta cancelada antes de salir en un lote no se
+    calcula y un ciclo cancelado antes de empezar se quita del pool (uno que ya ha empezado termina en el
+    worker, pero su resultado se descarta).
+    """
+    def __init__(self, max_workers: int | None = None, hilos: bool | None = None, max_pendientes: int = 1024,
+                 tamano_lote: int = 64, espera_lote: float = 0.002) -> None:
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.pool = crear_pool(self.max_workers, hilos=hilos)
+        self.tamano_lote = tamano_lote
+        self.espera_lote = espera_lote
+        self.limite = asyncio.Semaphore(max_pendientes)
+        self.cola: asyncio.Queue | None = None
+        self.tarea_lotes: asyncio.Task | None = None
+        self.lotes = 0
+        self.consultas = 0
+
+    async def __aenter__(self) -> "ServicioRefprop":
+        return self
+
+    async def __aexit__(self, *excepcion) -> None:
+        await self.cerrar()
+
+    def _arrancar(self) -> None:
+        # La cola y la tarea que forma los lotes se crean en el bucle de eventos que las usa
+        if self.tarea_lotes is None or self.tarea_lotes.done():
+            self.cola = asyncio.Queue()
+            self.tarea_lotes = asyncio.get_running_loop().create_task(self._formar_lotes())
+
+    async def rprop(self, fluidos: str | list[str], salida: str | list[str], mezcla: list[float] | None = None,
+                    **kwargs: float) -> float | list[float]:
+        """
+        Igual que rprop, calculado en el pool
+        """
+        if len(kwargs.keys()) != 2:
+            raise ValueError("REFPROP solo admite dos entradas independientes (ej: T y P, T y H…).")
+        [a, b] = kwargs.values()
+        if mezcla is None:
+            mezcla = [1.0]
+
+        async with self.limite:
+            self._arrancar()
+            futuro = asyncio.get_running_loop().create_future()
+            peticion = (fluidos, salida, tuple(kwargs.keys()), a, b, mezcla)
+            self.cola.put_nowait((peticion, futuro))
+            return await futuro
+
+    async def _formar_lotes(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            lote = [await self.cola.get()]
+            if self.espera_lote > 0 and len(lote) < self.tamano_lote:
+                await asyncio.sleep(self.espera_lote)
+            while len(lote) < self.tamano_lote and not self.cola.empty():
+                lote.append(self.cola.get_nowait())
+
+            # Las consultas canceladas mientras esperaban no se envían
+            lote = [(peticion, futuro) for peticion, futuro in lote if not futuro.done()]
+            if not lote:
+                continue
+            lote.sort(key=lambda elemento: repr((elemento[0][0], elemento[0][5])))
+
+            try:
+                trabajo = loop.run_in_executor(self.pool, _evaluar_lote, [peticion for peticion, _ in lote])
+            except Exception as e:
+                # Pool cerrado o roto: el error llega a las consultas del lote y el bucle sigue con las demás
+                for _, futuro in lote:
+                    if not futuro.done():
+                        futuro.set_exception(e)
+                continue
+            trabajo.add_done_callback(lambda trabajo, lote=lote: self._repartir(lote, trabajo))
+            self.lotes += 1
+            self.consultas += len(lote)
+
+    @staticmethod
+    def _repartir(lote: list[tuple], trabajo: asyncio.Future) -> None:
+        """
+        Pasar los resultados de un lote a las consultas que siguen esperando
+        """
+        if trabajo.cancelled():
+            for _, futuro in lote:
+                futuro.cancel()
+            return
+        if trabajo.exception() is not None:
+            for _, futuro in lote:
+                if not futuro.done():
+                    futuro.set_exception(trabajo.exception())
+            return
+        for (_, futuro), resultado in zip(lote, trabajo.result()):
+            if futuro.done():
+                continue
+            if isinstance(resultado, Exception):
+                futuro.set_exception(resultado)
+            else:
+                futuro.set_result(resultado)
+
+    async def calcular_ciclo_basico(self, fluido: str | list[str], mezcla: list[float], water_config: str):
+        """
+        Igual que calcular_ciclo_basico, calculado en el pool
+        """
+        from ciclo_basico_binario import worker_calcular
+
+        async with self.limite:
+            loop = asyncio.get_running_loop()
+            resultado = await loop.run_in_executor(self.pool, worker_calcular, (fluido, mezcla, water_config))
+            return deserializar(resultado)
+
+    async def barrido(self, casos, max_en_vuelo: int | None = None):
+        """
+        Calcular los ciclos de casos (fluido, mezcla, water_config) y devolverlos según terminan como
+        (índice del caso, CicloOutput). Solo se lanzan max_en_vuelo casos a la vez (por defecto el doble
+        de workers), así el iterable de casos puede ser un generador largo o infinito. Si se sale del
+        async for (break, excepción o cancelación) se cancelan los casos pendientes.
+        """
+        max_en_vuelo = max_en_vuelo or 2 * self.max_workers
+        casos = iter(enumerate(casos))
+        pendientes: dict[asyncio.Task, int] = {}
+        try:
+            while True:
+                for indice, caso in casos:
+                    tarea = asyncio.ensure_future(self.calcular_ciclo_basico(*caso))
+                    pendientes[tarea] = indice
+                    if len(pendientes) >= max_en_vuelo:
+                        break
+                if not pendientes:
+                    return
+
+                terminadas, _ = await asyncio.wait(pendientes, return_when=asyncio.FIRST_COMPLETED)
+                for tarea in terminadas:
+                    yield pendientes.pop(tarea), tarea.result()
+        finally:
+            for tarea in pendientes:
+                tarea.cancel()
+
+    async def cerrar(self) -> None:
+        """
+        Parar la formación de lotes y cerrar el pool sin esperar a lo que todavía no ha empezado
+        """
+        if self.tarea_lotes is not None:
+            self.tarea_lotes.cancel()
+            try:
+                await self.tarea_lotes
+            except asyncio.CancelledError:
+                pass
+            self.tarea_lotes = None
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+# Servicio que usan las funciones de este módulo (se crea con la primera llamada)
+SERVICIO: ServicioRefprop | None = None
+
+def servicio_refprop(**kwargs) -> ServicioRefprop:
+    """
+    Servicio compartido por arprop, acalcular_ciclo_basico y abarrido_ciclos. Los argumentos
+    (los de ServicioRefprop) solo se usan al crearlo.
+    """
+    global SERVICIO
+    if SERVICIO is None:
+        SERVICIO = ServicioRefprop(**kwargs)
+    return SERVICIO
+
+async def cerrar_servicio_refprop() -> None:
+    global SERVICIO
+    if SERVICIO is not None:
+        await SERVICIO.cerrar()
+        SERVICIO = None
+
+async def arprop(fluidos: str | list[str], salida: str | list[str], mezcla: list[float] | None = None,
+                 **kwargs: float) -> float | list[float]:
+    """
+    Versión asíncrona de rprop. Mismos argumentos y unidades.
+
+    H = await arprop("PROPANE", "H", P = 10, T = 40)
+    """
+    return await servicio_refprop().rprop(fluidos, salida, mezcla, **kwargs)
+
+async def acalcular_ciclo_basico(fluido: str | list[str], mezcla: list[float], water_config: str):
+    """
+    Versión asíncrona de calcular_ciclo_basico
+    """
+    return await servicio_refprop().calcular_ciclo_basico(fluido, mezcla, water_config)
+
+async def abarrido_ciclos(casos, max_en_vuelo: int | None = None):
+    """
+    Iterador asíncrono de (índice, CicloOutput) de un barrido de casos (fluido, mezcla, water_config)
+
+    async for indice, ciclo in abarrido_ciclos(casos):
+        ...
+    """
+    async for indice, resultado in servicio_refprop().barrido(casos, max_en_vuelo):
+        yield indice, resultado
@@ -0,0 +1,1058 @@
+import math, time, os, struct, glob, mmap, numbers, threading
+from collections import namedtuple
+from multiprocessing import util, parent_process
+
+# Backends intercambiables detrás de refprop_utils.RP. Todos ofrecen el subconjunto de la API de
+# ctREFPROP que usa el proyecto: SETUPdll, REFPROPdll, SATSPLNdll, TPRHOdll, THERMdll, XMOLEdll,
+# RPVersion y SI_WITH_C.
+#
+#   "refprop"                       DLL real de REFPROP (ctREFPROP)
+#   "sintetico"                     Sustituto en Python puro (Peng-Robinson), sin DLL
+#   "sintetico:0.0005"              Igual, añadiendo 0.5 ms de latencia artificial en cada REFPROPdll
+#   "grabar:trazas/run1"            DLL real grabando todas las llamadas en trazas/run1.<pid>.rptrace
+#   "grabar:trazas/run1|sintetico"  Grabar las llamadas de otro backend
+#   "reproducir:trazas/run1"        Servir las respuestas grabadas, sin DLL y bit a bit iguales
+#
+# Con privado=True cada llamada a crear_backend devuelve una instancia independiente, para el pool
+# de hilos: el DLL real guarda su estado (fluidos cargados, splines...) en variables globales de la
+# librería, así que cada hilo carga su propia copia del fichero.
+
+REFPROPdlloutput = namedtuple("REFPROPdlloutput", ["z", "Output", "hUnits", "iUCode", "x", "y", "x3", "q", "ierr", "herr"])
+SETUPdlloutput = namedtuple("SETUPdlloutput", ["ierr", "herr"])
+SATSPLNdlloutput = namedtuple("SATSPLNdlloutput", ["ierr", "herr"])
+TPRHOdlloutput = namedtuple("TPRHOdlloutput", ["D", "ierr", "herr"])
+THERMdlloutput = namedtuple("THERMdlloutput", ["P", "e", "h", "s", "Cv", "Cp", "w", "hjt"])
+XMOLEdlloutput = namedtuple("XMOLEdlloutput", ["xmol", "wmix"])
+
+def crear_backend(nombre: str, ruta_dll: str, privado: bool = False):
+    """
+    Crear el objeto que hará de RP a partir del nombre del backend ("nombre" o "nombre:argumento").
+    Con privado=True el DLL real se carga desde una copia privada, independiente de las demás
+    instancias del proceso.
+    """
+    tipo, _, argumento = nombre.partition(":")
+    tipo = tipo.strip().lower()
+    if tipo == "refprop":
+        from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
+        if not privado:
+            return REFPROPFunctionLibrary(ruta_dll)
+        rp = REFPROPFunctionLibrary(_copia_privada(ruta_dll))
+        # Los ficheros de fluidos siguen en la carpeta de la instalación
+        rp.SETPATHdll(os.path.dirname(ruta_dll))
+        return rp
+    if tipo == "sintetico":
+        return BackendSintetico(float(argumento) if argumento else 0.0)
+    if tipo == "grabar":
+        ruta, _, interno = argumento.partition("|")
+        return BackendGrabacion(crear_backend(interno or "refprop", ruta_dll, privado), ruta)
+    if tipo == "reproducir":
+        return BackendReproduccion(argumento)
+    raise ValueError(f"Backend de REFPROP desconocido: {nombre}")
+
+def _copia_privada(ruta_dll: str) -> str:
+    """
+    Copiar el DLL a una carpeta temporal propia. El sistema operativo solo carga una vez cada fichero
+    por proceso, así que cargar la misma ruta dos veces daría la misma instancia (y el mismo estado).
+    La carpeta se borra al cerrar el proceso.
+    """
+    import shutil, tempfile, atexit
+
+    carpeta = tempfile.mkdtemp(prefix="refprop_")
+    atexit.register(shutil.rmtree, carpeta, ignore_errors=True)
+    return shutil.copy2(ruta_dll, carpeta)
+
+# Constante de los gases (J/(mol*K))
+R = 8.314462618
+# Estado de referencia del gas ideal
+T_0 = 273.15
+P_0 = 1e5
+RAIZ_2 = math.sqrt(2)
+
+# Códigos de fase de REFPROP para la calidad fuera de la campana
+Q_LIQUIDO = -998.0
+Q_VAPOR = 998.0
+Q_SUPERCRITICO = 999.0
+
+# Datos de los componentes: Tc (K), Pc (MPa), factor acéntrico, masa molar (g/mol) y cp del gas
+# ideal (J/(mol*K)) = A + B*T + C*T^2 + D*T^3
+COMPONENTES = {
+    "PROPANE": (369.89, 4.2512, 0.1521, 44.096, (-4.224, 0.3063, -1.586e-4, 3.215e-8)),
+    "BUTANE": (425.13, 3.796, 0.201, 58.122, (9.487, 0.3313, -1.108e-4, -2.822e-9)),
+    "ISOBUTANE": (407.81, 3.629, 0.184, 58.122, (-1.390, 0.3847, -1.846e-4, 2.895e-8)),
+    "PROPYLENE": (364.21, 4.555, 0.146, 42.080, (3.710, 0.2345, -1.160e-4, 2.205e-8)),
+    "DME": (400.38, 5.3368, 0.196, 46.068, (17.02, 0.1791, -5.234e-5, -1.918e-9)),
+    "CO2": (304.13, 7.3773, 0.2239, 44.010, (19.80, 0.07344, -5.602e-5, 1.715e-8)),
+    "WATER": (647.10, 22.064, 0.3443, 18.015, (32.24, 0.001924, 1.055e-5, -3.596e-9)),
+    "ETHYLENEGLYCOL": (720.0, 8.2, 0.507, 62.068, (35.70, 0.2483, -1.497e-4, 3.010e-8)),
+}
+SINONIMOS = {
+    "R290": "PROPANE", "R600": "BUTANE", "R600A": "ISOBUTANE", "R1270": "PROPYLENE",
+    "RE170": "DME", "R744": "CO2", "MEG": "ETHYLENEGLYCOL",
+}
+
+def _raices_cubica(c2: float, c1: float, c0: float) -> list[float]:
+    """
+    Raíces reales de Z^3 + c2*Z^2 + c1*Z + c0 = 0 (método trigonométrico / Cardano)
+    """
+    p = c1 - c2 * c2 / 3
+    q = 2 * c2 ** 3 / 27 - c2 * c1 / 3 + c0
+    desplazamiento = -c2 / 3
+    discriminante = (q / 2) ** 2 + (p / 3) ** 3
+    if discriminante > 0:
+        raiz = math.sqrt(discriminante)
+        u = -q / 2 + raiz
+        v = -q / 2 - raiz
+        return [math.copysign(abs(u) ** (1 / 3), u) + math.copysign(abs(v) ** (1 / 3), v) + desplazamiento]
+    r = math.sqrt(max(-p / 3, 0.0))
+    if r == 0:
+        return [desplazamiento]
+    angulo = math.acos(max(-1.0, min(1.0, -q / (2 * r ** 3))))
+    return [2 * r * math.cos((angulo - 2 * math.pi * k) / 3) + desplazamiento for k in range(3)]
+
+class _Fase:
+    """
+    Una fase de Peng-Robinson a (T, P, composición molar): Z, fugacidades y funciones residuales
+    """
+    __slots__ = ("Z", "ln_phi", "h_res", "s_res", "v")
+
+    def __init__(self, Z: float, ln_phi: list[float], h_res: float, s_res: float, v: float) -> None:
+        self.Z = Z
+        self.ln_phi = ln_phi
+        self.h_res = h_res
+        self.s_res = s_res
+        self.v = v
+
+class ErrorSintetico(Exception):
+    def __init__(self, ierr: int, herr: str) -> None:
+        super().__init__(herr)
+        self.ierr = ierr
+        self.herr = herr
+
+class BackendSintetico:
+    """
+    Sustituto de REFPROP en Python puro para perfilar y probar en máquinas sin el DLL.
+    Ecuación de Peng-Robinson con reglas de mezcla de van der Waals (kij = 0), cp de gas ideal
+    polinómico y estado de referencia IIR (h = 200 kJ/kg, s = 1 kJ/(kg*K) en líquido saturado a 0 ºC).
+
+    Implementa lo que usa el proyecto de REFPROPdll: entradas TP, PH, PS, TH, TQ, PQ (en cualquier orden)
+    y "" (constantes críticas); salidas T, P, D, V, H, S, E, Q, TC, PC en unidades "SI WITH C"
+    y composición másica. Las calidades fuera de la campana siguen el convenio de REFPROP
+    (-998 líquido, 998 vapor, 999 supercrítico) y las mezclas por encima de su punto crítico
+    devuelven ierr > 0 en los flash de saturación, igual que el DLL.
+    De las rutinas clásicas (base molar) tiene TPRHOdll, THERMdll (sin cv, cp, w ni hjt) y XMOLEdll.
+
+    Los valores son realistas (mismo orden de magnitud y tendencias que REFPROP) pero no exactos.
+    La latencia opcional (s) se añade a cada REFPROPdll para simular el coste del DLL.
+    """
+    SI_WITH_C = 21
+    MAX_CACHE_SATURACION = 20_000
+
+    def __init__(self, latencia: float = 0.0) -> None:
+        self.latencia = latencia
+        self.fluidos: str | None = None
+        self.nombres: list[str] = []
+        self.Tc = self.Pc = self.omega = self.M = self.cp = self.a_c = self.b_i = self.kappa = []
+        self.h_off = self.s_off = []
+        self.llamadas = 0
+        # Saturación ya resuelta: (entrada, valor, composición) -> (T, P, x, y)
+        self._cache_saturacion: dict[tuple, tuple] = {}
+        # Referencia IIR de cada componente: nombre -> (h_off J/mol, s_off J/(mol*K))
+        self._referencias: dict[str, tuple[float, float]] = {}
+
+    def RPVersion(self) -> str:
+        return "sintetico-PR-1"
+
+    def SETUPdll(self, ncomp: int, hFiles: str, hFmix: str, hrf: str) -> SETUPdlloutput:
+        try:
+            self._cargar(hFiles)
+        except ErrorSintetico as e:
+            return SETUPdlloutput(e.ierr, e.herr)
+        return SETUPdlloutput(0, "")
+
+    def SATSPLNdll(self, z: list[float]) -> SATSPLNdlloutput:
+        # No hay splines: las saturaciones ya se memorizan por composición
+        return SATSPLNdlloutput(0, "")
+
+    def XMOLEdll(self, xkg: list[float]) -> XMOLEdlloutput:
+        x = self._molar(list(xkg[:len(self.nombres)]))
+        return XMOLEdlloutput(x, self._masa_molar(x))
+
+    def TPRHOdll(self, T: float, P: float, z: list[float], kph: int, kguess: int, D: float) -> TPRHOdlloutput:
+        # La cúbica se resuelve directamente: la estimación inicial (kguess) no cambia nada
+        x = list(z[:len(self.nombres)])
+        if T <= 0 or P <= 0:
+            return TPRHOdlloutput(0.0, 1, "[TPRHO error 1] Entrada no válida")
+        fase = self._fase(T, P * 1e3, x, "liquido" if kph == 1 else "vapor")
+        return TPRHOdlloutput(1 / (fase.v * 1000), 0, "")
+
+    def THERMdll(self, T: float, D: float, z: list[float]) -> THERMdlloutput:
+        x = list(z[:len(self.nombres)])
+        v = 1 / (D * 1000)
+        # Presión explícita de Peng-Robinson y la raíz de la cúbica más cercana a ese volumen
+        a = sum(xi * math.sqrt(a_c) * (1 + kappa * (1 - math.sqrt(T / Tc)))
+                for xi, a_c, kappa, Tc in zip(x, self.a_c, self.kappa, self.Tc)) ** 2
+        b = sum(xi * bi for xi, bi in zip(x, self.b_i))
+        P = R * T / (v - b) - a / (v * v + 2 * b * v - b * b)
+        fase = min((self._fase(T, P, x, raiz) for raiz in ("liquido", "vapor")), key=lambda f: abs(f.v - v))
+        h = self._h_ideal(T, x) + fase.h_res
+        s = self._s_ideal(T, P, x) + fase.s_res
+        return THERMdlloutput(P / 1e3, h - P * v, h, s, 0.0, 0.0, 0.0, 0.0)
+
+    def _cargar(self, hFld: str) -> None:
+        if hFld == self.fluidos:
+            return
+        nombres = []
+        for nombre in hFld.split(";"):
+            nombre = nombre.strip().upper().removesuffix(".FLD")
+            nombre = SINONIMOS.get(nombre, nombre)
+            if nombre not in COMPONENTES:
+                raise ErrorSintetico(101, f"[SETUP error 101] Fluido no encontrado: {nombre}")
+            nombres.append(nombre)
+
+        self.fluidos = hFld
+        self.nombres = nombres
+        datos = [COMPONENTES[nombre] for nombre in nombres]
+        self.Tc = [d[0] for d in datos]
+        self.Pc = [d[1] * 1e6 for d in datos]
+        self.omega = [d[2] for d in datos]
+        self.M = [d[3] for d in datos]
+        self.cp = [d[4] for d in datos]
+        self.a_c = [0.45724 * (R * Tc) ** 2 / Pc for Tc, Pc in zip(self.Tc, self.Pc)]
+        self.b_i = [0.07780 * R * Tc / Pc for Tc, Pc in zip(self.Tc, self.Pc)]
+        self.kappa = [0.37464 + 1.54226 * w - 0.26992 * w * w for w in self.omega]
+        self._cache_saturacion.clear()
+
+        for nombre in nombres:
+            if nombre not in self._referencias:
+                self._referencias[nombre] = self._referencia_IIR(nombre)
+        self.h_off = [self._referencias[nombre][0] for nombre in nombres]
+        self.s_off = [self._referencias[nombre][1] for nombre in nombres]
+
+    def _referencia_IIR(self, nombre: str) -> tuple[float, float]:
+        """
+        Constantes del gas ideal para que el líquido saturado a 0 ºC tenga h = 200 kJ/kg y s = 1 kJ/(kg*K)
+        """
+        anterior = (self.fluidos, self.nombres, self.Tc, self.Pc, self.omega, self.M, self.cp,
+                    self.a_c, self.b_i, self.kappa, self._cache_saturacion)
+        self._cache_saturacion = {}
+        self.nombres = [nombre]
+        Tc, Pc, omega, M, cp = COMPONENTES[nombre]
+        (self.Tc, self.Pc, self.omega, self.M, self.cp) = ([Tc], [Pc * 1e6], [omega], [M], [cp])
+        self.a_c = [0.45724 * (R * Tc) ** 2 / (Pc * 1e6)]
+        self.b_i = [0.07780 * R * Tc / (Pc * 1e6)]
+        self.kappa = [0.37464 + 1.54226 * omega - 0.26992 * omega * omega]
+        self.h_off = [0.0]
+        self.s_off = [0.0]
+
+        T = min(T_0, 0.95 * Tc)
+        try:
+            _, P, _, _ = self._saturacion_molar([1.0], 0.0, T=T)
+            liquido = self._fase(T, P, [1.0], "liquido")
+            h = self._h_ideal(T, [1.0]) + liquido.h_res
+            s = self._s_ideal(T, P, [1.0]) + liquido.s_res
+            referencia = (200.0 * M - h, 1.0 * M - s)
+        except ErrorSintetico:
+            referencia = (0.0, 0.0)
+
+        (self.fluidos, self.nombres, self.Tc, self.Pc, self.omega, self.M, self.cp,
+         self.a_c, self.b_i, self.kappa, self._cache_saturacion) = anterior
+        return referencia
+
+    # Ecuación de estado
+
+    def _fase(self, T: float, P: float, x: list[float], raiz: str) -> _Fase:
+        """
+        Resolver Peng-Robinson para la raíz "liquido", "vapor" o "estable" (menor energía de Gibbs)
+        """
+        raices_a = []
+        derivadas_raiz_a = []
+        for a_c, kappa, Tc in zip(self.a_c, self.kappa, self.Tc):
+            alfa = 1 + kappa * (1 - math.sqrt(T / Tc))
+            raices_a.append(math.sqrt(a_c) * alfa)
+            derivadas_raiz_a.append(-math.sqrt(a_c) * kappa / (2 * math.sqrt(T * Tc)))
+
+        # Con kij = 0: a = (sum x_i sqrt(a_i))^2 y sum_j x_j a_ij = sqrt(a_i) * sum x_j sqrt(a_j)
+        q = sum(xi * ra for xi, ra in zip(x, raices_a))
+        dq = sum(xi * dra for xi, dra in zip(x, derivadas_raiz_a))
+        a = q * q
+        dadT = 2 * q * dq
+        b = sum(xi * bi for xi, bi in zip(x, self.b_i))
+
+        A = a * P / (R * T) ** 2
+        B = b * P / (R * T)
+        raices = _raices_cubica(-(1 - B), A - 3 * B * B - 2 * B, -(A * B - B * B - B ** 3))
+
+        def pulir(Z: float) -> float:
+            """
+            Refinar una raíz con Newton en eta = v - b: con presiones muy bajas la raíz de líquido está
+            pegada a B y Z - B se pierde por cancelación en la fórmula de la cúbica. Devuelve Z - B.
+            """
+            eta = max((Z - B) * R * T / P, 1e-3 * b)
+            for _ in range(50):
+                v = b + eta
+                D = v * v + 2 * b * v - b * b
+                F = R * T / eta - a / D - P
+                dF = -R * T / eta ** 2 + a * (2 * v + 2 * b) / D ** 2
+                nuevo = eta - F / dF
+                if nuevo <= 0:
+                    nuevo = eta / 2
+                if abs(nuevo - eta) < 1e-13 * eta:
+                    eta = nuevo
+                    break
+                eta = nuevo
+            return P * eta / (R * T)
+
+        def construir(ZB: float) -> _Fase:
+            Z = ZB + B
+            logaritmo = math.log((Z + (1 + RAIZ_2) * B) / (Z + (1 - RAIZ_2) * B))
+            termino = A / (2 * RAIZ_2 * B) * logaritmo
+            ln_ZB = math.log(ZB)
+            ln_phi = [bi / b * (Z - 1) - ln_ZB - termino * (2 * ra * q / a - bi / b)
+                      for bi, ra in zip(self.b_i, raices_a)]
+            h_res = R * T * (Z - 1) + (T * dadT - a) / (2 * RAIZ_2 * b) * logaritmo
+            s_res = R * ln_ZB + dadT / (2 * RAIZ_2 * b) * logaritmo
+            return _Fase(Z, ln_phi, h_res, s_res, Z * R * T / P)
+
+        ZB_liquido = pulir(min(raices))
+        if raiz == "liquido" or len(raices) == 1:
+            return construir(ZB_liquido)
+        ZB_vapor = pulir(max(raices))
+        if raiz == "vapor":
+            return construir(ZB_vapor)
+        fases = [construir(ZB_liquido), construir(ZB_vapor)]
+        return min(fases, key=lambda f: sum(xi * lp for xi, lp in zip(x, f.ln_phi)))
+
+    def _h_ideal(self, T: float, x: list[float]) -> float:
+        h = 0.0
+        for xi, (A, B, C, D), off in zip(x, self.cp, self.h_off):
+            h += xi * (A * (T - T_0) + B / 2 * (T ** 2 - T_0 ** 2) + C / 3 * (T ** 3 - T_0 ** 3)
+                       + D / 4 * (T ** 4 - T_0 ** 4) + off)
+        return h
+
+    def _s_ideal(self, T: float, P: float, x: list[float]) -> float:
+        s = -R * math.log(P / P_0)
+        for xi, (A, B, C, D), off in zip(x, self.cp, self.s_off):
+            if xi > 0:
+                s += xi * (A * math.log(T / T_0) + B * (T - T_0) + C / 2 * (T ** 2 - T_0 ** 2)
+                           + D / 3 * (T ** 3 - T_0 ** 3) + off - R * math.log(xi))
+        return s
+
+    # Composiciones
+
+    def _molar(self, w: list[float]) -> list[float]:
+        moles = [wi / Mi for wi, Mi in zip(w, self.M)]
+        total = sum(moles)
+        return [m / total for m in moles]
+
+    def _masica(self, x: list[float]) -> list[float]:
+        masas = [xi * Mi for xi, Mi in zip(x, self.M)]
+        total = sum(masas)
+        return [m / total for m in masas]
+
+    def _masa_molar(self, x: list[float]) -> float:
+        return sum(xi * Mi for xi, Mi in zip(x, self.M))
+
+    # Equilibrio de fases
+
+    def _k_wilson(self, T: float, P: float) -> list[float]:
+        return [Pc / P * math.exp(5.373 * (1 + w) * (1 - Tc / T)) for Tc, Pc, w in zip(self.Tc, self.Pc, self.omega)]
+
+    def _saturacion_molar(self, z: list[float], q: float, T: float | None = None, P: float | None = None,
+                          calidad_masica: bool = False) -> tuple[float, float, list[float], list[float]]:
+        """
+        Punto de saturación con fracción de vapor q (0 burbuja, 1 rocío) a T o P dada.
+        Devuelve (T, P, x líquido, y vapor). Sustitución sucesiva en K con Newton en ln(P) o en T.
+        """
+        calidad_masica = calidad_masica and 0 < q < 1
+        clave = ("T" if T is not None else "P", T if T is not None else P, q, calidad_masica, tuple(z))
+        guardado = self._cache_saturacion.get(clave)
+        if guardado is not None:
+            return guardado
+
+        n = len(z)
+        if T is not None:
+            if T >= max(self.Tc) * 1.2 or T <= 0:
+                raise ErrorSintetico(221, "[SATT error 221] Temperatura fuera del rango de saturación")
+            K = self._k_wilson(T, 1e5)
+            # Presión de Wilson (K proporcional a 1/P)
+            P = 1e5 * ((1 - q) * sum(zi * Ki for zi, Ki in zip(z, K))
+                       + q / sum(zi / Ki for zi, Ki in zip(z, K)))
+            K = self._k_wilson(T, P)
+        else:
+            if P >= max(self.Pc) * 2 or P <= 0:
+                raise ErrorSintetico(222, "[SATP error 222] Presión fuera del rango de saturación")
+            # Temperatura de Wilson por bisección
+            bajo, alto = 50.0, max(self.Tc) * 1.5
+            for _ in range(60):
+                T = 0.5 * (bajo + alto)
+                K = self._k_wilson(T, P)
+                g = sum(zi * (Ki - 1) / (1 + q * (Ki - 1)) for zi, Ki in zip(z, K))
+                if g > 0:
+                    alto = T
+                else:
+                    bajo = T
+            K = self._k_wilson(T, P)
+
+        derivada_wilson = [5.373 * (1 + w) * Tc for Tc, w in zip(self.Tc, self.omega)]
+        beta = q
+        x = list(z)
+        y = list(z)
+        for _ in range(300):
+            denominadores = [1 + beta * (Ki - 1) for Ki in K]
+            g = sum(zi * (Ki - 1) / d for zi, Ki, d in zip(z, K, denominadores))
+            pendiente = sum(zi * Ki / d ** 2 for zi, Ki, d in zip(z, K, denominadores))
+
+            # Newton en la variable libre (K ~ 1/P y ln K ~ -c/T)
+            if clave[0] == "T":
+                P *= math.exp(max(-0.5, min(0.5, g / pendiente)))
+            else:
+                pendiente_T = sum(zi * Ki * c / T ** 2 / d ** 2 for zi, Ki, c, d in zip(z, K, derivada_wilson, denominadores))
+                T -= max(-10.0, min(10.0, g / pendiente_T))
+
+            x = [zi / d for zi, d in zip(z, denominadores)]
+            y = [Ki * xi for Ki, xi in zip(K, x)]
+            suma_x, suma_y = sum(x), sum(y)
+            x = [xi / suma_x for xi in x]
+            y = [yi / suma_y for yi in y]
+
+            liquido = self._fase(T, P, x, "liquido")
+            vapor = self._fase(T, P, y, "vapor")
+            K_nueva = [math.exp(lpl - lpv) for lpl, lpv in zip(liquido.ln_phi, vapor.ln_phi)]
+            cambio = max(abs(math.log(Kn / Ki)) for Kn, Ki in zip(K_nueva, K))
+            K = K_nueva
+
+            if calidad_masica and 0 < q < 1:
+                # Pasar la calidad másica a fracción molar de vapor con las masas molares de cada fase
+                M_l, M_v = self._masa_molar(x), self._masa_molar(y)
+                beta = (q / M_v) / (q / M_v + (1 - q) / M_l)
+
+            if cambio < 1e-10 and abs(g) < 1e-10:
+                # Si líquido y vapor son la misma fase la solución es trivial (por encima del crítico)
+                if abs(liquido.Z - vapor.Z) < 1e-6:
+                    raise ErrorSintetico(223, "[SAT error 223] Solución trivial, punto por encima del crítico")
+                break
+        else:
+            raise ErrorSintetico(224, "[SAT error 224] El cálculo de saturación no converge")
+
+        if n == 1:
+            x, y = [1.0], [1.0]
+        resultado = (T, P, x, y)
+        if len(self._cache_saturacion) > self.MAX_CACHE_SATURACION:
+            self._cache_saturacion.clear()
+        self._cache_saturacion[clave] = resultado
+        return resultado
+
+    def _flash_bifasico(self, T: float, P: float, z: list[float], T_b: float, T_d: float) -> tuple[float, list[float], list[float]]:
+        """
+        Flash TP dentro de la campana de una mezcla: devuelve (fracción molar de vapor, x, y)
+        """
+        beta = (T - T_b) / (T_d - T_b)
+        K = self._k_wilson(T, P)
+        x, y = list(z), list(z)
+        for _ in range(200):
+            # Rachford-Rice por Newton acotado
+            for _ in range(50):
+                denominadores = [1 + beta * (Ki - 1) for Ki in K]
+                g = sum(zi * (Ki - 1) / d for zi, Ki, d in zip(z, K, denominadores))
+                dg = -sum(zi * (Ki - 1) ** 2 / d ** 2 for zi, Ki, d in zip(z, K, denominadores))
+                nuevo = min(1.0, max(0.0, beta - g / dg))
+                if abs(nuevo - beta) < 1e-13:
+                    beta = nuevo
+                    break
+                beta = nuevo
+            denominadores = [1 + beta * (Ki - 1) for Ki in K]
+            x = [zi / d for zi, d in zip(z, denominadores)]
+            y = [Ki * xi for Ki, xi in zip(K, x)]
+            suma_x, suma_y = sum(x), sum(y)
+            x = [xi / suma_x for xi in x]
+            y = [yi / suma_y for yi in y]
+            liquido = self._fase(T, P, x, "liquido")
+            vapor = self._fase(T, P, y, "vapor")
+            K_nueva = [math.exp(lpl - lpv) for lpl, lpv in zip(liquido.ln_phi, vapor.ln_phi)]
+            cambio = max(abs(math.log(Kn / Ki)) for Kn, Ki in zip(K_nueva, K))
+            K = K_nueva
+            if cambio < 1e-10:
+                break
+        return beta, x, y
+
+    # Estados
+
+    def _estado_monofasico(self, T: float, P: float, z: list[float], raiz: str, q: float) -> dict:
+        fase = self._fase(T, P, z, raiz)
+        return {
+            "T": T, "P": P, "beta": None, "q": q, "x": z, "y": z,
+            "h": self._h_ideal(T, z) + fase.h_res,
+            "s": self._s_ideal(T, P, z) + fase.s_res,
+            "v": fase.v, "M": self._masa_molar(z),
+        }
+
+    def _estado_bifasico(self, T: float, P: float, beta: float, x: list[float], y: list[float]) -> dict:
+        liquido = self._fase(T, P, x, "liquido")
+        vapor = self._fase(T, P, y, "vapor")
+        M_l, M_v = self._masa_molar(x), self._masa_molar(y)
+        return {
+            "T": T, "P": P, "beta": beta, "x": x, "y": y,
+            "q": beta * M_v / (beta * M_v + (1 - beta) * M_l),
+            "h": (1 - beta) * (self._h_ideal(T, x) + liquido.h_res) + beta * (self._h_ideal(T, y) + vapor.h_res),
+            "s": (1 - beta) * (self._s_ideal(T, P, x) + liquido.s_res) + beta * (self._s_ideal(T, P, y) + vapor.s_res),
+            "v": (1 - beta) * liquido.v + beta * vapor.v,
+            "M": (1 - beta) * M_l + beta * M_v,
+        }
+
+    def _limites_campana(self, P: float, z: list[float]) -> tuple[float, float] | None:
+        """
+        Temperaturas de burbuja y rocío a la presión P, o None si la presión es supercrítica
+        """
+        try:
+            T_b = self._saturacion_molar(z, 0.0, P=P)[0]
+            T_d = self._saturacion_molar(z, 1.0, P=P)[0]
+        except ErrorSintetico:
+            return None
+        return T_b, T_d
+
+    def _estado_TP(self, T: float, P: float, z: list[float]) -> dict:
+        campana = self._limites_campana(P, z)
+        if campana is None:
+            return self._estado_monofasico(T, P, z, "estable", Q_SUPERCRITICO)
+        T_b, T_d = campana
+        if T <= T_b:
+            return self._estado_monofasico(T, P, z, "liquido", Q_LIQUIDO)
+        if T >= T_d:
+            return self._estado_monofasico(T, P, z, "vapor", Q_VAPOR)
+        beta, x, y = self._flash_bifasico(T, P, z, T_b, T_d)
+        return self._estado_bifasico(T, P, beta, x, y)
+
+    def _estado_saturado(self, z: list[float], q: float, T: float | None = None, P: float | None = None) -> dict:
+        T, P, x, y = self._saturacion_molar(z, q, T=T, P=P, calidad_masica=True)
+        if len(z) == 1:
+            # Fluido puro: regla de la palanca entre líquido y vapor saturados (q másica = molar)
+            liquido = self._estado_monofasico(T, P, z, "liquido", 0.0)
+            vapor = self._estado_monofasico(T, P, z, "vapor", 1.0)
+            return self._mezclar_saturados(liquido, vapor, q)
+        if q <= 0:
+            estado = self._estado_monofasico(T, P, z, "liquido", 0.0)
+            estado["y"] = y
+            return estado
+        if q >= 1:
+            estado = self._estado_monofasico(T, P, z, "vapor", 1.0)
+            estado["x"] = x
+            return estado
+        M_l, M_v = self._masa_molar(x), self._masa_molar(y)
+        beta = (q / M_v) / (q / M_v + (1 - q) / M_l)
+        return self._estado_bifasico(T, P, beta, x, y)
+
+    @staticmethod
+    def _mezclar_saturados(liquido: dict, vapor: dict, q: float) -> dict:
+        estado = dict(liquido)
+        for clave in ("h", "s", "v"):
+            estado[clave] = (1 - q) * liquido[clave] + q * vapor[clave]
+        estado["q"] = q
+        estado["beta"] = q
+        return estado
+
+    def _resolver(self, funcion, objetivo: float, bajo: float, alto: float, logaritmica: bool = False) -> float:
+        """
+        Resolver funcion(t) = objetivo en [bajo, alto] con función monótona (regula falsi de Illinois)
+        """
+        transformar = math.log if logaritmica else (lambda t: t)
+        deshacer = math.exp if logaritmica else (lambda t: t)
+        u_bajo, u_alto = transformar(bajo), transformar(alto)
+        f_bajo = funcion(deshacer(u_bajo)) - objetivo
+        f_alto = funcion(deshacer(u_alto)) - objetivo
+        if f_bajo * f_alto > 0:
+            raise ErrorSintetico(5, "[Entrada error 5] Valores de entrada fuera del rango de la ecuación")
+        lado = 0
+        for _ in range(200):
+            u = (u_bajo * f_alto - u_alto * f_bajo) / (f_alto - f_bajo)
+            f = funcion(deshacer(u)) - objetivo
+            if abs(f) < 1e-9 * max(1.0, abs(objetivo)) or abs(u_alto - u_bajo) < 1e-12:
+                return deshacer(u)
+            if f * f_alto > 0:
+                u_alto, f_alto = u, f
+                if lado == 1:
+                    f_bajo /= 2
+                lado = 1
+            else:
+                u_bajo, f_bajo = u, f
+                if lado == -1:
+                    f_alto /= 2
+                lado = -1
+        return deshacer(u)
+
+    def _estado_P_y(self, P: float, propiedad: str, valor: float, z: list[float]) -> dict:
+        """
+        Estado a presión P con h o s (J/mol o J/(mol*K)) dada
+        """
+        T_min, T_max = 0.3 * min(self.Tc), 3.0 * max(self.Tc)
+        campana = self._limites_campana(P, z)
+        if campana is None:
+            T = self._resolver(lambda T: self._estado_monofasico(T, P, z, "estable", 0)[propiedad], valor, T_min, T_max)
+            return self._estado_monofasico(T, P, z, "estable", Q_SUPERCRITICO)
+
+        T_b, T_d = campana
+        liquido = self._estado_saturado(z, 0.0, P=P)
+        vapor = self._estado_saturado(z, 1.0, P=P)
+        if valor <= liquido[propiedad]:
+            T = self._resolver(lambda T: self._estado_monofasico(T, P, z, "liquido", 0)[propiedad], valor, T_min, T_b)
+            return self._estado_monofasico(T, P, z, "liquido", Q_LIQUIDO)
+        if valor >= vapor[propiedad]:
+            T = self._resolver(lambda T: self._estado_monofasico(T, P, z, "vapor", 0)[propiedad], valor, T_d, T_max)
+            return self._estado_monofasico(T, P, z, "vapor", Q_VAPOR)
+        if len(z) == 1:
+            q = (valor - liquido[propiedad]) / (vapor[propiedad] - liquido[propiedad])
+            return self._mezclar_saturados(liquido, vapor, q)
+        T = self._resolver(lambda T: self._estado_TP(T, P, z)[propiedad], valor, T_b, T_d)
+        return self._estado_TP(T, P, z)
+
+    def _estado_T_h(self, T: float, h: float, z: list[float]) -> dict:
+        """
+        Estado a temperatura T con h (J/mol) dada: la entalpía baja al subir la presión
+        """
+        P_min, P_max = 1e2, 2.0 * max(self.Pc) * 10
+        if len(z) == 1 and T < self.Tc[0]:
+            liquido = self._estado_saturado(z, 0.0, T=T)
+            vapor = self._estado_saturado(z, 1.0, T=T)
+            P_sat = liquido["P"]
+            if liquido["h"] <= h <= vapor["h"]:
+                return self._mezclar_saturados(liquido, vapor, (h - liquido["h"]) / (vapor["h"] - liquido["h"]))
+            if h > vapor["h"]:
+                P = self._resolver(lambda P: self._estado_monofasico(T, P, z, "vapor", 0)["h"], h, P_min, P_sat, True)
+                return self._estado_monofasico(T, P, z, "vapor", Q_VAPOR)
+            P = self._resolver(lambda P: self._estado_monofasico(T, P, z, "liquido", 0)["h"], h, P_sat, P_max, True)
+            return self._estado_monofasico(T, P, z, "liquido", Q_LIQUIDO)
+        P = self._resolver(lambda P: self._estado_TP(T, P, z)["h"], h, P_min, P_max, True)
+        return self._estado_TP(T, P, z)
+
+    # API de REFPROP
+
+    def REFPROPdll(self, hFld: str, hIn: str, hOut: str, iUnits: int, iMass: int, iFlag: int,
+                   a: float, b: float, z: list[float]) -> REFPROPdlloutput:
+        self.llamadas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+        salida = [0.0] * 200
+        composicion = list(z) + [0.0] * (20 - len(z))
+        try:
+            if hFld:
+                self._cargar(hFld)
+            if self.fluidos is None:
+                raise ErrorSintetico(101, "[SETUP error 101] No hay fluidos cargados")
+
+            w = list(z[:len(self.nombres)])
+            if sum(w) <= 0:
+                raise ErrorSintetico(3, "[Entrada error 3] Composición no válida")
+            zm = self._molar(w) if iMass else [wi / sum(w) for wi in w]
+            try:
+                estado = self._calcular(hIn.upper(), a, b, zm)
+            except (ArithmeticError, ValueError):
+                # Iteración que se ha ido fuera de rango: el DLL lo devuelve como falta de convergencia
+                raise ErrorSintetico(201, "[Flash error 201] El cálculo no converge")
+            nombres = [texto.strip().upper() for texto in hOut.split(";") if texto.strip()]
+            for i, nombre in enumerate(nombres):
+                salida[i] = self._propiedad(nombre, estado, zm)
+        except ErrorSintetico as e:
+            salida = [-9999970.0] * 200
+            return REFPROPdlloutput(composicion, salida, "", 0, [0.0] * 20, [0.0] * 20, [0.0] * 20,
+                                    -9999970.0, e.ierr, e.herr)
+
+        if estado is None:
+            x = y = composicion
+            q = 0.0
+        else:
+            masica = (lambda f: self._masica(f)) if iMass else (lambda f: f)
+            x = masica(estado["x"]) + [0.0] * (20 - len(estado["x"]))
+            y = masica(estado["y"]) + [0.0] * (20 - len(estado["y"]))
+            q = estado["q"]
+        return REFPROPdlloutput(composicion, salida, "", 0, x, y, [0.0] * 20, q, 0, "")
+
+    def _calcular(self, entrada: str, a: float, b: float, z: list[float]) -> dict | None:
+        if entrada == "":
+            return None
+        if len(entrada) != 2:
+            raise ErrorSintetico(9, f"[Entrada error 9] Entrada no soportada: {entrada}")
+
+        # Ordenar las entradas: T < P < H < S < Q
+        orden = "TPHSQ"
+        primera, segunda = entrada[0], entrada[1]
+        if primera not in orden or segunda not in orden:
+            raise ErrorSintetico(9, f"[Entrada error 9] Entrada no soportada: {entrada}")
+        if orden.index(primera) > orden.index(segunda):
+            primera, segunda, a, b = segunda, primera, b, a
+        par = primera + segunda
+
+        # Unidades: ºC, MPa, kJ/kg, kJ/(kg*K) -> K, Pa, J/mol, J/(mol*K)
+        M = self._masa_molar(z)
+        convertir = {"T": lambda v: v + 273.15, "P": lambda v: v * 1e6, "H": lambda v: v * M,
+                     "S": lambda v: v * M, "Q": lambda v: v}
+        a, b = convertir[primera](a), convertir[segunda](b)
+        if primera == "T" and a <= 0:
+            raise ErrorSintetico(1, "[Entrada error 1] Temperatura por debajo del cero absoluto")
+        if "P" in par and (a if primera == "P" else b) <= 0:
+            raise ErrorSintetico(2, "[Entrada error 2] Presión negativa")
+
+        if par == "TP":
+            return self._estado_TP(a, b, z)
+        if par == "PH":
+            return self._estado_P_y(a, "h", b, z)
+        if par == "PS":
+            return self._estado_P_y(a, "s", b, z)
+        if par == "TH":
+            return self._estado_T_h(a, b, z)
+        if par == "TQ":
+            return self._estado_saturado(z, b, T=a)
+        if par == "PQ":
+            return self._estado_saturado(z, b, P=a)
+        raise ErrorSintetico(9, f"[Entrada error 9] Entrada no soportada: {entrada}")
+
+    def _propiedad(self, nombre: str, estado: dict | None, z: list[float]) -> float:
+        if nombre in ("TC", "TCRIT"):
+            return sum(zi * Tc for zi, Tc in zip(z, self.Tc)) - 273.15
+        if nombre in ("PC", "PCRIT"):
+            return sum(zi * Pc for zi, Pc in zip(z, self.Pc)) / 1e6
+        if estado is None:
+            raise ErrorSintetico(9, f"[Salida error 9] {nombre} necesita un estado")
+
+        M = estado["M"]
+        if nombre == "T":
+            return estado["T"] - 273.15
+        if nombre == "P":
+            return estado["P"] / 1e6
+        if nombre == "H":
+            return estado["h"] / M
+        if nombre == "S":
+            return estado["s"] / M
+        if nombre == "E":
+            return (estado["h"] - estado["P"] * estado["v"]) / M
+        if nombre == "D":
+            return M / 1000 / estado["v"]
+        if nombre == "V":
+            return estado["v"] / (M / 1000)
+        if nombre in ("Q", "QMASS"):
+            return estado["q"]
+        if nombre == "M":
+            return M
+        raise ErrorSintetico(9, f"[Salida error 9] Propiedad no soportada por el backend sintético: {nombre}")
+
+# Trazas de llamadas: formato binario con un byte de tipo delante de cada valor
+
+# RPTRAZA2: cada llamada lleva la mezcla cargada de la que depende su resultado
+_MAGIA = b"RPTRAZA2"
+_REGISTRO_LLAMADA = b"C"
+_REGISTRO_ATRIBUTO = b"A"
+_U32 = struct.Struct("<I")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+def _codificar(valor, partes: list[bytes]) -> None:
+    """
+    Codificar un valor (None, int, float, str, namedtuple o lista) en partes. Las listas de reales
+    se guardan sin los ceros del final (Output tiene 200 huecos y casi todos son 0).
+    """
+    if valor is None:
+        partes.append(b"n")
+    elif isinstance(valor, numbers.Integral):
+        partes.append(b"i" + _I64.pack(int(valor)))
+    elif isinstance(valor, numbers.Real):
+        partes.append(b"d" + _F64.pack(float(valor)))
+    elif isinstance(valor, str):
+        texto = valor.encode("utf-8")
+        partes.append(b"s" + _U32.pack(len(texto)) + texto)
+    elif hasattr(valor, "_fields"):
+        partes.append(b"t")
+        _codificar(type(valor).__name__, partes)
+        partes.append(_U32.pack(len(valor._fields)))
+        for campo, v in zip(valor._fields, valor):
+            _codificar(campo, partes)
+            _codificar(v, partes)
+    else:
+        valores = list(valor)
+        if all(isinstance(v, float) for v in valores):
+            n_util = len(valores)
+            while n_util and valores[n_util - 1] == 0.0 and math.copysign(1.0, valores[n_util - 1]) > 0:
+                n_util -= 1
+            partes.append(b"f" + _U32.pack(len(valores)) + _U32.pack(n_util)
+                          + struct.pack(f"<{n_util}d", *valores[:n_util]))
+        else:
+            partes.append(b"l" + _U32.pack(len(valores)))
+            for v in valores:
+                _codificar(v, partes)
+
+_TIPOS_TUPLA: dict[tuple, type] = {}
+
+def _decodificar(datos, posicion: int) -> tuple[object, int]:
+    """
+    Decodificar el valor que empieza en posicion. Devuelve (valor, posición siguiente).
+    """
+    tipo = datos[posicion:posicion + 1]
+    posicion += 1
+    if tipo == b"n":
+        return None, posicion
+    if tipo == b"i":
+        return _I64.unpack_from(datos, posicion)[0], posicion + 8
+    if tipo == b"d":
+        return _F64.unpack_from(datos, posicion)[0], posicion + 8
+    if tipo == b"s":
+        n = _U32.unpack_from(datos, posicion)[0]
+        posicion += 4
+        return bytes(datos[posicion:posicion + n]).decode("utf-8"), posicion + n
+    if tipo == b"f":
+        n = _U32.unpack_from(datos, posicion)[0]
+        n_util = _U32.unpack_from(datos, posicion + 4)[0]
+        posicion += 8
+        valores = list(struct.unpack_from(f"<{n_util}d", datos, posicion))
+        return valores + [0.0] * (n - n_util), posicion + 8 * n_util
+    if tipo == b"l":
+        n = _U32.unpack_from(datos, posicion)[0]
+        posicion += 4
+        valores = []
+        for _ in range(n):
+            valor, posicion = _decodificar(datos, posicion)
+            valores.append(valor)
+        return valores, posicion
+    if tipo == b"t":
+        nombre, posicion = _decodificar(datos, posicion)
+        n = _U32.unpack_from(datos, posicion)[0]
+        posicion += 4
+        campos, valores = [], []
+        for _ in range(n):
+            campo, posicion = _decodificar(datos, posicion)
+            valor, posicion = _decodificar(datos, posicion)
+            campos.append(campo)
+            valores.append(valor)
+        clase = _TIPOS_TUPLA.get((nombre, tuple(campos)))
+        if clase is None:
+            clase = _TIPOS_TUPLA[(nombre, tuple(campos))] = namedtuple(nombre, campos)
+        return clase(*valores), posicion
+    raise ValueError(f"Traza de REFPROP corrupta: tipo {tipo!r} en la posición {posicion - 1}")
+
+def _es_llamada_dll(nombre: str) -> bool:
+    return nombre.endswith("dll")
+
+def _estado_llamada(nombre: str, args: tuple, cargada: str) -> str:
+    """
+    Mezcla cargada de la que depende el resultado de la llamada ("" si no depende de ninguna).
+    SETUPdll, SETPATHdll y REFPROPdll con hFld no dependen de la anterior; XMOLEdll, TPRHOdll,
+    THERMdll, SATSPLNdll, REFPROPdll con hFld vacío... trabajan con la que haya cargada.
+    """
+    if nombre in ("SETUPdll", "SETPATHdll") or (nombre == "REFPROPdll" and args and args[0]):
+        return ""
+    return cargada
+
+def _cargada_despues(nombre: str, args: tuple, resultado, cargada: str) -> str:
+    """
+    Mezcla cargada en el DLL después de la llamada
+    """
+    if nombre == "SETUPdll":
+        return args[1] if getattr(resultado, "ierr", 0) <= 0 else ""
+    if nombre == "REFPROPdll" and args and args[0]:
+        return args[0]
+    return cargada
+
+class BackendGrabacion:
+    """
+    Envoltorio de otro backend que graba cada llamada a la API (argumentos, resultado y tiempo)
+    en una traza binaria compacta, un fichero por proceso: <ruta>.<pid>.rptrace (<ruta>.<pid>-<hilo>.rptrace
+    fuera del hilo principal). Así los workers de un pool graban cada uno la suya sin bloquearse.
+
+    También acumula el tiempo que pasa dentro del backend por función (estadisticas), para separar
+    el coste de los flash del coste del resto del programa.
+
+    Cada grabación empieza de cero: el proceso principal borra al empezar las trazas que haya con la
+    misma ruta (de grabaciones anteriores), así la reproducción nunca mezcla llamadas de las dos.
+
+    Para que la reproducción encuentre todas las llamadas hay que repetir la misma configuración.
+    Las cachés que dependen de ejecuciones anteriores o del reparto entre workers (disco y memoria
+    compartida) cambian qué llamadas llegan al DLL, mejor grabar sin ellas.
+    """
+    TAMANO_BUFFER = 1 << 20
+
+    def __init__(self, interno, ruta: str) -> None:
+        self._interno = interno
+        principal = threading.current_thread() is threading.main_thread()
+        if principal:
+            self.ruta_fichero = f"{ruta}.{os.getpid()}.rptrace"
+        else:
+            self.ruta_fichero = f"{ruta}.{os.getpid()}-{threading.get_ident()}.rptrace"
+        if os.path.dirname(self.ruta_fichero):
+            os.makedirs(os.path.dirname(self.ruta_fichero), exist_ok=True)
+        if principal and parent_process() is None:
+            # Los workers (procesos o hilos) se crean después y graban junto a esta traza
+            for anterior in glob.glob(f"{glob.escape(ruta)}.*.rptrace"):
+                if anterior != self.ruta_fichero:
+                    os.remove(anterior)
+        self._fichero = open(self.ruta_fichero, "wb")
+        self._pendiente = bytearray(_MAGIA)
+        # nombre -> [llamadas, segundos dentro del backend]
+        self.tiempos: dict[str, list] = {}
+        # Mezcla cargada en el backend interno (se graba con las llamadas que dependen de ella)
+        self.cargada = ""
+
+        # Constantes del backend: se sirven igual al reproducir
+        self.SI_WITH_C = interno.SI_WITH_C
+        self.version = interno.RPVersion()
+        for nombre, valor in (("SI_WITH_C", self.SI_WITH_C), ("RPVersion", self.version)):
+            partes = [_REGISTRO_ATRIBUTO]
+            _codificar(nombre, partes)
+            _codificar(valor, partes)
+            self._pendiente += b"".join(partes)
+
+        util.Finalize(self, BackendGrabacion._cerrar_fichero, args=(self._fichero, self._pendiente), exitpriority=10)
+
+    def RPVersion(self) -> str:
+        return self.version
+
+    def __getattr__(self, nombre: str):
+        valor = getattr(self._interno, nombre)
+        if not (callable(valor) and _es_llamada_dll(nombre)):
+            return valor
+
+        tiempo = self.tiempos.setdefault(nombre, [0, 0.0])
+
+        def envoltorio(*args):
+            inicio = time.perf_counter()
+            resultado = valor(*args)
+            duracion = time.perf_counter() - inicio
+            tiempo[0] += 1
+            tiempo[1] += duracion
+
+            partes = [_REGISTRO_LLAMADA]
+            _codificar(nombre, partes)
+            _codificar(list(args), partes)
+            _codificar(_estado_llamada(nombre, args, self.cargada), partes)
+            partes.append(_F64.pack(duracion))
+            _codificar(resultado, partes)
+            self._pendiente += b"".join(partes)
+            self.cargada = _cargada_despues(nombre, args, resultado, self.cargada)
+            if len(self._pendiente) >= self.TAMANO_BUFFER:
+                self.volcar()
+            return resultado
+
+        # Guardar el envoltorio para no volver a pasar por __getattr__
+        setattr(self, nombre, envoltorio)
+        return envoltorio
+
+    def volcar(self) -> None:
+        self._fichero.write(self._pendiente)
+        self._fichero.flush()
+        self._pendiente.clear()
+
+    @staticmethod
+    def _cerrar_fichero(fichero, pendiente: bytearray) -> None:
+        if not fichero.closed:
+            fichero.write(pendiente)
+            pendiente.clear()
+            fichero.close()
+
+    def estadisticas(self) -> dict[str, dict[str, float]]:
+        """
+        Llamadas y tiempo (s) dentro del backend por función
+        """
+        return {nombre: {"llamadas": n, "tiempo": t} for nombre, (n, t) in self.tiempos.items()}
+
+class ErrorReproduccion(RuntimeError):
+    pass
+
+class BackendReproduccion:
+    """
+    Backend que responde con los resultados grabados por BackendGrabacion. Lee todas las trazas
+    <ruta>.*.rptrace (una por proceso de la grabación), las abre con mmap y crea un índice
+    (función, mezcla cargada, argumentos codificados) -> posición del resultado. Los resultados se
+    decodifican solo cuando se piden, así que son bit a bit iguales a los de la ejecución grabada.
+
+    La mezcla cargada se sigue igual que al grabar (SETUPdll y REFPROPdll con hFld la cambian), así
+    que XMOLEdll, TPRHOdll, THERMdll... solo devuelven resultados grabados con la misma mezcla.
+
+    Una llamada que no está en la traza, o que está grabada con otra mezcla cargada, lanza
+    ErrorReproduccion: la ejecución se ha desviado de la grabada (otros parámetros, otra versión
+    del código...).
+    """
+    def __init__(self, ruta: str) -> None:
+        self.ruta = ruta
+        ficheros = sorted(glob.glob(f"{glob.escape(ruta)}.*.rptrace"))
+        if not ficheros:
+            raise FileNotFoundError(f"No hay trazas de REFPROP en {ruta}.*.rptrace")
+
+        self._mapas = []
+        self._indice: dict[tuple[str, str, bytes], tuple] = {}
+        # (función, argumentos) -> mezcla con la que se grabó, para explicar los fallos
+        self._estados: dict[tuple[str, bytes], str] = {}
+        self.cargada = ""
+        self._atributos: dict[str, object] = {}
+        for fichero in ficheros:
+            with open(fichero, "rb") as f:
+                if os.fstat(f.fileno()).st_size <= len(_MAGIA):
+                    continue
+                mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._mapas.append(mapa)
+            self._indexar(mapa)
+
+        self.SI_WITH_C = self._atributos.get("SI_WITH_C", 0)
+        self.version = self._atributos.get("RPVersion", "")
+        # Llamadas servidas y tiempo que tardaron en la ejecución grabada
+        self.llamadas = 0
+        self.tiempo_grabado = 0.0
+
+    def _indexar(self, mapa: mmap.mmap) -> None:
+        if mapa[:len(_MAGIA)] != _MAGIA:
+            raise ValueError("Fichero de traza de REFPROP no válido")
+        posicion = len(_MAGIA)
+        final = len(mapa)
+        while posicion < final:
+            registro = mapa[posicion:posicion + 1]
+            posicion += 1
+            nombre, posicion = _decodificar(mapa, posicion)
+            if registro == _REGISTRO_ATRIBUTO:
+                valor, posicion = _decodificar(mapa, posicion)
+                self._atributos[nombre] = valor
+                continue
+            inicio_args = posicion
+            _, posicion = _decodificar(mapa, posicion)
+            argumentos = bytes(mapa[inicio_args:posicion])
+            estado, posicion = _decodificar(mapa, posicion)
+            duracion = _F64.unpack_from(mapa, posicion)[0]
+            posicion += 8
+            inicio_resultado = posicion
+            _, posicion = _decodificar(mapa, posicion)
+            # Si la misma llamada está repetida se queda la primera
+            self._indice.setdefault((nombre, estado, argumentos), (mapa, inicio_resultado, duracion))
+            self._estados.setdefault((nombre, argumentos), estado)
+
+    def RPVersion(self) -> str:
+        return self.version
+
+    def __getattr__(self, nombre: str):
+        if nombre.startswith("_") or not _es_llamada_dll(nombre):
+            raise AttributeError(nombre)
+
+        def reproducir(*args):
+            partes: list[bytes] = []
+            _codificar(list(args), partes)
+            argumentos = b"".join(partes)
+            estado = _estado_llamada(nombre, args, self.cargada)
+            encontrado = self._indice.get((nombre, estado, argumentos))
+            if encontrado is None:
+                grabado = self._estados.get((nombre, argumentos))
+                if grabado is not None:
+                    raise ErrorReproduccion(f"{nombre}{args} se grabó con la mezcla {grabado!r} cargada "
+                                            f"y ahora está cargada {estado!r}")
+                raise ErrorReproduccion(f"Llamada no grabada en {self.ruta}: {nombre}{args}")
+            mapa, posicion, duracion = encontrado
+            self.llamadas += 1
+            self.tiempo_grabado += duracion
+            resultado = _decodificar(mapa, posicion)[0]
+            self.cargada = _cargada_despues(nombre, args, resultado, self.cargada)
+            return resultado
+
+        setattr(self, nombre, reproducir)
+        return reproducir
+
+    def estadisticas(self) -> dict[str, float]:
+        """
+        Llamadas servidas, tiempo que costaron al grabarlas y tamaño del índice
+        """
+        return {
+            "llamadas": self.llamadas,
+            "tiempo_grabado": self.tiempo_grabado,
+            "llamadas_indexadas": len(self._indice),
+        }
@@ -0,0 +1,246 @@
+import sqlite3, struct, hashlib, time, os, threading
+from multiprocessing import util
+
+class CacheDisco:
+    """
+    Caché persistente de propiedades en SQLite compartida entre ejecuciones y entre los workers
+    de un ProcessPoolExecutor. Cada proceso abre su propia conexión, la base de datos está en modo
+    WAL (varios lectores y un escritor a la vez) y las escrituras se agrupan en lotes para que los
+    workers no se bloqueen entre ellos.
+
+    La clave incluye la versión y la ruta del DLL de REFPROP, así los resultados de otra versión
+    no se mezclan con los de la actual.
+
+    En un pool de hilos todos los hilos usan la misma conexión; un cerrojo ordena los accesos.
+    """
+    def __init__(self, ruta: str, version_refprop: str, tamano_lote: int = 500) -> None:
+        self.ruta = ruta
+        self.version_refprop = version_refprop
+        self.tamano_lote = tamano_lote
+        self.pendientes: dict[bytes, bytes] = {}
+        self.cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.escritos = 0
+
+        if os.path.dirname(ruta):
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        self._abrir()
+
+    def _abrir(self) -> None:
+        """
+        Abrir la conexión de este proceso
+        """
+        self.pid = os.getpid()
+        self.conexion = sqlite3.connect(self.ruta, timeout=60, isolation_level=None, check_same_thread=False)
+        self.conexion.execute("PRAGMA journal_mode=WAL")
+        self.conexion.execute("PRAGMA synchronous=NORMAL")
+        self.conexion.execute(
+            "CREATE TABLE IF NOT EXISTS propiedades (clave BLOB PRIMARY KEY, valores BLOB NOT NULL) WITHOUT ROWID"
+        )
+
+        # Volcar lo pendiente al cerrar el proceso (también en los workers del pool)
+        util.Finalize(self, CacheDisco._volcar_conexion, args=(self.conexion, self.pendientes), exitpriority=10)
+
+    def _comprobar_proceso(self) -> None:
+        """
+        En un proceso hijo creado con fork la conexión de SQLite heredada no se puede usar: abrir una
+        nueva. Los resultados pendientes heredados los escribe el proceso padre.
+        """
+        if os.getpid() == self.pid:
+            return
+        # El cerrojo podía estar cogido por otro hilo del padre en el momento del fork
+        self.cerrojo = threading.Lock()
+        self.pendientes = {}
+        self._abrir()
+
+    def _clave(self, clave: tuple) -> bytes:
+        texto = repr((self.version_refprop, clave)).encode("utf-8")
+        return hashlib.blake2b(texto, digest_size=16).digest()
+
+    def obtener(self, clave: tuple) -> list[float] | None:
+        clave_bytes = self._clave(clave)
+        self._comprobar_proceso()
+        with self.cerrojo:
+            valores = self.pendientes.get(clave_bytes)
+            if valores is None:
+                fila = self.conexion.execute("SELECT valores FROM propiedades WHERE clave = ?",
+                                             (clave_bytes,)).fetchone()
+                if fila is None:
+                    self.fallos += 1
+                    return None
+                valores = fila[0]
+            self.aciertos += 1
+        return list(struct.unpack(f"{len(valores) // 8}d", valores))
+
+    def guardar(self, clave: tuple, resultados: list[float]) -> None:
+        clave_bytes = self._clave(clave)
+        self._comprobar_proceso()
+        with self.cerrojo:
+            self.pendientes[clave_bytes] = struct.pack(f"{len(resultados)}d", *resultados)
+            if len(self.pendientes) >= self.tamano_lote:
+                self._volcar()
+
+    def volcar(self) -> None:
+        """
+        Escribir en disco los resultados pendientes en una única transacción
+        """
+        self._comprobar_proceso()
+        with self.cerrojo:
+            self._volcar()
+
+    def _volcar(self) -> None:
+        self.escritos += len(self.pendientes)
+        CacheDisco._volcar_conexion(self.conexion, self.pendientes)
+
+    @staticmethod
+    def _volcar_conexion(conexion: sqlite3.Connection, pendientes: dict[bytes, bytes]) -> None:
+        if not pendientes:
+            return
+        for intento in range(10):
+            try:
+                conexion.execute("BEGIN IMMEDIATE")
+                conexion.executemany("INSERT OR IGNORE INTO propiedades (clave, valores) VALUES (?, ?)",
+                                     pendientes.items())
+                conexion.execute("COMMIT")
+                pendientes.clear()
+                return
+            except sqlite3.OperationalError:
+                # Otro proceso está escribiendo: esperar y volver a intentar
+                if conexion.in_transaction:
+                    conexion.execute("ROLLBACK")
+                time.sleep(0.05 * (intento + 1))
+        # Si no se ha podido escribir se descartan los resultados, la caché no es imprescindible
+        pendientes.clear()
+
+    def estadisticas(self) -> dict[str, float]:
+        """
+        Devuelve los aciertos, fallos, resultados escritos y el ratio de aciertos de la caché
+        """
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "ratio_aciertos": self.aciertos / total if total else 0.0,
+            "escritos": self.escritos,
+            "pendientes": len(self.pendientes),
+        }
+
+    def cerrar(self) -> None:
+        self.volcar()
+        self.conexion.close()
+
+class CacheCompartida:
+    """
+    Caché de propiedades en memoria compartida entre el proceso principal y los workers de un
+    ProcessPoolExecutor. Es una tabla hash de direccionamiento abierto con registros de tamaño fijo,
+    así un resultado calculado por un worker lo ven los demás sin serializar nada ni pasar por el
+    proceso principal.
+
+    Registro: [hash (u64), nº valores (u32), libre (u32), valores (MAX_VALORES x f64), hash (u64)]
+    El hash se escribe al principio y al final del registro y el final se pone a 0 antes de tocar
+    los valores. Un lector solo acepta el registro si ambos hash coinciden con el buscado, así no
+    hacen falta cerrojos entre procesos: si dos workers escriben a la vez se pierde uno de los dos
+    resultados, pero nunca se lee un registro a medias.
+    """
+    MAX_VALORES = 8
+    _CABECERA = struct.Struct("<QII")
+    _VALORES = struct.Struct(f"<{MAX_VALORES}d")
+    _HASH = struct.Struct("<Q")
+    TAMANO_REGISTRO = _CABECERA.size + _VALORES.size + _HASH.size
+    MAX_SONDEO = 16
+
+    def __init__(self, n_registros: int = 1 << 18, nombre: str | None = None) -> None:
+        from multiprocessing import shared_memory
+
+        self.n_registros = n_registros
+        self.propietario = nombre is None
+        if self.propietario:
+            # El sistema operativo entrega la memoria nueva a ceros: todos los registros vacíos
+            self.memoria = shared_memory.SharedMemory(create=True, size=n_registros * self.TAMANO_REGISTRO)
+        else:
+            self.memoria = shared_memory.SharedMemory(name=nombre)
+        self.nombre = self.memoria.name
+        self.buf = self.memoria.buf
+        # Solo para los contadores de los hilos de este proceso: la tabla no necesita cerrojos
+        self.cerrojo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+        # Soltar (y eliminar si es el creador) al cerrar el proceso; en los workers creados con fork
+        # el finalizador heredado del proceso principal no se ejecuta
+        self._finalizador = util.Finalize(self, CacheCompartida._liberar, args=(self.memoria, self.propietario),
+                                          exitpriority=10)
+
+    @staticmethod
+    def _liberar(memoria, propietario: bool) -> None:
+        memoria.close()
+        if propietario:
+            memoria.unlink()
+
+    def _hash(self, clave: tuple) -> int:
+        h = int.from_bytes(hashlib.blake2b(repr(clave).encode("utf-8"), digest_size=8).digest(), "little")
+        return h or 1
+
+    def obtener(self, clave: tuple) -> list[float] | None:
+        h = self._hash(clave)
+        inicio = h % self.n_registros
+        for i in range(self.MAX_SONDEO):
+            posicion = ((inicio + i) % self.n_registros) * self.TAMANO_REGISTRO
+            (h_registro, n, _) = self._CABECERA.unpack_from(self.buf, posicion)
+            if h_registro == 0:
+                break
+            if h_registro == h:
+                valores = self._VALORES.unpack_from(self.buf, posicion + self._CABECERA.size)
+                (h_final,) = self._HASH.unpack_from(self.buf, posicion + self._CABECERA.size + self._VALORES.size)
+                if h_final != h:
+                    break
+                with self.cerrojo:
+                    self.aciertos += 1
+                return list(valores[:n])
+        with self.cerrojo:
+            self.fallos += 1
+        return None
+
+    def guardar(self, clave: tuple, resultados: list[float]) -> None:
+        n = len(resultados)
+        if n > self.MAX_VALORES:
+            return
+        h = self._hash(clave)
+        inicio = h % self.n_registros
+        # Buscar un hueco libre o el mismo registro; si la zona está llena se sobrescribe el primero
+        destino = inicio
+        for i in range(self.MAX_SONDEO):
+            indice = (inicio + i) % self.n_registros
+            (h_registro,) = self._HASH.unpack_from(self.buf, indice * self.TAMANO_REGISTRO)
+            if h_registro == h:
+                return
+            if h_registro == 0:
+                destino = indice
+                break
+
+        posicion = destino * self.TAMANO_REGISTRO
+        posicion_final = posicion + self._CABECERA.size + self._VALORES.size
+        self._HASH.pack_into(self.buf, posicion_final, 0)
+        self._VALORES.pack_into(self.buf, posicion + self._CABECERA.size,
+                                *resultados, *([0.0] * (self.MAX_VALORES - n)))
+        self._CABECERA.pack_into(self.buf, posicion, h, n, 0)
+        self._HASH.pack_into(self.buf, posicion_final, h)
+
+    def estadisticas(self) -> dict[str, float]:
+        """
+        Devuelve los aciertos, fallos y el ratio de aciertos de este proceso
+        """
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "ratio_aciertos": self.aciertos / total if total else 0.0,
+        }
+
+    def cerrar(self) -> None:
+        """
+        Soltar la memoria compartida. El proceso que la ha creado además la elimina.
+        """
+        self.buf = None
+        self._finalizador()
@@ -110,7 +110,7 @@ def parametros_basicos(fluido: str | list[str], mezcla: list[float], config_log:
     [P_max_trans, P_min_trans] = log_trans_list([P_max, P_min], config_log)
 
     # Propiedades críticas
-    [T_crit, P_crit] = rprop(fluido, "Tcrit;Pcrit", mezcla, P = 0, H = 0)
+    [T_crit, P_crit] = punto_critico(fluido, mezcla)
     H_crit = rprop(fluido, "H", mezcla, P = P_crit, T = T_crit)
 
     #Temperaturas mínimas y máximas
@@ -123,6 +123,10 @@ def generar_curvas_temperatura(fluido: str | list[str], mezcla: list[float], T_m
                     T_crit: float, num_puntos_temp: int, config_log: list[float] 
                     ) -> list[dict[int, list[list[float]]]]:
     
+    # Consultas compiladas una vez por fluido para los bucles de las isotermas
+    consulta_H_PT = compilar_consulta(fluido, "H", ("P", "T"))
+    consulta_P_HT = compilar_consulta(fluido, "P", ("H", "T"))
+
     # Crear lista de temperaturas 
     lista_temperaturas = list(map(lambda x: x*10, list(range(int(np.ceil(T_min/10)), int(T_max/10)+1))))
     curvas_temperatura_liq: dict[int, list[list[float]]] = {}
@@ -140,13 +144,14 @@ def generar_curvas_temperatura(fluido: str | list[str], mezcla: list[float], T_m
             curvas_temperatura_liq[temperatura] = [[],[]] # Primero H (x) y luego P (y)
             [presiones, presiones_trans] = log_space(P_max, Punto_liq_sat.P*1.001, num_puntos_temp, config_log)
             curvas_temperatura_liq[temperatura][1] = presiones_trans
-            curvas_temperatura_liq[temperatura][0] = [rprop(fluido, "H", mezcla, P = presion, T = temperatura) for presion in presiones]
+            # Las presiones van ordenadas y la fase es conocida: cada punto parte de la densidad del anterior
+            curvas_temperatura_liq[temperatura][0] = consulta_H_PT.calcular_barrido(presiones, temperatura, mezcla, fase = "liquido")[0][:, 0].tolist()
 
             # Parte bifásica
             curvas_temperatura_bif[temperatura] = [[],[]]
             entalpias = [float(x) for x in np.linspace(Punto_liq_sat.H, Punto_vap_sat.H, num = int(1.5*num_puntos_temp))]
             curvas_temperatura_bif[temperatura][0] = entalpias
-            presiones = [rprop(fluido, "P", mezcla, H = entalpia, T = temperatura) for entalpia in entalpias]
+            presiones = consulta_P_HT.calcular_array(entalpias, temperatura, mezcla)[0][:, 0].tolist()
             presiones_trans: list[float] = log_trans_list(presiones, config_log)
             curvas_temperatura_bif[temperatura][1] = presiones_trans
             
@@ -154,14 +159,14 @@ def generar_curvas_temperatura(fluido: str | list[str], mezcla: list[float], T_m
             curvas_temperatura_vap[temperatura] = [[],[]]
             [presiones, presiones_trans] = log_space(Punto_vap_sat.P*0.999, P_min, int(num_puntos_temp*1.5), config_log)
             curvas_temperatura_vap[temperatura][1] = presiones_trans
-            curvas_temperatura_vap[temperatura][0] = [rprop(fluido, "H", mezcla, P = presion, T = temperatura) for presion in presiones]
+            curvas_temperatura_vap[temperatura][0] = consulta_H_PT.calcular_barrido(presiones, temperatura, mezcla, fase = "vapor")[0][:, 0].tolist()
         
         # Si el punto pasa por encima de la campana:
         else:
             curvas_temperatura_tcrit[temperatura] = [[],[]]
             [presiones, presiones_trans] = log_space(P_min, P_max, int(1.5*num_puntos_temp), config_log)
             curvas_temperatura_tcrit[temperatura][1] = presiones_trans
-            curvas_temperatura_tcrit[temperatura][0] = [rprop(fluido, "H", mezcla, P = presion, T = temperatura) for presion in presiones]
+            curvas_temperatura_tcrit[temperatura][0] = consulta_H_PT.calcular_array(presiones, temperatura, mezcla)[0][:, 0].tolist()
     
     return [curvas_temperatura_liq, curvas_temperatura_bif, curvas_temperatura_vap, curvas_temperatura_tcrit]
 
@@ -173,11 +178,9 @@ def generar_curvas_saturadas(fluido: str | list[str], mezcla: list[float], confi
     [P_sat, P_sat_trans] = log_space(P_min, min(P_max, P_crit), num_puntos_sat, config_log)
 
     # Entalpias saturadas
-    H_liq_sat: list[float] = []
-    H_vap_sat: list[float] = []
-    for p in P_sat:
-        H_liq_sat.append(rprop(fluido, "H", mezcla, Q = 0, P = p))
-        H_vap_sat.append(rprop(fluido, "H", mezcla, Q = 1, P = p))
+    consulta_H_QP = compilar_consulta(fluido, "H", ("Q", "P"))
+    H_liq_sat: list[float] = consulta_H_QP.calcular_array(0, P_sat, mezcla)[0][:, 0].tolist()
+    H_vap_sat: list[float] = consulta_H_QP.calcular_array(1, P_sat, mezcla)[0][:, 0].tolist()
     
     return [[H_liq_sat, P_sat_trans], [H_vap_sat, P_sat_trans]]
 
@@ -0,0 +1,312 @@
+import os, sys, socket, socketserver, struct, threading, tempfile, json, queue
+import numpy as np
+
+# Servidor local de propiedades: un proceso que mantiene REFPROP cargado, con las mezclas, la caché LRU
+# y la caché en disco calientes, al que se conectan los scripts por un socket Unix. Con la variable
+# de entorno REFPROP_SERVIDOR (ruta del socket) init_refprop no carga el DLL y rprop, RPQuery y TPoint
+# mandan las consultas al servidor. Los procesos hijos (workers del pool, el subproceso de manim)
+# heredan la variable y comparten el mismo servidor.
+#
+#   python refprop_servidor.py [ruta_socket]          Arrancar el servidor
+#   REFPROP_SERVIDOR=/tmp/refprop.sock python ciclo_basico_binario.py
+#
+# Protocolo (little-endian), cada mensaje precedido de su longitud (u32):
+#   Consulta:   u8 tipo = 1 | u8 splines (0 según el servidor, 1 no, 2 sí) | 3 x (u16 longitud + utf-8):
+#               fluidos, salida, entrada | u32 n filas | u16 n componentes | u8 composición por fila |
+#               a (n x f64) | b (n x f64) | composición (n_comp o n x n_comp x f64)
+#   Respuesta:  u8 estado (0 bien, 1 excepción) | u32 n | u16 n_salida | ierr (n x i32) |
+#               resultados (n x n_salida x f64) | u16 longitud + herr de la primera fila con error
+#               Con estado = 1 solo va el texto de la excepción (u16 longitud + utf-8).
+#   Estadísticas: u8 tipo = 2 -> respuesta con el JSON de las estadísticas (u32 longitud + utf-8)
+#   Varias:     u8 tipo = 3 | consultas (u32 longitud + consulta) -> respuestas (u32 longitud + respuesta)
+#               en el mismo orden. Cada fila pasa por las cachés del servidor como una consulta suelta.
+
+RUTA_SOCKET = os.path.join(tempfile.gettempdir(), "refprop.sock")
+
+_LONGITUD = struct.Struct("<I")
+_CONSULTA = struct.Struct("<BB")
+_TEXTO = struct.Struct("<H")
+_FILAS = struct.Struct("<IHB")
+_RESPUESTA = struct.Struct("<BIH")
+
+TIPO_CONSULTA = 1
+TIPO_ESTADISTICAS = 2
+TIPO_VARIAS = 3
+
+def _texto(texto: str) -> bytes:
+    datos = texto.encode("utf-8")
+    return _TEXTO.pack(len(datos)) + datos
+
+def _leer_texto(datos: bytes, posicion: int) -> tuple[str, int]:
+    (n,) = _TEXTO.unpack_from(datos, posicion)
+    posicion += _TEXTO.size
+    return datos[posicion:posicion + n].decode("utf-8"), posicion + n
+
+def _recibir(conexion: socket.socket, n: int) -> bytes:
+    partes = []
+    while n:
+        parte = conexion.recv(min(n, 1 << 20))
+        if not parte:
+            raise ConnectionError("Conexión cerrada")
+        partes.append(parte)
+        n -= len(parte)
+    return b"".join(partes)
+
+def _recibir_mensaje(conexion: socket.socket) -> bytes:
+    (n,) = _LONGITUD.unpack(_recibir(conexion, _LONGITUD.size))
+    return _recibir(conexion, n)
+
+def _enviar_mensaje(conexion: socket.socket, datos: bytes) -> None:
+    conexion.sendall(_LONGITUD.pack(len(datos)) + datos)
+
+# Servidor
+
+class _Manejador(socketserver.BaseRequestHandler):
+    """
+    Atiende una conexión (que el cliente mantiene abierta) hasta que se cierra
+    """
+    def handle(self) -> None:
+        while True:
+            try:
+                mensaje = _recibir_mensaje(self.request)
+            except (ConnectionError, OSError):
+                return
+            _enviar_mensaje(self.request, self.server.responder(mensaje))
+
+class ServidorRefprop(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Servidor de propiedades sobre un socket Unix. Cada conexión tiene su hilo, pero el DLL es uno
+    solo: las consultas se evalúan de una en una con un cerrojo. Los lotes de varias filas se resuelven
+    con calcular_array y las consultas sueltas con RPQuery, pasando por las cachés del servidor. Las
+    peticiones con varias consultas (los LoteTPoint de los clientes) van por calcular_lote, también
+    con las cachés.
+    """
+    daemon_threads = True
+
+    def __init__(self, ruta: str = RUTA_SOCKET) -> None:
+        if os.path.exists(ruta):
+            os.unlink(ruta)
+        super().__init__(ruta, _Manejador)
+        self.ruta = ruta
+        self.cerrojo = threading.Lock()
+        self.peticiones = 0
+        self.consultas = 0
+        self.filas = 0
+
+    def responder(self, mensaje: bytes) -> bytes:
+        import refprop_utils
+
+        if mensaje[0] == TIPO_ESTADISTICAS:
+            estadisticas = {
+                "peticiones": self.peticiones,
+                "consultas": self.consultas,
+                "filas": self.filas,
+                "cache": refprop_utils.CACHE_RESULTADOS.estadisticas(),
+                "cache_disco": refprop_utils.CACHE_DISCO.estadisticas() if refprop_utils.CACHE_DISCO else None,
+                "errores": refprop_utils.estadisticas_errores_refprop(),
+                # REFPROP que responde, para que los clientes puedan usarlo como clave de sus datos
+                "backend": refprop_utils.BACKEND,
+                "version_refprop": refprop_utils._rp().RPVersion(),
+                "ruta_dll": refprop_utils.RUTA_DLL,
+            }
+            return _texto_largo(json.dumps(estadisticas))
+
+        with self.cerrojo:
+            self.peticiones += 1
+            if mensaje[0] != TIPO_VARIAS:
+                return self._responder_consulta(mensaje, refprop_utils, False)
+            respuestas = []
+            posicion = 1
+            while posicion < len(mensaje):
+                (n,) = _LONGITUD.unpack_from(mensaje, posicion)
+                posicion += _LONGITUD.size
+                respuestas.append(_con_longitud(
+                    self._responder_consulta(mensaje[posicion:posicion + n], refprop_utils, True)))
+                posicion += n
+            return b"".join(respuestas)
+
+    def _responder_consulta(self, mensaje: bytes, refprop_utils, lote: bool) -> bytes:
+        try:
+            return self._consultar(mensaje, refprop_utils, lote)
+        except Exception as e:
+            return _RESPUESTA.pack(1, 0, 0) + _texto(f"{type(e).__name__}: {e}")
+
+    def _consultar(self, mensaje: bytes, refprop_utils, lote: bool = False) -> bytes:
+        (_, splines) = _CONSULTA.unpack_from(mensaje, 0)
+        posicion = _CONSULTA.size
+        fluidos, posicion = _leer_texto(mensaje, posicion)
+        salida, posicion = _leer_texto(mensaje, posicion)
+        entrada, posicion = _leer_texto(mensaje, posicion)
+        (n, ncomp, por_fila) = _FILAS.unpack_from(mensaje, posicion)
+        posicion += _FILAS.size
+        a = np.frombuffer(mensaje, "<f8", n, posicion)
+        b = np.frombuffer(mensaje, "<f8", n, posicion + 8 * n)
+        mezcla = np.frombuffer(mensaje, "<f8", n * ncomp if por_fila else ncomp, posicion + 16 * n)
+
+        consulta = refprop_utils.compilar_consulta(fluidos, salida, tuple(entrada), (None, False, True)[splines])
+        self.consultas += 1
+        self.filas += n
+        herr = ""
+        if lote and not por_fila:
+            # Filas sueltas de un LoteTPoint del cliente: por las cachés, como RPQuery.__call__
+            out, errores = consulta.calcular_lote(a, b, mezcla.tolist())
+        elif n == 1 and not por_fila:
+            errores = np.zeros(1, dtype=np.int32)
+            try:
+                resultados = consulta(float(a[0]), float(b[0]), mezcla.tolist())
+                out = np.asarray(resultados, dtype=float).reshape(1, consulta.n_salida)
+            except refprop_utils.ErrorRefprop as e:
+                out = np.full((1, consulta.n_salida), np.nan)
+                errores[0] = e.ierr
+                herr = e.herr
+        else:
+            out, errores = consulta.calcular_array(a, b, mezcla.reshape(n, ncomp) if por_fila else mezcla.tolist())
+
+        return (_RESPUESTA.pack(0, n, consulta.n_salida) + errores.astype("<i4").tobytes()
+                + out.astype("<f8").tobytes() + _texto(herr))
+
+def _texto_largo(texto: str) -> bytes:
+    return _con_longitud(texto.encode("utf-8"))
+
+def _con_longitud(datos: bytes) -> bytes:
+    return _LONGITUD.pack(len(datos)) + datos
+
+def servir(ruta: str = RUTA_SOCKET, ruta_cache_disco: str | None = None, **kwargs) -> None:
+    """
+    Inicializar REFPROP en este proceso (argumentos de init_refprop) y atender consultas hasta Ctrl+C
+    """
+    import refprop_utils
+
+    # El servidor es el que carga el DLL, no un cliente de sí mismo
+    os.environ.pop("REFPROP_SERVIDOR", None)
+    refprop_utils.init_refprop(ruta_cache_disco=ruta_cache_disco, **kwargs)
+    refprop_utils.configurar_errores_refprop("excepcion")
+
+    with ServidorRefprop(ruta) as servidor:
+        print(f"Servidor de REFPROP ({refprop_utils.BACKEND}) escuchando en {ruta}")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if refprop_utils.CACHE_DISCO is not None:
+                refprop_utils.CACHE_DISCO.volcar()
+            os.unlink(ruta)
+
+# Cliente
+
+class ErrorServidor(RuntimeError):
+    ...
+
+class ClienteRefprop:
+    """
+    Cliente del servidor de propiedades. Mantiene abiertas hasta max_conexiones conexiones para que
+    los hilos del proceso no esperen unos a otros ni paguen el coste de conectar en cada consulta.
+    """
+    def __init__(self, ruta: str = RUTA_SOCKET, max_conexiones: int = 8) -> None:
+        self.ruta = ruta
+        self.libres: queue.LifoQueue[socket.socket] = queue.LifoQueue(max_conexiones)
+        # Comprobar ya que el servidor está escuchando
+        self._devolver(self._conectar())
+
+    def _conectar(self) -> socket.socket:
+        conexion = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            conexion.connect(self.ruta)
+        except OSError as e:
+            conexion.close()
+            raise ErrorServidor(f"No se puede conectar con el servidor de REFPROP en {self.ruta}: {e}") from e
+        return conexion
+
+    def _devolver(self, conexion: socket.socket) -> None:
+        try:
+            self.libres.put_nowait(conexion)
+        except queue.Full:
+            conexion.close()
+
+    def _peticion(self, mensaje: bytes) -> bytes:
+        try:
+            conexion = self.libres.get_nowait()
+        except queue.Empty:
+            conexion = self._conectar()
+        try:
+            _enviar_mensaje(conexion, mensaje)
+            respuesta = _recibir_mensaje(conexion)
+        except OSError:
+            # Conexión rota (por ejemplo el servidor se ha reiniciado): no se devuelve al pool
+            conexion.close()
+            raise
+        self._devolver(conexion)
+        return respuesta
+
+    def consultar(self, fluidos: str, salida: str, entrada: str, a, b, mezcla,
+                  splines: bool | None = None) -> tuple[np.ndarray, np.ndarray, str]:
+        """
+        Evaluar en el servidor una consulta para arrays de entradas. Devuelve (resultados, ierr de cada
+        fila, herr de la primera fila con error), igual que RPQuery.calcular_array más el texto del error.
+        """
+        return self._leer_respuesta(self._peticion(self._mensaje_consulta(fluidos, salida, entrada, a, b,
+                                                                          mezcla, splines)))
+
+    def consultar_varias(self, consultas: list[tuple]) -> list[tuple[np.ndarray, np.ndarray, str]]:
+        """
+        Varias consultas [(fluidos, salida, entrada, a, b, mezcla, splines), ...] en una sola petición.
+        Con composición común cada fila pasa por las cachés del servidor, como una consulta suelta.
+        """
+        mensaje = bytes([TIPO_VARIAS]) + b"".join(_con_longitud(self._mensaje_consulta(*consulta))
+                                                  for consulta in consultas)
+        respuesta = self._peticion(mensaje)
+        resultados = []
+        posicion = 0
+        while posicion < len(respuesta):
+            (n,) = _LONGITUD.unpack_from(respuesta, posicion)
+            posicion += _LONGITUD.size
+            resultados.append(self._leer_respuesta(respuesta[posicion:posicion + n]))
+            posicion += n
+        return resultados
+
+    @staticmethod
+    def _mensaje_consulta(fluidos: str, salida: str, entrada: str, a, b, mezcla, splines: bool | None) -> bytes:
+        a, b = np.broadcast_arrays(np.asarray(a, dtype="<f8"), np.asarray(b, dtype="<f8"))
+        composicion = np.asarray(mezcla, dtype="<f8")
+        por_fila = composicion.ndim == 2
+        if por_fila:
+            a, b = np.broadcast_to(a, composicion.shape[:1]), np.broadcast_to(b, composicion.shape[:1])
+        n = a.size
+        ncomp = composicion.shape[-1]
+
+        return b"".join([
+            _CONSULTA.pack(TIPO_CONSULTA, {None: 0, False: 1, True: 2}[splines]),
+            _texto(fluidos), _texto(salida), _texto(entrada),
+            _FILAS.pack(n, ncomp, por_fila),
+            np.ascontiguousarray(a, dtype="<f8").tobytes(), np.ascontiguousarray(b, dtype="<f8").tobytes(),
+            np.ascontiguousarray(composicion, dtype="<f8").tobytes(),
+        ])
+
+    @staticmethod
+    def _leer_respuesta(respuesta: bytes) -> tuple[np.ndarray, np.ndarray, str]:
+        (estado, n, n_salida) = _RESPUESTA.unpack_from(respuesta, 0)
+        posicion = _RESPUESTA.size
+        if estado != 0:
+            raise ErrorServidor(_leer_texto(respuesta, posicion)[0])
+        errores = np.frombuffer(respuesta, "<i4", n, posicion).astype(np.int32)
+        posicion += 4 * n
+        out = np.frombuffer(respuesta, "<f8", n * n_salida, posicion).reshape(n, n_salida).copy()
+        herr, _ = _leer_texto(respuesta, posicion + 8 * n * n_salida)
+        return out, errores, herr
+
+    def estadisticas(self) -> dict:
+        respuesta = self._peticion(bytes([TIPO_ESTADISTICAS]))
+        (n,) = _LONGITUD.unpack_from(respuesta, 0)
+        return json.loads(respuesta[_LONGITUD.size:_LONGITUD.size + n].decode("utf-8"))
+
+    def cerrar(self) -> None:
+        while True:
+            try:
+                self.libres.get_nowait().close()
+            except queue.Empty:
+                return
+
+if __name__ == "__main__":
+    from refprop_utils import RUTA_CACHE_DISCO
+    servir(sys.argv[1] if len(sys.argv) > 1 else RUTA_SOCKET, ruta_cache_disco=RUTA_CACHE_DISCO)
@@ -0,0 +1,236 @@
+import os, json, math, hashlib
+import numpy as np
+import refprop_utils
+
+class TablaPH:
+    """
+    Tabla precalculada de propiedades en función de (P, H) para un fluido o mezcla concreta,
+    al estilo TTSE: una malla uniforme en log(P) y en H calculada de golpe con REFPROP y un
+    interpolador bicúbico de Hermite por celda (valores y derivadas en las 4 esquinas, derivadas
+    por diferencias centradas en la malla). Una consulta cuesta unos microsegundos.
+
+    Solo se interpola en celdas "limpias": las 4 esquinas y sus vecinas calculadas sin error y en la
+    misma fase (líquido, bifásico o vapor), y fuera de la zona crítica. En el resto de celdas
+    (las que cortan la campana de saturación o cerca del punto crítico) evaluar devuelve None y
+    rprop llama a REFPROP como siempre.
+
+    Cota de error: al construir la tabla se compara con REFPROP en el centro de hasta n_muestras
+    celdas válidas (el punto más alejado de los nodos, donde el error de la interpolación es mayor)
+    y el error máximo absoluto y relativo de cada propiedad queda en meta["error_max"] (meta.json):
+    esa es la cota de cada tabla concreta. D no se interpola directamente: sale de 1/V, que en la zona
+    bifásica es casi lineal en H. Como referencia, para PROPANE;BUTANE 50/50 entre 1 y 40 bar con el
+    backend sintético el error relativo máximo es ~1e-4 en todas las propiedades con la malla por
+    defecto (200 x 200) y ~1e-3 con 80 x 80. Cerca del punto crítico el error crece mucho (hasta
+    decenas de %) y por eso esas celdas no se interpolan (margen_P_critico, margen_T_critico).
+
+    La tabla se guarda en una carpeta con dos .npy (coeficientes y celdas válidas) y un meta.json.
+    Al cargarla los .npy se abren con mmap, así varios workers comparten la misma memoria.
+    """
+    PROPIEDADES = ["T", "D", "S", "Q", "V"]
+    _INDICE_D = 1
+    _INDICE_Q = 3
+    _INDICE_V = 4
+
+    # Matriz de Hermite cúbico: coeficientes del polinomio a partir de [f(0), f(1), f'(0), f'(1)]
+    _HERMITE = np.array([[1.0, 0.0, 0.0, 0.0],
+                         [0.0, 0.0, 1.0, 0.0],
+                         [-3.0, 3.0, -2.0, -1.0],
+                         [2.0, -2.0, 1.0, 1.0]])
+
+    def __init__(self, ruta: str, coeficientes: np.ndarray, valida: np.ndarray, meta: dict) -> None:
+        self.ruta = ruta
+        self.coeficientes = coeficientes
+        self.valida = valida
+        self.meta = meta
+
+        # Malla uniforme: x = ln(P), y = H
+        self.x0 = math.log(meta["P_min"])
+        self.y0 = meta["H_min"]
+        self.n_P = meta["n_P"]
+        self.n_H = meta["n_H"]
+        self.inv_dx = (self.n_P - 1) / (math.log(meta["P_max"]) - self.x0)
+        self.inv_dy = (self.n_H - 1) / (meta["H_max"] - self.y0)
+
+    @classmethod
+    def construir(cls, fluido: str | list[str], mezcla: list[float], P_min: float, P_max: float,
+                  H_min: float, H_max: float, n_P: int = 200, n_H: int = 200,
+                  directorio: str = os.path.join("resultados_ciclo_basico", "tablas_ph"),
+                  margen_P_critico: float = 0.10, margen_T_critico: float = 10.0,
+                  n_muestras: int = 500) -> "TablaPH":
+        """
+        Construir (o cargar si ya existe en disco) la tabla de una mezcla en la ventana
+        P_min-P_max (bar) y H_min-H_max (kJ/kg).
+
+        :param margen_P_critico: Margen relativo de presión alrededor de P_crit donde no se interpola
+        :param margen_T_critico: Margen de temperatura (K) alrededor de T_crit donde no se interpola
+        :param n_muestras: Número de celdas con las que se estima el error de la tabla
+        """
+        fluidos_refprop, _ = refprop_utils._convertir_fluidos(fluido)
+        parametros = {
+            "fluido": fluidos_refprop,
+            "mezcla": [round(x, 6) for x in mezcla],
+            "P_min": P_min, "P_max": P_max, "n_P": n_P,
+            "H_min": H_min, "H_max": H_max, "n_H": n_H,
+            "margen_P_critico": margen_P_critico, "margen_T_critico": margen_T_critico,
+            "version_refprop": refprop_utils._rp().RPVersion(),
+        }
+        nombre = hashlib.blake2b(json.dumps(parametros, sort_keys=True).encode("utf-8"), digest_size=8).hexdigest()
+        ruta = os.path.join(directorio, nombre)
+        if os.path.exists(os.path.join(ruta, "meta.json")):
+            return cls.cargar(ruta)
+
+        consulta = refprop_utils.RPQuery(fluidos_refprop, cls.PROPIEDADES, mezcla, "PH")
+        P = np.geomspace(P_min, P_max, n_P)
+        H = np.linspace(H_min, H_max, n_H)
+        malla_P, malla_H = np.meshgrid(P, H, indexing="ij")
+        valores, errores = consulta.calcular_array(malla_P, malla_H)
+        valores = valores.reshape(n_P, n_H, len(cls.PROPIEDADES))
+        errores = errores.reshape(n_P, n_H)
+
+        # Fase de cada nodo: Q fuera de [0, 1] es un código de REFPROP (líquido, vapor, supercrítico)
+        Q = valores[:, :, cls._INDICE_Q]
+        fase = np.where((Q > 0) & (Q < 1), 0.5, Q)
+        nodo_ok = errores <= 0
+
+        # Un nodo es limpio si él y sus 8 vecinos están en la misma fase, así las diferencias centradas
+        # (también la cruzada de f_xy) nunca cruzan la campana de saturación. En el borde se repite el nodo.
+        fase_ext = np.pad(np.where(nodo_ok, fase, np.nan), 1, mode="edge")
+        limpio = nodo_ok.copy()
+        for di in (0, 1, 2):
+            for dj in (0, 1, 2):
+                limpio &= fase_ext[di:di + n_P, dj:dj + n_H] == fase
+
+        valida = limpio[:-1, :-1] & limpio[1:, :-1] & limpio[:-1, 1:] & limpio[1:, 1:]
+
+        # Zona crítica
+        T_crit, P_crit = refprop_utils.punto_critico(fluidos_refprop, mezcla)
+        T = valores[:, :, 0]
+        cerca_P = np.abs(P - P_crit) <= margen_P_critico * P_crit
+        cerca_T = np.abs(T - T_crit) <= margen_T_critico
+        nodo_critico = cerca_P[:, None] & cerca_T
+        valida &= ~(nodo_critico[:-1, :-1] | nodo_critico[1:, :-1] | nodo_critico[:-1, 1:] | nodo_critico[1:, 1:])
+
+        # Derivadas en coordenadas de celda unidad (paso 1 en índices)
+        valores_limpios = np.where(nodo_ok[:, :, None], valores, 0.0)
+        f_x = np.gradient(valores_limpios, axis=0)
+        f_y = np.gradient(valores_limpios, axis=1)
+        f_xy = np.gradient(f_x, axis=1)
+        coeficientes = cls._coeficientes(valores_limpios, f_x, f_y, f_xy)
+
+        meta = dict(parametros, propiedades=cls.PROPIEDADES, T_crit=T_crit, P_crit=P_crit)
+        tabla = cls(ruta, coeficientes, valida, meta)
+        tabla.meta["error_max"] = tabla.estimar_error(consulta, mezcla, n_muestras)
+        tabla.guardar()
+        return cls.cargar(ruta)
+
+    @classmethod
+    def _coeficientes(cls, f: np.ndarray, f_x: np.ndarray, f_y: np.ndarray, f_xy: np.ndarray) -> np.ndarray:
+        """
+        Coeficientes bicúbicos de cada celda: array (n_P - 1, n_H - 1, n_propiedades, 4, 4) tal que
+        valor(t, u) = sum(c[k, l] * t**k * u**l) con t, u en [0, 1] dentro de la celda
+        """
+        def esquinas(g: np.ndarray) -> tuple[np.ndarray, ...]:
+            return g[:-1, :-1], g[:-1, 1:], g[1:, :-1], g[1:, 1:]
+
+        f00, f01, f10, f11 = esquinas(f)
+        x00, x01, x10, x11 = esquinas(f_x)
+        y00, y01, y10, y11 = esquinas(f_y)
+        xy00, xy01, xy10, xy11 = esquinas(f_xy)
+        F = np.stack([
+            np.stack([f00, f01, y00, y01], axis=-1),
+            np.stack([f10, f11, y10, y11], axis=-1),
+            np.stack([x00, x01, xy00, xy01], axis=-1),
+            np.stack([x10, x11, xy10, xy11], axis=-1),
+        ], axis=-2)
+        M = cls._HERMITE
+        return np.einsum("ka,...ab,lb->...kl", M, F, M)
+
+    def _celda(self, P: float, H: float) -> tuple[int, int, float, float] | None:
+        if P <= 0:
+            return None
+        x = (math.log(P) - self.x0) * self.inv_dx
+        y = (H - self.y0) * self.inv_dy
+        i = int(x)
+        j = int(y)
+        if x < 0 or y < 0 or i >= self.n_P - 1 or j >= self.n_H - 1 or not self.valida[i, j]:
+            return None
+        return i, j, x - i, y - j
+
+    def evaluar(self, P: float, H: float) -> np.ndarray | None:
+        """
+        Devuelve [T, D, S, Q, V] en (P bar, H kJ/kg) o None si el punto está fuera de la tabla
+        o en una celda donde hay que llamar a REFPROP
+        """
+        celda = self._celda(P, H)
+        if celda is None:
+            return None
+        i, j, t, u = celda
+        potencias_u = np.array((1.0, u, u * u, u * u * u))
+        potencias_t = np.array((1.0, t, t * t, t * t * t))
+        valores = (self.coeficientes[i, j] @ potencias_u) @ potencias_t
+        # En la zona bifásica V es casi lineal en H y D = 1/V no: D sale del V interpolado
+        valores[self._INDICE_D] = 1 / valores[self._INDICE_V]
+        return valores
+
+    def evaluar_array(self, P: np.ndarray, H: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Versión vectorizada de evaluar. Devuelve los valores (N, n_propiedades) y una máscara (N,)
+        con las filas que se han podido interpolar; el resto queda a NaN.
+        """
+        P, H = np.broadcast_arrays(np.asarray(P, dtype=float).ravel(), np.asarray(H, dtype=float).ravel())
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = (np.log(P) - self.x0) * self.inv_dx
+        y = (H - self.y0) * self.inv_dy
+        dentro = (x >= 0) & (y >= 0) & (x < self.n_P - 1) & (y < self.n_H - 1)
+        i = np.where(dentro, x, 0).astype(int)
+        j = np.where(dentro, y, 0).astype(int)
+        dentro &= self.valida[i, j]
+
+        t = (x - i)[:, None] ** np.arange(4)
+        u = (y - j)[:, None] ** np.arange(4)
+        valores = np.einsum("npkl,nk,nl->np", self.coeficientes[i, j], t, u)
+        valores[~dentro] = np.nan
+        with np.errstate(divide="ignore", invalid="ignore"):
+            valores[:, self._INDICE_D] = 1 / valores[:, self._INDICE_V]
+        return valores, dentro
+
+    def estimar_error(self, consulta: "refprop_utils.RPQuery", mezcla: list[float], n_muestras: int) -> dict:
+        """
+        Comparar con REFPROP en el centro de hasta n_muestras celdas válidas escogidas al azar
+        """
+        celdas = np.argwhere(self.valida)
+        if len(celdas) == 0:
+            return {}
+        rng = np.random.default_rng(0)
+        celdas = celdas[rng.choice(len(celdas), size=min(n_muestras, len(celdas)), replace=False)]
+        P = np.exp(self.x0 + (celdas[:, 0] + 0.5) / self.inv_dx)
+        H = self.y0 + (celdas[:, 1] + 0.5) / self.inv_dy
+
+        exactos, errores = consulta.calcular_array(P, H, mezcla)
+        interpolados, _ = self.evaluar_array(P, H)
+        ok = errores <= 0
+        diferencia = np.abs(interpolados[ok] - exactos[ok])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            relativa = diferencia / np.abs(exactos[ok])
+
+        return {
+            propiedad: {"absoluto": float(np.nanmax(diferencia[:, k], initial=0.0)),
+                        "relativo": float(np.nanmax(relativa[:, k], initial=0.0))}
+            for k, propiedad in enumerate(self.PROPIEDADES)
+        }
+
+    def guardar(self) -> None:
+        os.makedirs(self.ruta, exist_ok=True)
+        np.save(os.path.join(self.ruta, "coeficientes.npy"), self.coeficientes)
+        np.save(os.path.join(self.ruta, "valida.npy"), self.valida)
+        with open(os.path.join(self.ruta, "meta.json"), "w", encoding="utf-8") as f:
+            json.dump(self.meta, f, indent=2)
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "TablaPH":
+        with open(os.path.join(ruta, "meta.json"), encoding="utf-8") as f:
+            meta = json.load(f)
+        # Vista ndarray del mmap: indexar un np.memmap en cada consulta es bastante más lento
+        coeficientes = np.load(os.path.join(ruta, "coeficientes.npy"), mmap_mode="r").view(np.ndarray)
+        valida = np.load(os.path.join(ruta, "valida.npy"), mmap_mode="r").view(np.ndarray)
+        return cls(ruta, coeficientes, valida, meta)
@@ -1,8 +1,27 @@
-from ctREFPROP.ctREFPROP import REFPROPFunctionLibrary
-import re, os, subprocess, json
+import re, os, sys, bisect, threading
 from typing import Any
+from collections import OrderedDict
 
 RP = None
+RUTA_DLL = r"C:\Program Files (x86)\REFPROP\REFPRP64.DLL"
+# Backend detrás de RP: "refprop" (DLL real) o "sintetico[:latencia]" (ver refprop_backends).
+# Se puede elegir con la variable de entorno REFPROP_BACKEND o con el argumento de init_refprop
+BACKEND = "refprop"
+# Tipo de pool de crear_pool: "procesos" o "hilos" (una instancia privada del DLL por hilo)
+MODO_POOL = os.environ.get("REFPROP_POOL", "procesos")
+
+# Estado de cada hilo de un pool de hilos: su instancia de REFPROP y su caché de mezclas.
+# En el hilo principal (y en los workers de procesos) no hay nada y se usan RP y CACHE_MEZCLAS.
+_LOCAL = threading.local()
+
+def _rp():
+    """
+    Instancia de REFPROP del hilo actual
+    """
+    return getattr(_LOCAL, "rp", None) or RP
+
+# Fichero de la caché persistente de propiedades que usan los scripts de cálculo
+RUTA_CACHE_DISCO = os.path.join("resultados_ciclo_basico", "cache_propiedades.sqlite")
 
 class ErrorTemperaturaTranscritica(Exception):
     ...
@@ -10,6 +29,85 @@ class ErrorTemperaturaTranscritica(Exception):
 class ErrorPuntoBifasico(Exception):
     ...
 
+class ErrorRefprop(RuntimeError):
+    """
+    Error devuelto por REFPROP (ierr > 0). La subclase indica la categoría según el código:
+    1-99 entradas fuera de rango, 100-199 fluidos / SETUP y 200 o más fallos de convergencia.
+    """
+    categoria = "otro"
+
+    def __init__(self, ierr: int, herr: str) -> None:
+        super().__init__(f"[ierr {ierr}] {herr.strip()}")
+        self.ierr = ierr
+        self.herr = herr
+
+    def __reduce__(self):
+        # Para que llegue entera desde los workers de un pool de procesos
+        return (type(self), (self.ierr, self.herr))
+
+class ErrorEntradaRefprop(ErrorRefprop):
+    categoria = "entrada"
+
+class ErrorFluidoRefprop(ErrorRefprop):
+    categoria = "fluido"
+
+class ErrorConvergenciaRefprop(ErrorRefprop):
+    categoria = "convergencia"
+
+def categoria_ierr(ierr: int) -> str:
+    """
+    Categoría del código de REFPROP: "aviso" (< 0), "entrada", "fluido" o "convergencia"
+    """
+    if ierr < 0:
+        return "aviso"
+    if ierr < 100:
+        return ErrorEntradaRefprop.categoria
+    if ierr < 200:
+        return ErrorFluidoRefprop.categoria
+    return ErrorConvergenciaRefprop.categoria
+
+def error_refprop(ierr: int, herr: str) -> ErrorRefprop:
+    """
+    Excepción de la categoría que corresponde al código ierr (> 0) de REFPROP
+    """
+    for clase in (ErrorEntradaRefprop, ErrorFluidoRefprop, ErrorConvergenciaRefprop):
+        if clase.categoria == categoria_ierr(ierr):
+            return clase(ierr, herr)
+    return ErrorRefprop(ierr, herr)
+
+# Qué hacen rprop / RPQuery / TPoint cuando REFPROP devuelve ierr > 0:
+#   "excepcion": lanzar la ErrorRefprop de la categoría (el ciclo se aborta en el primer estado que falla)
+#   "nan":       devolver NaN en todas las salidas y seguir
+MODO_ERRORES = "excepcion"
+# Errores y avisos de REFPROP por categoría en este proceso
+CONTADOR_ERRORES: dict[str, int] = {"aviso": 0, "entrada": 0, "fluido": 0, "convergencia": 0}
+# Los hilos de un pool de hilos cuentan sobre el mismo diccionario: "+= 1" no es atómico
+_CANDADO_ERRORES = threading.Lock()
+
+def _contar_error(ierr: int) -> None:
+    with _CANDADO_ERRORES:
+        CONTADOR_ERRORES[categoria_ierr(ierr)] += 1
+
+def configurar_errores_refprop(modo: str) -> None:
+    """
+    Elegir qué pasa cuando un flash falla: "excepcion" o "nan"
+    """
+    global MODO_ERRORES
+    if modo not in ("excepcion", "nan"):
+        raise ValueError(f"Modo de errores no válido: {modo}. Tiene que ser \"excepcion\" o \"nan\"")
+    MODO_ERRORES = modo
+
+def estadisticas_errores_refprop(reiniciar: bool = False) -> dict[str, int]:
+    """
+    Errores y avisos de REFPROP por categoría desde el inicio (o desde el último reinicio)
+    """
+    with _CANDADO_ERRORES:
+        estadisticas = dict(CONTADOR_ERRORES)
+        if reiniciar:
+            for categoria in CONTADOR_ERRORES:
+                CONTADOR_ERRORES[categoria] = 0
+    return estadisticas
+
 WATER_CONFIG = {
     "baja": {
         "t_hw": [30, 35],
@@ -29,6 +127,316 @@ WATER_CONFIG = {
     }
 }
 
+class CacheMezclas:
+    """
+    Registro de las mezclas configuradas en REFPROP. Guarda qué mezcla está cargada en el DLL
+    para que solo se llame a SETUPdll cuando se cambia de mezcla.
+    """
+    def __init__(self) -> None:
+        # Mezclas ya configuradas alguna vez: "fluido1;fluido2" -> número de componentes
+        self.mezclas: dict[str, int] = {}
+        # Mezcla cargada actualmente en REFPROP y la instancia del DLL a la que pertenece
+        self.cargada: str | None = None
+        self.rp = None
+        # Composición para la que se han generado los splines de saturación (solo hay unos en REFPROP)
+        self.splines: tuple | None = None
+        self.aciertos = 0
+        self.fallos = 0
+
+    def cargar(self, fluidos_refprop: str, ncomp: int) -> None:
+        """
+        Configurar la mezcla en REFPROP solo si no es la que ya está cargada
+        """
+        # Si se ha vuelto a inicializar REFPROP no hay nada cargado
+        rp = _rp()
+        if self.rp is not rp:
+            self.rp = rp
+            self.cargada = None
+
+        if fluidos_refprop == self.cargada:
+            self.aciertos += 1
+            return
+
+        self.fallos += 1
+        # SETUP borra los splines de la mezcla anterior
+        self.splines = None
+        res = rp.SETUPdll(ncomp, fluidos_refprop, '', 'DEF')
+        if res.ierr > 0:
+            # No marcar la mezcla como cargada para que se vuelva a intentar
+            self.cargada = None
+            return
+        self.mezclas[fluidos_refprop] = ncomp
+        self.cargada = fluidos_refprop
+
+    def cargar_splines(self, fluidos_refprop: str, mezcla: list[float]) -> bool:
+        """
+        Generar los splines de saturación (SATSPLN) de la mezcla cargada para esta composición
+        si no están ya generados. Devuelve False si REFPROP no ha podido generarlos.
+        """
+        clave = (fluidos_refprop, tuple(mezcla))
+        if self.splines == clave:
+            return True
+        # SATSPLNdll trabaja en fracciones molares, no másicas como REFPROPdll con iMass = 1
+        rp = _rp()
+        z = rp.XMOLEdll(mezcla)[0]
+        res = rp.SATSPLNdll(list(z[:len(mezcla)]))
+        if res.ierr > 0:
+            self.splines = None
+            return False
+        self.splines = clave
+        return True
+
+    def precargar(self, *lista_fluidos: str | list[str]) -> None:
+        """
+        Configurar de antemano varias mezclas para comprobar que REFPROP las acepta
+        y tenerlas registradas antes de empezar un barrido.
+
+        CACHE_MEZCLAS.precargar(["PROPANE", "BUTANE"], "DME;PROPYLENE")
+        """
+        for fluidos in lista_fluidos:
+            if isinstance(fluidos, list):
+                fluidos = ";".join(fluidos)
+            self.cargar(fluidos, len(fluidos.split(";")))
+
+    def estadisticas(self) -> dict[str, float]:
+        """
+        Devuelve los aciertos, fallos y el ratio de aciertos de la caché
+        """
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "ratio_aciertos": self.aciertos / total if total else 0.0,
+            "mezclas_registradas": len(self.mezclas),
+        }
+
+    def reiniciar(self) -> None:
+        self.mezclas.clear()
+        self.cargada = None
+        self.rp = None
+        self.splines = None
+        self.aciertos = 0
+        self.fallos = 0
+
+# Caché de mezclas del proceso (cada worker tiene la suya, y cada hilo de un pool de hilos también)
+CACHE_MEZCLAS = CacheMezclas()
+
+def _mezclas() -> CacheMezclas:
+    """
+    Caché de mezclas de la instancia de REFPROP del hilo actual
+    """
+    return getattr(_LOCAL, "mezclas", None) or CACHE_MEZCLAS
+
+class CacheResultados:
+    """
+    Caché LRU de resultados de rprop / RPQuery dentro del proceso. La clave se forma con los fluidos,
+    la composición redondeada, las magnitudes de entrada y salida y los dos valores de entrada
+    cuantizados a la tolerancia indicada (en las unidades de rprop). Con tolerancia = 0 los valores
+    de entrada se comparan exactamente y con activa = False no se usa la caché (modo exacto).
+    La comparten todos los hilos de un pool de hilos, por eso los cambios van con cerrojo.
+    """
+    def __init__(self, tamano: int = 50_000, tolerancia: float = 1e-9,
+                 decimales_mezcla: int = 6, activa: bool = True) -> None:
+        self.datos: OrderedDict[tuple, list[float]] = OrderedDict()
+        self.cerrojo = threading.Lock()
+        self.tamano = tamano
+        self.tolerancia = tolerancia
+        self.decimales_mezcla = decimales_mezcla
+        self.activa = activa
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsados = 0
+
+    def configurar(self, activa: bool | None = None, tamano: int | None = None,
+                   tolerancia: float | None = None, decimales_mezcla: int | None = None) -> None:
+        """
+        Cambiar la configuración de la caché. Si cambia la forma de construir las claves se vacía.
+        """
+        with self.cerrojo:
+            if activa is not None:
+                self.activa = activa
+            if tamano is not None:
+                self.tamano = tamano
+                while len(self.datos) > self.tamano:
+                    self.datos.popitem(last=False)
+                    self.expulsados += 1
+            if tolerancia is not None and tolerancia != self.tolerancia:
+                self.tolerancia = tolerancia
+                self.datos.clear()
+            if decimales_mezcla is not None and decimales_mezcla != self.decimales_mezcla:
+                self.decimales_mezcla = decimales_mezcla
+                self.datos.clear()
+
+    def clave(self, clave_base: tuple, a: float, b: float, mezcla: list[float]) -> tuple:
+        if self.tolerancia > 0:
+            a = round(a / self.tolerancia)
+            b = round(b / self.tolerancia)
+        return (clave_base, tuple(round(x, self.decimales_mezcla) for x in mezcla), a, b)
+
+    def obtener(self, clave: tuple) -> list[float] | None:
+        with self.cerrojo:
+            resultados = self.datos.get(clave)
+            if resultados is None:
+                self.fallos += 1
+                return None
+            self.datos.move_to_end(clave)
+            self.aciertos += 1
+            return resultados
+
+    def guardar(self, clave: tuple, resultados: list[float]) -> None:
+        with self.cerrojo:
+            self.datos[clave] = resultados
+            if len(self.datos) > self.tamano:
+                self.datos.popitem(last=False)
+                self.expulsados += 1
+
+    def estadisticas(self) -> dict[str, float]:
+        """
+        Devuelve los aciertos, fallos, expulsiones y el ratio de aciertos de la caché
+        """
+        total = self.aciertos + self.fallos
+        return {
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "ratio_aciertos": self.aciertos / total if total else 0.0,
+            "expulsados": self.expulsados,
+            "entradas": len(self.datos),
+        }
+
+    def limpiar(self) -> None:
+        with self.cerrojo:
+            self.datos.clear()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsados = 0
+
+# Caché de resultados del proceso
+CACHE_RESULTADOS = CacheResultados()
+
+# Caché persistente en disco (desactivada si es None)
+CACHE_DISCO: "CacheDisco | None" = None
+
+def activar_cache_disco(ruta: str, tamano_lote: int = 500) -> None:
+    """
+    Activar la caché persistente de propiedades en el fichero SQLite indicado. Usa las mismas claves
+    (y la misma tolerancia) que la caché LRU, más la versión del DLL de REFPROP.
+    Hay que llamarla después de init_refprop.
+    """
+    from refprop_cache import CacheDisco
+
+    global CACHE_DISCO
+    desactivar_cache_disco()
+    version = f"{_rp().RPVersion()}|{RUTA_DLL}"
+    CACHE_DISCO = CacheDisco(ruta, version, tamano_lote)
+
+def desactivar_cache_disco() -> None:
+    """
+    Volcar lo pendiente y dejar de usar la caché persistente
+    """
+    global CACHE_DISCO
+    if CACHE_DISCO is not None:
+        CACHE_DISCO.cerrar()
+        CACHE_DISCO = None
+
+# Caché en memoria compartida entre el proceso principal y los workers (desactivada si es None)
+CACHE_COMPARTIDA: "CacheCompartida | None" = None
+
+def activar_cache_compartida(n_registros: int = 1 << 18, nombre: str | None = None) -> None:
+    """
+    Activar la caché de propiedades en memoria compartida. Sin nombre se crea un segmento nuevo
+    (proceso principal); con nombre se conecta a uno existente (workers, lo hace init_refprop).
+    Cada registro ocupa 88 bytes, con el tamaño por defecto son unos 23 MB.
+    """
+    from refprop_cache import CacheCompartida
+
+    global CACHE_COMPARTIDA
+    desactivar_cache_compartida()
+    CACHE_COMPARTIDA = CacheCompartida(n_registros, nombre)
+
+def desactivar_cache_compartida() -> None:
+    """
+    Soltar la memoria compartida. Si la ha creado este proceso también se elimina.
+    """
+    global CACHE_COMPARTIDA
+    if CACHE_COMPARTIDA is not None:
+        CACHE_COMPARTIDA.cerrar()
+        CACHE_COMPARTIDA = None
+
+# Cliente del servidor de propiedades (refprop_servidor). Si está conectado las consultas se
+# resuelven en el servidor y este proceso no carga REFPROP.
+CLIENTE_SERVIDOR: "ClienteRefprop | None" = None
+
+def conectar_servidor_refprop(ruta: str | None = None) -> None:
+    """
+    Mandar las consultas de rprop / RPQuery / TPoint al servidor de propiedades que escucha en ruta
+    """
+    from refprop_servidor import ClienteRefprop, RUTA_SOCKET
+
+    global CLIENTE_SERVIDOR
+    desconectar_servidor_refprop()
+    CLIENTE_SERVIDOR = ClienteRefprop(ruta or RUTA_SOCKET)
+
+def desconectar_servidor_refprop() -> None:
+    global CLIENTE_SERVIDOR
+    if CLIENTE_SERVIDOR is not None:
+        CLIENTE_SERVIDOR.cerrar()
+        CLIENTE_SERVIDOR = None
+
+def refprop_inicializado() -> bool:
+    """
+    Si este proceso (o hilo) puede calcular: tiene REFPROP cargado o está conectado al servidor
+    """
+    return _rp() is not None or CLIENTE_SERVIDOR is not None
+
+# Tablas P-H precalculadas: (fluidos, mezcla redondeada) -> TablaPH
+TABLAS_PH: dict[tuple, "TablaPH"] = {}
+DECIMALES_TABLAS = 6
+
+def activar_tabla_ph(fluido: str | list[str], mezcla: list[float], P_min: float, P_max: float,
+                     H_min: float, H_max: float, n_P: int = 200, n_H: int = 200, **kwargs: Any) -> "TablaPH":
+    """
+    Construir (o cargar de disco) la tabla P-H de una mezcla y usarla en rprop/RPQuery/TPoint para
+    las consultas con entradas P y H cuyas salidas estén entre T, D, S, Q y V. Fuera de la ventana,
+    cerca de la campana de saturación o del punto crítico se sigue llamando a REFPROP.
+    Los kwargs se pasan a TablaPH.construir (directorio, márgenes críticos, n_muestras).
+
+    tabla = activar_tabla_ph("PROPANE;BUTANE", [0.5, 0.5], 1, 40, 100, 700)
+    tabla.meta["error_max"]  # Error máximo estimado de cada propiedad
+    """
+    from refprop_tablas import TablaPH
+
+    tabla = TablaPH.construir(fluido, mezcla, P_min, P_max, H_min, H_max, n_P, n_H, **kwargs)
+    _registrar_tabla(tabla)
+    return tabla
+
+def _registrar_tabla(tabla: "TablaPH") -> None:
+    clave = (tabla.meta["fluido"], tuple(round(x, DECIMALES_TABLAS) for x in tabla.meta["mezcla"]))
+    TABLAS_PH[clave] = tabla
+
+def desactivar_tablas_ph() -> None:
+    TABLAS_PH.clear()
+
+# Usar los splines de saturación de REFPROP en las consultas de mezclas con Q = 0 / Q = 1
+SATURACION_SPLINES = False
+
+def activar_splines_saturacion(activa: bool = True) -> None:
+    """
+    Mandar todas las consultas de saturación (Q = 0 o Q = 1) de mezclas a través de los splines
+    de saturación de REFPROP (SATSPLN). Los splines se generan una vez por mezcla y composición;
+    después cada punto saturado se interpola en vez de resolver el flash iterativo.
+    """
+    global SATURACION_SPLINES
+    SATURACION_SPLINES = activa
+
+def configurar_cache_rprop(activa: bool | None = None, tamano: int | None = None,
+                           tolerancia: float | None = None, decimales_mezcla: int | None = None) -> None:
+    """
+    Configurar la caché LRU de rprop. Por ejemplo, para cálculos exactos sin caché:
+
+    configurar_cache_rprop(activa = False)
+    """
+    CACHE_RESULTADOS.configurar(activa, tamano, tolerancia, decimales_mezcla)
+
 def rprop(fluidos: str | list[str], salida: str | list[str], mezcla: list[float] | None = None, **kwargs: float) -> float | list[float]:
     """
     Función para obtener las propiedades termodinámicas de un fluido a partir de 2 inputs (15% más lento que el DLL)
@@ -76,141 +484,744 @@ def rprop(fluidos: str | list[str], salida: str | list[str], mezcla: list[float]
     # Comprobar que solo hay dos entradas en kwargs
     if len(kwargs.keys()) != 2:
         raise ValueError("REFPROP solo admite dos entradas independientes (ej: T y P, T y H…).")
-    
-    # Convertir kwargs -> str y list[float] mayúsculas
-    valores_permitidos = ["T", "P", "D", "E", "H", "S", "Q"]
-    magnitud_entrada_refprop: str = ""
-    valores_entrada_refprop: list[float] = []
-    for clave, valor in kwargs.items():
-        clave = clave.upper()
-        if clave not in valores_permitidos:
-            raise ValueError(f"Propiedad de entrada no permitida: {clave}")
-        magnitud_entrada_refprop += clave
-        valores_entrada_refprop.append(valor)
-    
-    # Pasar de bar a MPa en la entrada para presión
-    for index, key in enumerate(kwargs.keys()):
-        if key.upper() == "P":
-            valores_entrada_refprop[index] /= 10
 
-    # Convertir fluidos list[str] -> str con fluid1;fluid2
+    [a, b] = kwargs.values()
+    return compilar_consulta(fluidos, salida, tuple(kwargs.keys()))(a, b, mezcla)
+
+def rprop_array(fluidos: str | list[str], salida: str | list[str], mezcla: "list[float] | np.ndarray | None" = None,
+                out: "np.ndarray | None" = None, errores: "np.ndarray | None" = None,
+                **kwargs: "np.ndarray | float") -> tuple["np.ndarray", "np.ndarray"]:
+    """
+    Versión de rprop para arrays: las dos entradas pueden ser arrays de NumPy (o escalares que se repiten)
+    y la mezcla puede ser una lista común o un array 2D con una composición por fila. Mismas unidades que rprop.
+
+    Devuelve (resultados, errores): resultados es un array (N, n_salida) y errores un array (N,)
+    con el código ierr de REFPROP de cada fila. Las filas con error quedan a NaN.
+
+    Ejemplo de uso:
+
+    presiones = np.linspace(1, 20, 50)
+    resultados, errores = rprop_array("PROPANE", "H;D", [1.0], P = presiones, T = 30)
+    H = resultados[:, 0]  # Entalpía de cada presión
+    """
+    if len(kwargs.keys()) != 2:
+        raise ValueError("REFPROP solo admite dos entradas independientes (ej: T y P, T y H…).")
+
+    [a, b] = kwargs.values()
+    return compilar_consulta(fluidos, salida, tuple(kwargs.keys())).calcular_array(a, b, mezcla, out, errores)
+
+def _convertir_fluidos(fluidos: str | list[str]) -> tuple[str, int]:
+    """
+    Convertir fluidos list[str] | str -> str con fluid1;fluid2 y número de componentes
+    """
     if isinstance(fluidos, list):
-        fluidos_lista = fluidos
-        n_fluidos = len(fluidos)
-        if len(fluidos) == 1:
-            fluidos_refprop = fluidos[0]
-        else:
-            fluidos_refprop = ";".join(fluidos)
+        return ";".join(fluidos), len(fluidos)
     elif isinstance(fluidos, str):
-        fluidos_lista = fluidos.split(";")
-        n_fluidos = len(fluidos_lista)
-        fluidos_refprop = fluidos
+        return fluidos, len(fluidos.split(";"))
     else:
         raise TypeError("Tipo incorrecto de fluido, tiene que ser: str o list[str]")
 
-    # Convertir salida str | list[str] -> list[str] mayúsculas
+def _convertir_salida(salida: str | list[str]) -> list[str]:
+    """
+    Convertir salida str | list[str] -> list[str] mayúsculas
+    """
     if isinstance(salida, list):
-        salida_lista = [x.upper() for x in salida]
+        return [x.upper() for x in salida]
     elif isinstance(salida, str):
-        salida_lista: list[str] = re.findall(r"[^;]{1,}", salida.upper())        
+        return re.findall(r"[^;]{1,}", salida.upper())
     else:
         raise TypeError("Tipo incorrecto de salida, tiene que ser: str o list[str]")
-    
-    # Guardar índices de presión para después transformar la salida
-    indices_presion: list[int] = []
-    texto_presion = {"P", "PCRIT"}
-    for index, texto in enumerate(salida_lista):
-        if texto in texto_presion:
-            indices_presion.append(index)
-
-    # Ver si título de vapor está en la lista
-    calcular_Q: bool = "Q" in salida_lista
-    if calcular_Q:
-        indice_Q = salida_lista.index("Q")
-
-    # Ver si Tcrit / Pcrit está en la lista ya que si hay más de
-    # 2 fluidos y se piden, refprop no dará una solución correcta
-    if "TCRIT" in salida_lista and n_fluidos > 1:
-        calcular_Tcrit = True
-        indice_Tcrit = salida_lista.index("TCRIT")
-    else:
-        calcular_Tcrit = False
 
-    if "PCRIT" in salida_lista and n_fluidos > 1:
-        calcular_Pcrit = True
-        indice_Pcrit = salida_lista.index("PCRIT")
-    else:
-        calcular_Pcrit = False
-
-    if calcular_Q:
-        salida_lista.remove("Q")
-    if calcular_Pcrit:
-        salida_lista.remove("PCRIT")
-    if calcular_Tcrit:
-        salida_lista.remove("TCRIT")
-
-    # Pasar la salida de list[str] -> str
-    if len(salida_lista) != 0:
-        salida_refprop = ";".join(salida_lista)
-    else:
-        salida_refprop = "H"
+# Puntos críticos ya calculados: (fluidos, composición redondeada) -> (T ºC, P MPa)
+_CACHE_CRITICO: dict[tuple[str, tuple[float, ...]], tuple[float, float]] = {}
+DECIMALES_CRITICO = 6
 
-    # Llamar a REFPROP
-    ncomp = len(fluidos_lista)
-    RP.SETUPdll(ncomp, fluidos_refprop, '', 'DEF')
-    res = RP.REFPROPdll(fluidos_refprop, magnitud_entrada_refprop, salida_refprop, RP.SI_WITH_C, 1, 0,
-                                valores_entrada_refprop[0], valores_entrada_refprop[1], mezcla)
-    
-    resultados: list[float] = []
-    for i in range(len(salida_lista)):
-        resultados.append(res.Output[i])
-
-    # Calcular la calidad de vapor si se ha pedido
-    if calcular_Q:
-        resultados.insert(indice_Q, res.q)
-
-    # Calcular la temperatura y presión crítica aproximada
-    if calcular_Pcrit or calcular_Tcrit:
-        P_min = 0.5  # MPa
-        P_max = 100  # MPa
-
-        P_low = P_min
-        P_high = P_max
-        eps_P = 0.01
-
-        for _ in range(100):
-            P_mid = 0.5 * (P_low + P_high)
-            out = RP.REFPROPdll(fluidos_refprop, "PQ", "P;T", RP.SI_WITH_C,
-                                        1, 0, P_mid, 0.5, mezcla)
-            
-            if out.ierr != 0:
-                P_high = P_mid
-                continue
-            
-            delta_P = abs(P_high - P_low)
-            if delta_P > eps_P:
-                P_low = P_mid
+def _critico(fluidos_refprop: str, ncomp: int, mezcla: list[float]) -> tuple[float, float]:
+    """
+    Temperatura (ºC) y presión crítica (MPa) memorizadas por fluidos y composición redondeada
+    """
+    clave = (fluidos_refprop, tuple(round(float(x), DECIMALES_CRITICO) for x in mezcla))
+    critico = _CACHE_CRITICO.get(clave)
+    if critico is None:
+        _mezclas().cargar(fluidos_refprop, ncomp)
+        if ncomp == 1:
+            # Fluido puro: REFPROP da directamente sus constantes críticas, sin iterar
+            rp = _rp()
+            res = rp.REFPROPdll(fluidos_refprop, "", "TC;PC", rp.SI_WITH_C, 1, 0, 0, 0, [1.0])
+            if res.ierr > 0:
+                # Sin memorizar: un fallo no se puede quedar como punto crítico válido
+                _contar_error(res.ierr)
+                raise error_refprop(res.ierr, res.herr)
+            critico = (res.Output[0], res.Output[1])
+        else:
+            critico = _critico_mezcla(fluidos_refprop, mezcla)
+        _CACHE_CRITICO[clave] = critico
+    return critico
+
+def _critico_mezcla(fluidos_refprop: str, mezcla: list[float]) -> tuple[float, float]:
+    """
+    Calcular la temperatura (ºC) y presión crítica (MPa) aproximada de una mezcla: la mayor presión
+    a la que REFPROP todavía resuelve un estado bifásico (Q = 0.5).
+
+    Se parte de la estimación del punto crítico de REFPROP, se busca un intervalo [P_low, P_high]
+    donde el flash converge en P_low y falla en P_high ampliándolo geométricamente, y se estrecha
+    por bisección hasta eps_P.
+    """
+    P_min = 0.5  # MPa
+    P_max = 100  # MPa
+    eps_P = 0.01
+    rp = _rp()
+
+    def flash(P: float):
+        return rp.REFPROPdll(fluidos_refprop, "PQ", "T", rp.SI_WITH_C, 1, 0, P, 0.5, mezcla)
+
+    # Estimación inicial del punto crítico de la mezcla
+    estimacion = rp.REFPROPdll(fluidos_refprop, "", "PC", rp.SI_WITH_C, 1, 0, 0, 0, mezcla)
+    P_estimada = estimacion.Output[0]
+    if estimacion.ierr > 0 or not (P_min < P_estimada < P_max):
+        P_estimada = 5.0
+
+    # Extremo inferior: presión a la que el flash converge
+    P_low = P_estimada * 0.9
+    res = flash(P_low)
+    while res.ierr != 0:
+        if P_low <= P_min:
+            raise error_refprop(res.ierr, f"Las propiedades críticas no convergen: {res.herr}")
+        P_low = max(P_low * 0.7, P_min)
+        res = flash(P_low)
+    T_low = res.Output[0]
+
+    # Extremo superior: presión a la que el flash ya no converge (P_max se da por no convergida)
+    P_high = min(P_estimada * 1.1, P_max)
+    while P_high < P_max:
+        res = flash(P_high)
+        if res.ierr != 0:
+            break
+        P_low, T_low = P_high, res.Output[0]
+        P_high = min(P_high * 1.3, P_max)
+
+    # Bisección dentro del intervalo
+    while P_high - P_low > eps_P:
+        P_mid = 0.5 * (P_low + P_high)
+        res = flash(P_mid)
+        if res.ierr != 0:
+            P_high = P_mid
+        else:
+            P_low, T_low = P_mid, res.Output[0]
+
+    return T_low, P_low
+
+def punto_critico(fluidos: str | list[str], mezcla: list[float] | None = None) -> tuple[float, float]:
+    """
+    Devuelve [T_crit (ºC), P_crit (bar)] del fluido o mezcla. Los fluidos puros se leen directamente
+    de REFPROP y las mezclas se calculan una sola vez por composición.
+
+    punto_critico(["PROPANE", "BUTANE"], [0.5, 0.5])  # Returns (T_crit, P_crit)
+    """
+    if mezcla is None:
+        mezcla = [1.0]
+    if CLIENTE_SERVIDOR is not None:
+        T_crit, P_crit = compilar_consulta(fluidos, "TCRIT;PCRIT", ("T", "P"))(0, 0, mezcla)
+        return T_crit, P_crit
+    fluidos_refprop, ncomp = _convertir_fluidos(fluidos)
+    T_crit, P_crit = _critico(fluidos_refprop, ncomp, mezcla)
+    return T_crit, P_crit * 10
+
+def _niveles_cache() -> list:
+    """
+    Cachés activas en el orden en que se buscan: la del proceso, la compartida entre workers y la de disco
+    """
+    return [cache for cache in (CACHE_RESULTADOS if CACHE_RESULTADOS.activa else None,
+                                CACHE_COMPARTIDA, CACHE_DISCO) if cache is not None]
+
+def _buscar_cache(niveles: list, clave: tuple) -> list[float] | None:
+    """
+    Buscar por orden en las cachés. Lo encontrado en un nivel se copia a los anteriores.
+    """
+    for i, cache in enumerate(niveles):
+        resultados = cache.obtener(clave)
+        if resultados is not None:
+            for anterior in niveles[:i]:
+                anterior.guardar(clave, resultados)
+            return resultados
+    return None
+
+class RPQuery:
+    """
+    Consulta a REFPROP compilada una sola vez a partir de los fluidos, las magnitudes de entrada
+    y las de salida. Al llamarla solo se pasan los dos valores de entrada, así los bucles no repiten
+    el análisis de strings, la búsqueda de Q/Tcrit/Pcrit ni el cálculo de índices de presión de rprop.
+
+    Las entradas se dan en el mismo orden y unidades que en rprop:
+
+    consulta = RPQuery(["PROPANE", "BUTANE"], "T;H", [0.5, 0.5], "PS")
+    consulta(10, 1.8)  # Returns [T, H] con P = 10 bar y S = 1.8 kJ/(kg*K)
+    consulta(10, 1.8, [0.3, 0.7])  # Misma consulta con otra composición
+    """
+    # Orígenes de cada valor de la salida
+    _DLL = 0
+    _Q = 1
+    _TCRIT = 2
+    _PCRIT = 3
+    # Código de las filas de calcular_array sin punto crítico si el error no trae el de REFPROP
+    _IERR_CRITICO = 200
+
+    def __init__(self, fluidos: str | list[str], salida: str | list[str],
+                 mezcla: list[float] | None = None, entrada: str | list[str] = "PH",
+                 splines: bool | None = None) -> None:
+
+        # Valor predeterminado de mezcla
+        self.mezcla = [1.0] if mezcla is None else mezcla
+
+        # Entradas: "PH" o ["P", "H"]
+        valores_permitidos = ["T", "P", "D", "E", "H", "S", "Q"]
+        entrada_lista = [x.upper() for x in entrada]
+        if len(entrada_lista) != 2:
+            raise ValueError("REFPROP solo admite dos entradas independientes (ej: T y P, T y H…).")
+        for clave in entrada_lista:
+            if clave not in valores_permitidos:
+                raise ValueError(f"Propiedad de entrada no permitida: {clave}")
+        self.entrada_refprop = "".join(entrada_lista)
+        # Posición de Q en la entrada, para usar los splines de saturación cuando Q = 0 / 1
+        self.indice_Q = entrada_lista.index("Q") if "Q" in entrada_lista else None
+        # None: seguir SATURACION_SPLINES; True / False: forzar con o sin splines
+        self.splines = splines
+        # Pasar de bar a MPa en la entrada para presión
+        [self.factor_a, self.factor_b] = [0.1 if clave == "P" else 1.0 for clave in entrada_lista]
+
+        self.fluidos_refprop, self.ncomp = _convertir_fluidos(fluidos)
+        self.salida_lista = _convertir_salida(salida)
+
+        # Plan de la salida: para cada magnitud pedida de dónde sale y por cuánto se multiplica
+        # Tcrit / Pcrit salen de punto crítico memorizado (en mezclas refprop no da una solución correcta)
+        salida_dll: list[str] = []
+        plan: list[tuple[int, int, float]] = []
+        for texto in self.salida_lista:
+            factor = 10.0 if texto in ("P", "PCRIT") else 1.0  # Pasar de MPa a bar la salida
+            if texto == "Q":
+                plan.append((self._Q, 0, factor))
+            elif texto == "TCRIT":
+                plan.append((self._TCRIT, 0, factor))
+            elif texto == "PCRIT":
+                plan.append((self._PCRIT, 0, factor))
+            else:
+                plan.append((self._DLL, len(salida_dll), factor))
+                salida_dll.append(texto)
+        self.plan = plan
+
+        # Pasar la salida de list[str] -> str
+        self.salida_refprop = ";".join(salida_dll) if salida_dll else "H"
+
+        # Camino rápido: todo sale directamente del DLL
+        self.n_salida = len(plan)
+        self.solo_dll = all(origen == self._DLL for origen, _, _ in plan)
+        self.factores = [factor for _, _, factor in plan]
+        self.sin_factores = all(factor == 1.0 for factor in self.factores)
+        self.calcular_critico = any(origen in (self._TCRIT, self._PCRIT) for origen, _, _ in plan)
+        # Si solo se piden propiedades críticas no hace falta resolver el estado
+        self.requiere_flash = any(origen in (self._DLL, self._Q) for origen, _, _ in plan)
+
+        # Parte fija de la clave en la caché de resultados
+        self.clave_base = (self.fluidos_refprop, self.entrada_refprop, tuple(self.salida_lista))
+        self.clave_base_splines = self.clave_base + ("SATSPLN",)
+
+        # Columnas de la tabla P-H que corresponden a la salida (se calculan la primera vez)
+        self.indices_tabla: list[int] | None = None
+
+    def __call__(self, a: float, b: float, mezcla: list[float] | None = None) -> float | list[float]:
+        if mezcla is None:
+            mezcla = self.mezcla
+
+        # Tabla P-H precalculada de la mezcla, si la hay
+        if TABLAS_PH and self.entrada_refprop == "PH":
+            resultados = self._evaluar_tabla(a, b, mezcla)
+            if resultados is not None:
+                return resultados[0] if self.n_salida == 1 else resultados
+
+        niveles = _niveles_cache()
+        if not niveles:
+            resultados, _ = self._evaluar(a, b, mezcla)
+        else:
+            clave = self._clave_cache(a, b, mezcla)
+            resultados = _buscar_cache(niveles, clave)
+            if resultados is None:
+                resultados, ierr = self._evaluar(a, b, mezcla)
+                if ierr <= 0:
+                    for cache in niveles:
+                        cache.guardar(clave, resultados)
+            resultados = list(resultados)
+
+        # Return single value if only one output, else list
+        return resultados[0] if self.n_salida == 1 else resultados
+
+    def _clave_cache(self, a: float, b: float, mezcla: list[float]) -> tuple:
+        clave_base = self.clave_base_splines if self._usa_splines() else self.clave_base
+        return CACHE_RESULTADOS.clave(clave_base, a, b, mezcla)
+
+    def calcular_lote(self, a: "np.ndarray | list[float]", b: "np.ndarray | list[float]",
+                      mezcla: list[float] | None = None) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Igual que calcular_array con una composición común, pero cada fila pasa antes por lo mismo que
+        una llamada suelta: tabla P-H y cachés (LRU, memoria compartida y disco). Solo las filas que no
+        están en ninguna se calculan, juntas en una pasada de calcular_array, y se guardan en las cachés.
+        """
+        if mezcla is None:
+            mezcla = self.mezcla
+        out, errores, faltan, claves, a_faltan, b_faltan = self._buscar_lote(a, b, mezcla)
+        if faltan:
+            self._guardar_lote(out, errores, faltan, claves, *self.calcular_array(a_faltan, b_faltan, mezcla))
+        return out, errores
+
+    def _buscar_lote(self, a, b, mezcla: list[float]) -> tuple:
+        """
+        Primera mitad de calcular_lote: las filas que salen de las tablas o de las cachés. Devuelve
+        (out, errores, filas que faltan, sus claves de caché, a y b de esas filas)
+        """
+        import numpy as np
+
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+        a, b = a.ravel(), b.ravel()
+        n = a.shape[0]
+        out = np.empty((n, self.n_salida), dtype=float)
+        errores = np.zeros(n, dtype=np.int32)
+
+        usar_tabla = bool(TABLAS_PH) and self.entrada_refprop == "PH"
+        niveles = _niveles_cache()
+        faltan: list[int] = []
+        claves: list[tuple | None] = []
+        for i in range(n):
+            a_i, b_i = float(a[i]), float(b[i])
+            resultados = self._evaluar_tabla(a_i, b_i, mezcla) if usar_tabla else None
+            clave = None
+            if resultados is None and niveles:
+                clave = self._clave_cache(a_i, b_i, mezcla)
+                resultados = _buscar_cache(niveles, clave)
+            if resultados is None:
+                faltan.append(i)
+                claves.append(clave)
+            else:
+                out[i] = resultados
+        return out, errores, faltan, claves, a[faltan], b[faltan]
+
+    def _guardar_lote(self, out: "np.ndarray", errores: "np.ndarray", faltan: list[int], claves: list,
+                      calculados: "np.ndarray", errores_faltan: "np.ndarray") -> None:
+        """
+        Segunda mitad de calcular_lote: colocar las filas calculadas y guardarlas en las cachés
+        """
+        out[faltan] = calculados
+        errores[faltan] = errores_faltan
+        niveles = _niveles_cache()
+        for fila, clave, ierr in zip(calculados.tolist(), claves, errores_faltan.tolist()):
+            if clave is not None and ierr <= 0:
+                for cache in niveles:
+                    cache.guardar(clave, fila)
+
+    def _usa_splines(self) -> bool:
+        """
+        Si esta consulta pasa por los splines de saturación: mezclas con Q como entrada
+        """
+        if self.indice_Q is None or self.ncomp == 1:
+            return False
+        return SATURACION_SPLINES if self.splines is None else self.splines
+
+    def _evaluar_tabla(self, a: float, b: float, mezcla: list[float]) -> list[float] | None:
+        """
+        Interpolar en la tabla P-H de la mezcla. None si no hay tabla, alguna salida no está tabulada
+        o el punto cae en una celda donde hay que usar REFPROP.
+        """
+        tabla = TABLAS_PH.get((self.fluidos_refprop, tuple(round(x, DECIMALES_TABLAS) for x in mezcla)))
+        if tabla is None:
+            return None
+        indices = self.indices_tabla
+        if indices is None:
+            propiedades = tabla.PROPIEDADES
+            if not all(texto in propiedades for texto in self.salida_lista):
+                return None
+            indices = self.indices_tabla = [propiedades.index(texto) for texto in self.salida_lista]
+        valores = tabla.evaluar(a, b)
+        if valores is None:
+            return None
+        return [float(valores[k]) for k in indices]
+
+    def _evaluar(self, a: float, b: float, mezcla: list[float]) -> tuple[list[float], int]:
+        """
+        Llamar a REFPROP y construir la salida según el plan. Devuelve los resultados y el ierr.
+        Si REFPROP falla (ierr > 0) lanza la ErrorRefprop de la categoría o devuelve NaN, según MODO_ERRORES.
+        """
+        if CLIENTE_SERVIDOR is not None:
+            return self._evaluar_servidor(a, b, mezcla)
+
+        ierr = 0
+        if self.requiere_flash:
+            rp = _rp()
+            mezclas = _mezclas()
+            mezclas.cargar(self.fluidos_refprop, self.ncomp)
+            # Splines: se generan una vez por composición con SATSPLNdll y la llamada va con iFlag = 1,
+            # el valor documentado para que REFPROPdll los use (no los regenera si la composición es la misma)
+            i_flag = 0
+            if self._usa_splines() and (b if self.indice_Q else a) in (0, 1):
+                i_flag = int(mezclas.cargar_splines(self.fluidos_refprop, mezcla))
+            res = rp.REFPROPdll(self.fluidos_refprop, self.entrada_refprop, self.salida_refprop, rp.SI_WITH_C, 1,
+                                i_flag, a * self.factor_a, b * self.factor_b, mezcla)
+            salida = res.Output
+            ierr = res.ierr
+            if ierr != 0:
+                _contar_error(ierr)
+                if ierr > 0:
+                    if MODO_ERRORES == "excepcion":
+                        raise error_refprop(ierr, res.herr)
+                    return [float("nan")] * self.n_salida, ierr
+
+        if self.solo_dll:
+            if self.sin_factores:
+                resultados = list(salida[:self.n_salida])
             else:
-                P_crit = P_low
-                T_crit = RP.REFPROPdll(fluidos_refprop, "PQ", "T", RP.SI_WITH_C,
-                                                 1, 0, P_low, 0.5, mezcla).Output[0]
-                break
+                resultados = [valor * factor for valor, factor in zip(salida, self.factores)]
         else:
-            raise RuntimeError("Las propiedades críticas no convergen")
+            if self.calcular_critico:
+                T_crit, P_crit = _critico(self.fluidos_refprop, self.ncomp, mezcla)
+            resultados = []
+            for origen, indice, factor in self.plan:
+                if origen == self._DLL:
+                    valor = salida[indice]
+                elif origen == self._Q:
+                    valor = res.q
+                elif origen == self._TCRIT:
+                    valor = T_crit
+                else:
+                    valor = P_crit
+                resultados.append(valor * factor)
+
+        return resultados, ierr
+
+    def _evaluar_servidor(self, a: float, b: float, mezcla: list[float]) -> tuple[list[float], int]:
+        """
+        _evaluar en el servidor de propiedades, con el mismo tratamiento de errores
+        """
+        out, errores, herr = CLIENTE_SERVIDOR.consultar(self.fluidos_refprop, ";".join(self.salida_lista),
+                                                        self.entrada_refprop, a, b, mezcla, self._usa_splines())
+        ierr = int(errores[0])
+        if ierr > 0:
+            _contar_error(ierr)
+            if MODO_ERRORES == "excepcion":
+                raise error_refprop(ierr, herr)
+        return out[0].tolist(), ierr
+
+    def calcular_array(self, a: "np.ndarray | float", b: "np.ndarray | float", mezcla: "list[float] | np.ndarray | None" = None,
+                       out: "np.ndarray | None" = None, errores: "np.ndarray | None" = None) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Evaluar la consulta para arrays de entradas. Devuelve un array 2D (fila por estado, columna por
+        magnitud de salida) y un array con el código de error de REFPROP de cada fila (0 si no hay error).
+        Las filas con error (ierr > 0) se rellenan con NaN en vez de lanzar una excepción.
+
+        :param mezcla: Composición común a todas las filas o array 2D con una composición por fila
+        :param out: Array (N, n_salida) preasignado donde escribir los resultados
+        :param errores: Array (N,) de enteros preasignado donde escribir los códigos de error
+        """
+        import numpy as np
+
+        if mezcla is None:
+            mezcla = self.mezcla
+
+        if CLIENTE_SERVIDOR is not None:
+            resultados, ierr, _ = CLIENTE_SERVIDOR.consultar(self.fluidos_refprop, ";".join(self.salida_lista),
+                                                              self.entrada_refprop, a, b, mezcla, self._usa_splines())
+            if out is None:
+                return resultados, ierr
+            out[...] = resultados
+            if errores is not None:
+                errores[...] = ierr
+                return out, errores
+            return out, ierr
+
+        # Composición por fila
+        composiciones = np.asarray(mezcla, dtype=float)
+        por_fila = composiciones.ndim == 2
+
+        # Unificar las dimensiones de las entradas y pasar de bar a MPa de golpe
+        if por_fila:
+            a, b = np.broadcast_to(a, composiciones.shape[:1]), np.broadcast_to(b, composiciones.shape[:1])
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=float) * self.factor_a,
+                                   np.asarray(b, dtype=float) * self.factor_b)
+        a, b = a.ravel(), b.ravel()
+        n = a.shape[0]
+
+        if out is None:
+            out = np.empty((n, self.n_salida), dtype=float)
+        if errores is None:
+            errores = np.zeros(n, dtype=np.int32)
+
+        # Columnas que salen del DLL y columnas especiales
+        columnas_dll = [(columna, indice) for columna, (origen, indice, _) in enumerate(self.plan) if origen == self._DLL]
+        columna_Q = [columna for columna, (origen, _, _) in enumerate(self.plan) if origen == self._Q]
+        columnas_crit = [(columna, origen) for columna, (origen, _, _) in enumerate(self.plan)
+                         if origen in (self._TCRIT, self._PCRIT)]
+        n_dll = len(columnas_dll)
+        dll_contiguo = all(columna == indice for columna, indice in columnas_dll)
+
+        rp = _rp()
+        mezclas = _mezclas()
+        mezclas.cargar(self.fluidos_refprop, self.ncomp)
+
+        # Variables locales para el bucle
+        refprop_dll = rp.REFPROPdll
+        unidades = rp.SI_WITH_C
+        fluidos_refprop = self.fluidos_refprop
+        entrada_refprop = self.entrada_refprop
+        salida_refprop = self.salida_refprop
+        z = mezcla if not por_fila else None
+        critico = None
+
+        # Splines de saturación: solo con composición común, generarlos para cada fila costaría más que el flash.
+        # Se generan una vez con SATSPLNdll y las filas con Q = 0 / Q = 1 van con iFlag = 1 para usarlos
+        flags = None
+        if self.requiere_flash and not por_fila and self._usa_splines():
+            Q = b if self.indice_Q else a
+            saturadas = (Q == 0) | (Q == 1)
+            if np.any(saturadas) and mezclas.cargar_splines(fluidos_refprop, z):
+                flags = saturadas.astype(int).tolist()
+
+        for i in range(n):
+            if por_fila:
+                z = composiciones[i].tolist()
+            fila = out[i]
+            if self.requiere_flash:
+                res = refprop_dll(fluidos_refprop, entrada_refprop, salida_refprop, unidades, 1,
+                                  flags[i] if flags else 0, a[i], b[i], z)
+                errores[i] = res.ierr
+                if res.ierr != 0:
+                    _contar_error(res.ierr)
+                if res.ierr > 0:
+                    out[i] = np.nan
+                    continue
+
+                if dll_contiguo:
+                    fila[:n_dll] = res.Output[:n_dll]
+                else:
+                    for columna, indice in columnas_dll:
+                        fila[columna] = res.Output[indice]
+                for columna in columna_Q:
+                    fila[columna] = res.q
+            if columnas_crit:
+                if critico is None or por_fila:
+                    try:
+                        critico = _critico(fluidos_refprop, self.ncomp, z)
+                    except RuntimeError as e:
+                        # Sin punto crítico la fila se queda en NaN con el código, como un flash fallido.
+                        # Con composición común el fallo se guarda para no repetir la búsqueda en cada fila
+                        critico = getattr(e, "ierr", None) or self._IERR_CRITICO
+                if isinstance(critico, int):
+                    out[i] = np.nan
+                    errores[i] = critico
+                    continue
+                for columna, origen in columnas_crit:
+                    fila[columna] = critico[0] if origen == self._TCRIT else critico[1]
+
+        # Pasar de MPa a bar la salida en bloque
+        if not self.sin_factores:
+            out *= np.asarray(self.factores)
+
+        return out, errores
+
+    # Salidas de los barridos con estimación inicial: (magnitud de THERMdll, por masa molar)
+    _SALIDAS_BARRIDO = {"T": None, "P": None, "D": None, "V": None, "H": 2, "S": 3, "E": 1,
+                        "CV": 4, "CP": 5, "W": 6}
+
+    def calcular_barrido(self, a: "np.ndarray | float", b: "np.ndarray | float", mezcla: list[float] | None = None,
+                         fase: str = "liquido") -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Evaluar una secuencia ordenada de estados de una sola fase (entrada TP o PT) partiendo en cada
+        estado de la densidad del anterior: TPRHOdll con kguess = 1 y THERMdll en vez del flash general.
+        Así no se repite la búsqueda de fases ni la estimación inicial de REFPROP en cada punto, pero
+        solo vale para tramos en los que la fase se conoce de antemano ("liquido" o "vapor"), como las
+        isotermas del diagrama P-H por encima de la presión de burbuja o por debajo de la de rocío.
+
+        Devuelve lo mismo que calcular_array. Las filas en las que TPRHOdll falla se recalculan con el
+        flash normal, y si la consulta no se puede hacer así (otra entrada, una composición por fila,
+        salidas que no da THERMdll o conectado al servidor) se usa directamente calcular_array.
+        """
+        import numpy as np
+
+        if mezcla is None:
+            mezcla = self.mezcla
+        if (CLIENTE_SERVIDOR is not None or self.entrada_refprop not in ("TP", "PT") or np.ndim(mezcla) != 1
+                or not self.solo_dll
+                or any(texto not in self._SALIDAS_BARRIDO for texto in self.salida_lista)):
+            return self.calcular_array(a, b, mezcla)
+
+        a_bar, b_bar = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+        a_bar, b_bar = a_bar.ravel(), b_bar.ravel()
+        T, P = (a_bar, b_bar) if self.entrada_refprop == "TP" else (b_bar, a_bar)
+        n = T.shape[0]
+        out = np.empty((n, self.n_salida), dtype=float)
+        errores = np.zeros(n, dtype=np.int32)
+
+        rp = _rp()
+        _mezclas().cargar(self.fluidos_refprop, self.ncomp)
+        # Las rutinas clásicas de REFPROP trabajan en base molar: K, kPa, mol/L y J/mol
+        z, M = rp.XMOLEdll(mezcla)[:2]
+        kph = 1 if fase == "liquido" else 2
+        tprho, therm = rp.TPRHOdll, rp.THERMdll
+
+        D = 0.0
+        fallidas = []
+        for i in range(n):
+            T_K = T[i] + 273.15
+            res = tprho(T_K, P[i] * 100, z, kph, int(D > 0), D)
+            if res[1] > 0:
+                fallidas.append(i)
+                D = 0.0
+                continue
+            D = res[0]
+            propiedades = therm(T_K, D, z)
+            fila = out[i]
+            for columna, texto in enumerate(self.salida_lista):
+                if texto == "T":
+                    fila[columna] = T[i]
+                elif texto == "P":
+                    fila[columna] = P[i] * 0.1
+                elif texto == "D":
+                    fila[columna] = D * M
+                elif texto == "V":
+                    fila[columna] = 1 / (D * M)
+                elif texto == "W":
+                    fila[columna] = propiedades[6]
+                else:
+                    fila[columna] = propiedades[self._SALIDAS_BARRIDO[texto]] / M
+
+        if not self.sin_factores:
+            out *= np.asarray(self.factores)
+
+        if fallidas:
+            out[fallidas], errores[fallidas] = self.calcular_array(a_bar[fallidas], b_bar[fallidas], mezcla)
+
+        return out, errores
 
-    if calcular_Pcrit:
-        resultados.insert(indice_Pcrit, P_crit)
-    if calcular_Tcrit:
-        resultados.insert(indice_Tcrit, T_crit)
+# Consultas compiladas: (fluidos, salida, entradas) -> RPQuery
+_CONSULTAS: dict[tuple, RPQuery] = {}
 
-    # Pasar de MPa a bar la salida
-    for index in indices_presion:
-        resultados[index] *= 10
+def compilar_consulta(fluidos: str | list[str], salida: str | list[str], entrada: str | tuple[str, ...],
+                      splines: bool | None = None) -> RPQuery:
+    """
+    Devuelve la RPQuery de esta combinación de fluidos, salida y entradas, compilándola solo
+    la primera vez que se pide. La composición se pasa al llamar a la consulta.
+    """
+    clave = (tuple(fluidos) if isinstance(fluidos, list) else fluidos,
+             tuple(salida) if isinstance(salida, list) else salida,
+             entrada, splines)
+    consulta = _CONSULTAS.get(clave)
+    if consulta is None:
+        consulta = RPQuery(fluidos, salida, None, list(entrada), splines)
+        _CONSULTAS[clave] = consulta
+    return consulta
+
+def calcular_lotes(lotes: list[tuple[RPQuery, list[float], list[float], list[float] | None]]
+                   ) -> list[tuple["np.ndarray", "np.ndarray"]]:
+    """
+    RPQuery.calcular_lote de varias consultas [(consulta, a, b, mezcla), ...]. Con servidor, las filas
+    que no están en las cachés de este proceso van todas juntas en una sola petición al servidor.
+    """
+    if CLIENTE_SERVIDOR is None:
+        return [consulta.calcular_lote(a, b, mezcla) for consulta, a, b, mezcla in lotes]
+
+    mezclas = [consulta.mezcla if mezcla is None else mezcla for consulta, _, _, mezcla in lotes]
+    buscados = [consulta._buscar_lote(a, b, mezcla) for (consulta, a, b, _), mezcla in zip(lotes, mezclas)]
+    peticiones = [(consulta.fluidos_refprop, ";".join(consulta.salida_lista), consulta.entrada_refprop,
+                   a_faltan, b_faltan, mezcla, consulta._usa_splines())
+                  for (consulta, *_), mezcla, (*_, faltan, _, a_faltan, b_faltan) in zip(lotes, mezclas, buscados)
+                  if faltan]
+    respuestas = iter(CLIENTE_SERVIDOR.consultar_varias(peticiones) if peticiones else [])
+
+    resultados = []
+    for (consulta, *_), (out, errores, faltan, claves, _, _) in zip(lotes, buscados):
+        if faltan:
+            calculados, errores_faltan, _ = next(respuestas)
+            consulta._guardar_lote(out, errores, faltan, claves, calculados, errores_faltan)
+        resultados.append((out, errores))
+    return resultados
+
+def saturacion(fluidos: str | list[str], salida: str | list[str] = "T;P;H;S;D", mezcla: list[float] | None = None,
+               Q: float = 0, **kwargs: float) -> float | list[float]:
+    """
+    Propiedades de un punto saturado (Q = 0 líquido, Q = 1 vapor) a partir de la presión o la
+    temperatura, usando siempre los splines de saturación de REFPROP en las mezclas. Mismas unidades
+    que rprop. La primera llamada de cada composición genera los splines (SATSPLN, lento); las siguientes
+    son mucho más rápidas que el flash normal.
+
+    saturacion(["PROPANE", "BUTANE"], "T;H", [0.5, 0.5], Q = 1, P = 5)  # Returns [T_rocío, H]
+    """
+    if mezcla is None:
+        mezcla = [1.0]
+    if len(kwargs) != 1 or next(iter(kwargs)) not in ("T", "P"):
+        raise ValueError("saturacion necesita una única entrada: T o P")
+
+    [(clave, valor)] = kwargs.items()
+    return compilar_consulta(fluidos, salida, (clave, "Q"), splines=True)(valor, Q, mezcla)
+
+class ModeloSecundario:
+    """
+    Estados del agua (foco caliente) y del etilenglicol (foco frío) de una water_config, que no
+    dependen del refrigerante: entalpías de entrada y salida y densidad de entrada a 1 bar, y una
+    tabla H -> T del agua a 1 bar para el punto de pinch. Se calcula una vez por proceso (y se pasa a
+    los workers del pool) para que calcular_ciclo no vuelva a cargar WATER ni ETHYLENEGLYCOL en REFPROP.
+    """
+    # Paso de la tabla del agua (K) y margen a cada lado de t_hw
+    PASO_TABLA = 0.5
+    MARGEN_TABLA = 1.0
+
+    def __init__(self, water_config: str) -> None:
+        import numpy as np
+
+        self.water_config = water_config
+        [t_hw_in, t_hw_out] = WATER_CONFIG[water_config]["t_hw"]
+        [t_cw_in, t_cw_out] = WATER_CONFIG[water_config]["t_cw"]
+
+        [[self.h_hw_in, self.d_hw_in], [self.h_hw_out, _]] = self._estados("WATER", ["H", "D"], [t_hw_in, t_hw_out])
+        [[self.h_cw_in, self.d_cw_in], [self.h_cw_out, _]] = self._estados("ETHYLENEGLYCOL", ["H", "D"],
+                                                                           [t_cw_in, t_cw_out])
+
+        # H del agua líquida a 1 bar crece con T: se interpola linealmente entre nodos
+        t_min = min(t_hw_in, t_hw_out) - self.MARGEN_TABLA
+        t_max = max(t_hw_in, t_hw_out) + self.MARGEN_TABLA
+        self.t_tabla: list[float] = np.linspace(t_min, t_max, int(round((t_max - t_min) / self.PASO_TABLA)) + 1).tolist()
+        self.h_tabla: list[float] = [h for [h] in self._estados("WATER", ["H"], self.t_tabla)]
+
+    @staticmethod
+    def _estados(fluido: str, salida: list[str], temperaturas: list[float]) -> list[list[float]]:
+        resultados, errores = compilar_consulta(fluido, salida, ("P", "T")).calcular_lote(1, temperaturas)
+        if errores.any():
+            raise error_refprop(int(errores.max()), f"{fluido} a 1 bar no tiene solución entre {temperaturas}")
+        return resultados.tolist()
+
+    def T_agua(self, h: float) -> float:
+        """
+        Temperatura del agua a 1 bar con entalpía h (kJ/kg). Fuera de la tabla, flash de REFPROP.
+        """
+        h_tabla = self.h_tabla
+        i = bisect.bisect_right(h_tabla, h)
+        if i == 0 or i == len(h_tabla):
+            if h == h_tabla[-1]:
+                return self.t_tabla[-1]
+            return compilar_consulta("WATER", "T", ("P", "H"))(1, h)
+        fraccion = (h - h_tabla[i - 1]) / (h_tabla[i] - h_tabla[i - 1])
+        return self.t_tabla[i - 1] + fraccion * (self.t_tabla[i] - self.t_tabla[i - 1])
 
-    # Return single value if only one output, else list
-    return resultados[0] if len(resultados) == 1 else resultados
+# Modelos del agua / glicol ya calculados en este proceso, por water_config
+MODELOS_SECUNDARIOS: dict[str, ModeloSecundario] = {}
+
+def modelo_secundario(water_config: str) -> ModeloSecundario:
+    """
+    Modelo del agua / glicol de la water_config, calculado la primera vez que se pide en el proceso.
+    Conviene pedirlo antes de crear_pool para que los workers lo reciban ya hecho.
+    """
+    modelo = MODELOS_SECUNDARIOS.get(water_config)
+    if modelo is None:
+        modelo = MODELOS_SECUNDARIOS.setdefault(water_config, ModeloSecundario(water_config))
+    return modelo
 
 class Serializable:
+    __slots__ = ()
+
     def to_dict(self):
         raise NotImplemented
     
@@ -218,9 +1229,92 @@ class Serializable:
     def from_dict(cls, dic):
         raise NotImplemented
 
+# Tuplas de nombres de entrada compartidas por todos los TPoint con las mismas entradas
+_ENTRADAS_TPOINT: dict[tuple[str, ...], tuple[str, ...]] = {}
+
+def _entradas_tpoint(nombres) -> tuple[str, ...]:
+    nombres = tuple(nombres)
+    return _ENTRADAS_TPOINT.setdefault(nombres, nombres)
+
+# Precarga de propiedades de TPoint. Cada punto pertenece a un grupo: el que se da con grupo= o, si no,
+# la línea de código que lo ha creado ("ciclo_basico_binario.py:152"). Por cada grupo se apuntan las
+# propiedades que se piden a demanda y, cuando a un punto del grupo le falta una, se calculan todas las
+# del grupo en una sola llamada a REFPROP en vez de una por propiedad. Desactivada por defecto: buscar
+# el sitio de cada punto encarece su creación; se activa con configurar_prefetch_tpoint(True).
+PREFETCH_TPOINT = False
+# Propiedades vistas por grupo (aprendidas) y las fijadas a mano, que mandan sobre las aprendidas
+_PERFILES_TPOINT: dict[str, set[str]] = {}
+_PREFETCH_FIJO: dict[str, tuple[str, ...]] = {}
+_SITIOS_TPOINT: dict[tuple, str] = {}
+
+def _sitio_tpoint(marco) -> str:
+    clave = (marco.f_code, marco.f_lineno)
+    sitio = _SITIOS_TPOINT.get(clave)
+    if sitio is None:
+        sitio = _SITIOS_TPOINT.setdefault(clave, f"{os.path.basename(marco.f_code.co_filename)}:{marco.f_lineno}")
+    return sitio
+
+def _grupo_llamador() -> str | None:
+    """
+    Grupo de precarga de los puntos que crea una función de este módulo (from_dict, estado_saturacion...):
+    el sitio del código que la llama, no la línea de dentro de la función que comparten todos
+    """
+    return _sitio_tpoint(sys._getframe(2)) if PREFETCH_TPOINT else None
+
+def _prefetch_grupo(grupo: str, nombre: str | None = None) -> set[str] | tuple[str, ...]:
+    """
+    Propiedades que se precargan en el grupo, apuntando antes nombre como pedida (si no está fijado)
+    """
+    fijas = _PREFETCH_FIJO.get(grupo)
+    if fijas is not None:
+        return fijas
+    vistas = _PERFILES_TPOINT.setdefault(grupo, set())
+    if nombre is not None:
+        vistas.add(nombre)
+    return vistas
+
+def configurar_prefetch_tpoint(activo: bool) -> None:
+    """
+    Activar o desactivar la precarga de propiedades de TPoint (desactivada, una llamada por propiedad)
+    """
+    global PREFETCH_TPOINT
+    PREFETCH_TPOINT = activo
+
+def politica_prefetch_tpoint() -> dict[str, tuple[str, ...]]:
+    """
+    Propiedades que se precargan en cada grupo: las aprendidas y, por encima, las fijadas
+    """
+    politica = {grupo: tuple(sorted(props)) for grupo, props in _PERFILES_TPOINT.items()}
+    return politica | _PREFETCH_FIJO
+
+def fijar_prefetch_tpoint(grupo: str, props: str | list[str] | None) -> None:
+    """
+    Fijar las propiedades que se precargan en un grupo ("H;D" o ["H", "D"]; una lista vacía no
+    precarga nada). Con None se quita lo fijado y el grupo vuelve a aprender.
+    """
+    if props is None:
+        _PREFETCH_FIJO.pop(grupo, None)
+        return
+    if isinstance(props, str):
+        props = props.split(";") if props else []
+    desconocidas = [prop for prop in props if prop not in TPoint._props]
+    if desconocidas:
+        raise ValueError(f"Propiedades no válidas: {desconocidas}. Posibles: {TPoint._props}")
+    _PREFETCH_FIJO[grupo] = tuple(props)
+
+def reiniciar_prefetch_tpoint() -> None:
+    """
+    Olvidar lo aprendido (lo fijado con fijar_prefetch_tpoint se mantiene)
+    """
+    _PERFILES_TPOINT.clear()
+
 class TPoint(Serializable):
     """
     Clase que guarda un punto termodinámico y calcula sus propiedades a demanda (20% más lento que el DLL)
+
+    Usa __slots__: cada propiedad ocupa un hueco fijo en vez de una entrada de un __dict__ por punto,
+    y de la entrada solo se guardan los nombres (tupla compartida entre puntos); sus valores son las
+    propias propiedades.
     """
     # Crear variables para que en el IDE aparezca bonito
     T: float
@@ -235,40 +1329,120 @@ class TPoint(Serializable):
     # Lista interna de todas las posibles peticiones
     _props = ["T", "P", "D", "V", "E", "H", "S", "Q"]
 
-    def __init__(self, fluido: str | list[str], mezcla: list[float] | None = None, **kwargs) -> None:
+    __slots__ = ("fluido", "mezcla", "entradas", "grupo", *_props)
+
+    def __init__(self, fluido: str | list[str], mezcla: list[float] | None = None,
+                 grupo: str | None = None, **kwargs) -> None:
         # Guardar el input
         self.fluido = fluido
         self.mezcla = mezcla
-        self.kwargs = kwargs
+        self.entradas = _entradas_tpoint(kwargs)
         for clave, valor in kwargs.items():
             setattr(self, clave, valor)
+        # Grupo de precarga: por defecto el sitio del código que crea el punto
+        if grupo is None and PREFETCH_TPOINT:
+            grupo = _sitio_tpoint(sys._getframe(1))
+        self.grupo = grupo
+        # Dentro de un LoteTPoint el punto se resuelve junto con los demás del lote
+        lote = getattr(_LOCAL, "lote", None)
+        if lote is not None:
+            lote.agregar(self)
+
+    @property
+    def kwargs(self) -> dict[str, float]:
+        """
+        Entradas del punto como en el constructor: {"P": 10, "H": 450}
+        """
+        return {clave: getattr(self, clave) for clave in self.entradas}
 
-    
     def _compute(self, nombre):
-        return rprop(self.fluido, nombre, self.mezcla, **self.kwargs)
+        [a, b] = self.kwargs.values()
+        return compilar_consulta(self.fluido, nombre, self.entradas)(a, b, self.mezcla)
     
     def __getattr__(self, nombre):
         """
         Si no se pide un atributo y no se ha calculado previamente se intercepta para calcularlo
         """
         if nombre in self._props:
-            valor = self._compute(nombre)
-            setattr(self, nombre, valor)
-            return valor
+            lote = getattr(_LOCAL, "lote", None)
+            if lote is not None and lote.pendiente(self):
+                lote.resolver(self, nombre)
+                if self._calculado(nombre):
+                    return object.__getattribute__(self, nombre)
+            grupo = self.grupo
+            if not PREFETCH_TPOINT or grupo is None:
+                valor = self._compute(nombre)
+                setattr(self, nombre, valor)
+                return valor
+            return self._precargar(nombre, grupo)
         raise AttributeError(f"Atributo {nombre} no existe. Posibles atrubutos: {self._props}")
     
+    def _precargar(self, nombre: str, grupo: str) -> float:
+        """
+        Calcular nombre junto con las propiedades de su grupo que todavía no tiene el punto
+        """
+        vistas = _prefetch_grupo(grupo, nombre)
+        props = [nombre] + [prop for prop in self._props
+                            if prop != nombre and prop in vistas and not self._calculado(prop)]
+        if len(props) > 1:
+            try:
+                self.calcular(*props)
+                return object.__getattribute__(self, nombre)
+            except ErrorRefprop:
+                # Una propiedad precargada puede no tener solución donde sí la tiene la pedida
+                pass
+        valor = self._compute(nombre)
+        setattr(self, nombre, valor)
+        return valor
+
     def calcular(self, *args) -> None:
         """
         Calcular varios valores a la vez y guardarlos en el objeto para
         que si se quieren varios valores no se pidan al dll de 1 en 1.
         """
-        salida_lista = []
-        for arg in args:
-            salida_lista.append(arg)
-        resultado = rprop(self.fluido, salida_lista, self.mezcla, **self.kwargs)
+        [a, b] = self.kwargs.values()
+        resultado = compilar_consulta(self.fluido, list(args), self.entradas)(a, b, self.mezcla)
+        if len(args) == 1:
+            resultado = [resultado]
 
         for nombre, valor in zip(args, resultado):
             setattr(self, nombre, valor)
+
+    def pedir(self, *args) -> None:
+        """
+        Igual que calcular, pero dentro de un LoteTPoint solo apunta las propiedades: se calculan al
+        resolver el lote, junto con las de los demás puntos.
+        """
+        lote = getattr(_LOCAL, "lote", None)
+        if lote is not None and lote.pendiente(self):
+            lote.agregar(self, args)
+        else:
+            self.calcular(*args)
+
+    def calculados(self) -> dict[str, float]:
+        """
+        Propiedades que ya tienen valor (las de entrada y las calculadas), sin calcular ninguna
+        """
+        return {nombre: object.__getattribute__(self, nombre) for nombre in self._props
+                if self._calculado(nombre)}
+
+    def _calculado(self, nombre: str) -> bool:
+        try:
+            object.__getattribute__(self, nombre)
+        except AttributeError:
+            return False
+        return True
+
+    # pickle y copy leerían todos los huecos con getattr y calcularían las propiedades que faltan
+    def __getstate__(self):
+        return (self.fluido, self.mezcla, self.entradas, self.calculados())
+
+    def __setstate__(self, estado) -> None:
+        self.fluido, self.mezcla, entradas, valores = estado
+        self.entradas = _entradas_tpoint(entradas)
+        self.grupo = None
+        for nombre, valor in valores.items():
+            setattr(self, nombre, valor)
     
     def mostrar_atributos(self) -> None:
         """
@@ -276,21 +1450,350 @@ class TPoint(Serializable):
         si un atributo se ha calculado y agrupar el cálculo.
         """
         print(8*"#" + " Atributos " + 8*"#")
-        for nombre, valor in self.__dict__.items():     
+        for nombre, valor in [("fluido", self.fluido), ("mezcla", self.mezcla), ("kwargs", self.kwargs),
+                              *self.calculados().items()]:
             print(f"{nombre}: {valor}")        
         print(27*"#"+"\n")
     
     def to_dict(self) -> dict[str, Any]:
+        # Las propiedades ya calculadas se guardan para no volver a pedirlas al DLL al cargar el punto
         return {
             "__class__": self.__class__.__name__,
             "fluido": self.fluido,
             "mezcla": self.mezcla,
-            "kwargs": self.kwargs
+            "kwargs": self.kwargs,
+            "valores": {nombre: valor for nombre, valor in self.calculados().items()
+                        if nombre not in self.entradas},
         }
     
     @classmethod
     def from_dict(cls, dic: dict[str, Any]) -> "TPoint":
-        return cls(dic["fluido"], dic.get("mezcla"), **dic.get("kwargs"))
+        # "valores" no existe en los json guardados antes: esas propiedades se calculan al pedirlas
+        punto = cls(dic["fluido"], dic.get("mezcla"), _grupo_llamador(), **dic.get("kwargs"))
+        for nombre, valor in dic.get("valores", {}).items():
+            setattr(punto, nombre, valor)
+        return punto
+
+class LoteTPoint:
+    """
+    Contexto que resuelve de golpe los TPoint que se crean dentro de él:
+
+    with LoteTPoint():
+        liq = TPoint(fluido, mezcla, P = PK, Q = 0)
+        vap = TPoint(fluido, mezcla, P = PK, Q = 1)
+        liq.pedir("T", "H")
+        vap.pedir("T", "H")
+    glide = vap.T - liq.T
+
+    Cada punto apunta las propiedades pedidas con pedir y las que se precargan en su grupo. Al salir
+    del with, o al leer antes una propiedad que falta de un punto pendiente, se agrupan los puntos por
+    mezcla (fluido y composición) y par de entradas, y cada grupo se resuelve con RPQuery.calcular_lote:
+    lo que ya está en las tablas P-H o en las cachés sale de ahí y el resto se calcula en una sola
+    pasada. Los grupos de una misma mezcla van seguidos, así cada mezcla se carga (SETUP) una sola vez.
+    Con servidor todos los grupos van en una sola petición (calcular_lotes).
+    Los estados que REFPROP no resuelve se vuelven a calcular uno a uno al resolver el lote, así dan
+    el mismo error (o NaN, según MODO_ERRORES) que fuera de él.
+    """
+    def __init__(self) -> None:
+        self.pendientes: dict[int, tuple[TPoint, set[str]]] = {}
+        self.anterior: LoteTPoint | None = None
+        self.pasadas = 0
+
+    def __enter__(self) -> "LoteTPoint":
+        self.anterior = getattr(_LOCAL, "lote", None)
+        _LOCAL.lote = self
+        return self
+
+    def __exit__(self, tipo, *excepcion) -> None:
+        _LOCAL.lote = self.anterior
+        if tipo is None:
+            self.resolver()
+
+    def agregar(self, punto: TPoint, props=()) -> None:
+        if id(punto) in self.pendientes:
+            self.pendientes[id(punto)][1].update(props)
+        else:
+            self.pendientes[id(punto)] = (punto, set(props))
+
+    def pendiente(self, punto: TPoint) -> bool:
+        return id(punto) in self.pendientes
+
+    def resolver(self, punto: TPoint | None = None, nombre: str | None = None) -> None:
+        """
+        Calcular todos los puntos pendientes (más la propiedad nombre de punto, si se está leyendo)
+        """
+        if punto is not None:
+            self.agregar(punto, (nombre,))
+            if PREFETCH_TPOINT and punto.grupo is not None:
+                _prefetch_grupo(punto.grupo, nombre)
+
+        # Mezcla -> par de entradas -> [(punto, propiedades que le faltan)]
+        mezclas: dict[tuple, dict[tuple[str, ...], list[tuple[TPoint, list[str]]]]] = {}
+        for pendiente, pedidas in self.pendientes.values():
+            if PREFETCH_TPOINT and pendiente.grupo is not None:
+                pedidas = pedidas | set(_prefetch_grupo(pendiente.grupo))
+            props = [prop for prop in TPoint._props if prop in pedidas and not pendiente._calculado(prop)]
+            if props:
+                clave = (repr(pendiente.fluido), repr(pendiente.mezcla))
+                mezclas.setdefault(clave, {}).setdefault(pendiente.entradas, []).append((pendiente, props))
+        self.pendientes.clear()
+
+        grupos = [miembros for entradas in mezclas.values() for miembros in entradas.values()]
+        lotes = [self._lote_grupo(miembros) for miembros in grupos]
+        for miembros, (consulta, *_), resultado in zip(grupos, lotes, calcular_lotes(lotes)):
+            self._repartir(miembros, consulta.salida_lista, *resultado)
+
+    @staticmethod
+    def _lote_grupo(miembros: list[tuple[TPoint, list[str]]]) -> tuple[RPQuery, list[float], list[float], Any]:
+        primero = miembros[0][0]
+        entradas = primero.entradas
+        salida = [prop for prop in TPoint._props if any(prop in props for _, props in miembros)]
+        a = [object.__getattribute__(miembro, entradas[0]) for miembro, _ in miembros]
+        b = [object.__getattribute__(miembro, entradas[1]) for miembro, _ in miembros]
+        return compilar_consulta(primero.fluido, salida, entradas), a, b, primero.mezcla
+
+    def _repartir(self, miembros: list[tuple[TPoint, list[str]]], salida: list[str],
+                  resultados: "np.ndarray", errores: "np.ndarray") -> None:
+        self.pasadas += 1
+        for (miembro, props), fila, ierr in zip(miembros, resultados.tolist(), errores.tolist()):
+            if ierr > 0:
+                # Repetirlo solo da el mismo error (o NaN) que fuera del lote, ya al resolverlo
+                miembro.calcular(*props)
+                continue
+            for prop, valor in zip(salida, fila):
+                if not miembro._calculado(prop):
+                    setattr(miembro, prop, valor)
+
+class EstadoSaturacion:
+    """
+    Líquido saturado (punto de burbuja) y vapor saturado (punto de rocío) a una misma presión, como
+    TPoint con T, P, H, S y D ya calculados
+    """
+    __slots__ = ("liquido", "vapor")
+
+    def __init__(self, liquido: TPoint, vapor: TPoint) -> None:
+        self.liquido = liquido
+        self.vapor = vapor
+
+    @property
+    def P(self) -> float:
+        return self.liquido.P
+
+    @property
+    def T_burbuja(self) -> float:
+        return self.liquido.T
+
+    @property
+    def T_rocio(self) -> float:
+        return self.vapor.T
+
+    @property
+    def glide(self) -> float:
+        """
+        Deslizamiento de temperatura en el cambio de fase (0 en fluidos puros)
+        """
+        return self.vapor.T - self.liquido.T
+
+    def __iter__(self):
+        return iter((self.liquido, self.vapor))
+
+    def __repr__(self) -> str:
+        return (f"EstadoSaturacion(P = {self.P:.4g} bar, T_burbuja = {self.T_burbuja:.4g} ºC, "
+                f"T_rocio = {self.T_rocio:.4g} ºC)")
+
+_SALIDA_SATURACION = ["T", "P", "H", "S", "D"]
+
+def estado_saturacion(fluidos: str | list[str], mezcla: list[float] | None = None, Q: int = 0,
+                      splines: bool | None = None, **kwargs: float) -> EstadoSaturacion:
+    """
+    Puntos de burbuja y rocío de una presión de saturación, con T, P, H, S y D de los dos.
+
+    Con P los dos puntos están a esa presión. Con T la presión es la de burbuja (Q = 0) o la de rocío
+    (Q = 1) a esa temperatura y el otro punto se calcula a la misma presión. En mezclas cada punto es
+    un flash de saturación de REFPROP (dos llamadas en total, una con el estado completo de cada fase).
+    Dentro de un LoteTPoint los puntos que no hacen falta para conocer la presión se quedan pendientes
+    y se calculan con el resto del lote.
+
+    sat = estado_saturacion(["PROPANE", "BUTANE"], [0.5, 0.5], P = 10)
+    sat.T_burbuja, sat.T_rocio, sat.glide, sat.vapor.H
+    """
+    if mezcla is None:
+        mezcla = [1.0]
+    if len(kwargs) != 1 or next(iter(kwargs)) not in ("T", "P"):
+        raise ValueError("estado_saturacion necesita una única entrada: T o P")
+    if Q not in (0, 1):
+        raise ValueError("Q tiene que ser 0 (burbuja) o 1 (rocío)")
+
+    [(clave, valor)] = kwargs.items()
+    # Dentro de un LoteTPoint solo se calcula ya lo necesario para conocer la presión
+    diferir = splines is None and getattr(_LOCAL, "lote", None) is not None
+    calculados: dict[int, list[float]] = {}
+    if clave == "P" and diferir:
+        P = valor
+    else:
+        primero = compilar_consulta(fluidos, _SALIDA_SATURACION, (clave, "Q"), splines)(valor, Q, mezcla)
+        P = primero[1]
+        calculados[Q] = primero
+        if not diferir:
+            calculados[1 - Q] = compilar_consulta(fluidos, _SALIDA_SATURACION, ("P", "Q"), splines)(P, 1 - Q, mezcla)
+
+    puntos = []
+    grupo = _grupo_llamador()
+    for calidad in (0, 1):
+        punto = TPoint(fluidos, mezcla, grupo, P = P, Q = calidad)
+        valores = calculados.get(calidad)
+        if valores is None:
+            punto.pedir(*(nombre for nombre in _SALIDA_SATURACION if nombre != "P"))
+        else:
+            for nombre, dato in zip(_SALIDA_SATURACION, valores):
+                if nombre != "P":
+                    setattr(punto, nombre, dato)
+        puntos.append(punto)
+    return EstadoSaturacion(*puntos)
+
+class TPointArray(Serializable):
+    """
+    N estados de un mismo fluido y composición guardados como columnas de NumPy (una por propiedad).
+    Igual que TPoint las propiedades se calculan a demanda, pero para todos los estados a la vez con
+    RPQuery.calcular_array:
+
+    puntos = TPointArray(["PROPANE", "BUTANE"], [0.5, 0.5], P = presiones, H = entalpias)
+    puntos.T                # Array con la temperatura de los N estados
+    puntos.calcular("D", "S")
+    puntos[3]               # TPoint del estado 3 con lo ya calculado
+    puntos.errores          # ierr de REFPROP de cada estado (0 si no hay error); los estados con error quedan a NaN
+    """
+    T: "np.ndarray"
+    P: "np.ndarray"
+    D: "np.ndarray"
+    V: "np.ndarray"
+    E: "np.ndarray"
+    H: "np.ndarray"
+    S: "np.ndarray"
+    Q: "np.ndarray"
+
+    _props = TPoint._props
+
+    __slots__ = ("fluido", "mezcla", "entradas", "columnas", "errores")
+
+    def __init__(self, fluido: str | list[str], mezcla: list[float] | None = None,
+                 **kwargs: "np.ndarray | list[float] | float") -> None:
+        import numpy as np
+
+        if len(kwargs) != 2:
+            raise ValueError("REFPROP solo admite dos entradas independientes (ej: T y P, T y H…).")
+        for clave in kwargs:
+            if clave not in self._props:
+                raise ValueError(f"Propiedad de entrada no permitida: {clave}")
+        self.fluido = fluido
+        self.mezcla = mezcla
+        self.entradas = _entradas_tpoint(kwargs)
+        a, b = np.broadcast_arrays(*(np.asarray(valor, dtype=float) for valor in kwargs.values()))
+        self.columnas: dict[str, np.ndarray] = {self.entradas[0]: a.ravel().copy(), self.entradas[1]: b.ravel().copy()}
+        self.errores = np.zeros(len(self.columnas[self.entradas[0]]), dtype=np.int32)
+
+    @classmethod
+    def de_puntos(cls, puntos: list[TPoint]) -> "TPointArray":
+        """
+        Juntar TPoint del mismo fluido, composición y entradas. Se copia también lo que ya tengan
+        calculado en todos los puntos.
+        """
+        import numpy as np
+
+        primero = puntos[0]
+        for punto in puntos:
+            if (punto.fluido, punto.mezcla, punto.entradas) != (primero.fluido, primero.mezcla, primero.entradas):
+                raise ValueError("Los puntos tienen que ser del mismo fluido y composición y con las mismas entradas")
+        array = cls(primero.fluido, primero.mezcla,
+                    **{clave: [getattr(punto, clave) for punto in puntos] for clave in primero.entradas})
+        comunes = set.intersection(*(set(punto.calculados()) for punto in puntos)) - set(primero.entradas)
+        for nombre in comunes:
+            array.columnas[nombre] = np.array([getattr(punto, nombre) for punto in puntos], dtype=float)
+        return array
+
+    def __len__(self) -> int:
+        return len(self.errores)
+
+    def __getattr__(self, nombre):
+        """
+        Las propiedades que faltan se calculan para todos los estados de una vez
+        """
+        if nombre in self._props:
+            self.calcular(nombre)
+            return self.columnas[nombre]
+        raise AttributeError(f"Atributo {nombre} no existe. Posibles atrubutos: {self._props}")
+
+    def calcular(self, *args) -> None:
+        """
+        Calcular varias propiedades a la vez (un solo flash por estado) y guardarlas como columnas
+        """
+        import numpy as np
+
+        pendientes = [nombre for nombre in args if nombre not in self.columnas]
+        if not pendientes:
+            return
+        a, b = (self.columnas[clave] for clave in self.entradas)
+        consulta = compilar_consulta(self.fluido, pendientes, self.entradas)
+        resultados, errores = consulta.calcular_array(a, b, self.mezcla if self.mezcla is not None else [1.0])
+        np.maximum(self.errores, errores, out=self.errores)
+        for columna, nombre in enumerate(pendientes):
+            self.columnas[nombre] = resultados[:, columna].copy()
+
+    def __getitem__(self, indice):
+        """
+        Un entero devuelve el TPoint de ese estado; un slice o una máscara, otro TPointArray
+        """
+        import numpy as np
+
+        if isinstance(indice, (int, np.integer)):
+            punto = TPoint(self.fluido, self.mezcla, _grupo_llamador(),
+                           **{clave: float(self.columnas[clave][indice]) for clave in self.entradas})
+            for nombre, columna in self.columnas.items():
+                setattr(punto, nombre, float(columna[indice]))
+            return punto
+
+        parte = TPointArray.__new__(TPointArray)
+        parte.fluido = self.fluido
+        parte.mezcla = self.mezcla
+        parte.entradas = self.entradas
+        parte.columnas = {nombre: columna[indice] for nombre, columna in self.columnas.items()}
+        parte.errores = self.errores[indice]
+        return parte
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def mostrar_atributos(self) -> None:
+        """
+        Muestra las columnas que estan calculadas
+        """
+        print(8*"#" + " Atributos " + 8*"#")
+        for nombre, valor in [("fluido", self.fluido), ("mezcla", self.mezcla), ("estados", len(self)),
+                              *self.columnas.items()]:
+            print(f"{nombre}: {valor}")
+        print(27*"#"+"\n")
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "__class__": self.__class__.__name__,
+            "fluido": self.fluido,
+            "mezcla": self.mezcla,
+            "entradas": list(self.entradas),
+            "columnas": {nombre: columna.tolist() for nombre, columna in self.columnas.items()},
+            "errores": self.errores.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, dic: dict[str, Any]) -> "TPointArray":
+        import numpy as np
+
+        columnas = dic["columnas"]
+        array = cls(dic["fluido"], dic.get("mezcla"), **{clave: columnas[clave] for clave in dic["entradas"]})
+        for nombre, columna in columnas.items():
+            array.columnas[nombre] = np.asarray(columna, dtype=float)
+        array.errores = np.asarray(dic["errores"], dtype=np.int32)
+        return array
 
 class CicloOutput(Serializable):
     def __init__(self, COP: float | None = None,
@@ -349,6 +1852,7 @@ def serializar(obj):
 
 REGISTRO_CLASES = {
     "TPoint": TPoint,
+    "TPointArray": TPointArray,
     "CicloOutput": CicloOutput
 }
 
@@ -366,14 +1870,110 @@ def deserializar(obj):
 
     return obj
 
-def init_refprop(ruta_dll: str = r"C:\Program Files (x86)\REFPROP\REFPRP64.DLL") -> None:
-    global RP
-    RP = REFPROPFunctionLibrary(ruta_dll)
+def init_refprop(ruta_dll: str = r"C:\Program Files (x86)\REFPROP\REFPRP64.DLL",
+                 ruta_cache_disco: str | None = None,
+                 cache_compartida: tuple[str, int] | None = None,
+                 rutas_tablas: list[str] | None = None,
+                 backend: str | None = None,
+                 servidor: str | None = None,
+                 modelos_secundarios: list[ModeloSecundario] | None = None) -> None:
+    """
+    Cargar REFPROP en este proceso, o conectarse al servidor de propiedades si se da su socket
+    (servidor o la variable de entorno REFPROP_SERVIDOR). Con servidor la caché en disco y las tablas
+    son las del servidor y aquí se ignoran. modelos_secundarios son los modelos del agua / glicol ya
+    calculados en el proceso principal (crear_pool los pasa a los workers).
+    """
+    from refprop_backends import crear_backend
+
+    global RP, RUTA_DLL, BACKEND
+    # Los modelos dependen del backend: los de otra inicialización no valen
+    MODELOS_SECUNDARIOS.clear()
+    for modelo in modelos_secundarios or []:
+        MODELOS_SECUNDARIOS[modelo.water_config] = modelo
+    # Igual que los puntos críticos memorizados con otro backend o DLL
+    _CACHE_CRITICO.clear()
+
+    if servidor is None:
+        servidor = os.environ.get("REFPROP_SERVIDOR")
+    if servidor:
+        RP = None
+        conectar_servidor_refprop(servidor)
+        CACHE_RESULTADOS.limpiar()
+        if cache_compartida is not None:
+            nombre, n_registros = cache_compartida
+            activar_cache_compartida(n_registros, nombre)
+        return
+
+    if backend is None:
+        backend = os.environ.get("REFPROP_BACKEND", "refprop")
+    RP = crear_backend(backend, ruta_dll)
+    RUTA_DLL = ruta_dll
+    BACKEND = backend
+    CACHE_MEZCLAS.reiniciar()
+    CACHE_RESULTADOS.limpiar()
+    if ruta_cache_disco is not None:
+        activar_cache_disco(ruta_cache_disco)
+    if cache_compartida is not None:
+        nombre, n_registros = cache_compartida
+        activar_cache_compartida(n_registros, nombre)
+    if rutas_tablas:
+        from refprop_tablas import TablaPH
+        for ruta in rutas_tablas:
+            _registrar_tabla(TablaPH.cargar(ruta))
+
+def init_refprop_hilo(ruta_dll: str, backend: str) -> None:
+    """
+    Inicializador de los hilos de un pool de hilos: cada hilo carga su propia instancia de REFPROP
+    (una copia privada del DLL) con su caché de mezclas. Las cachés de resultados, en disco y las
+    tablas P-H son las del proceso y las comparten todos los hilos.
+    """
+    from refprop_backends import crear_backend
+
+    if CLIENTE_SERVIDOR is not None:
+        # Con servidor los hilos comparten el cliente y sus conexiones
+        return
+    _LOCAL.rp = crear_backend(backend, ruta_dll, privado=True)
+    _LOCAL.mezclas = CacheMezclas()
+
+def crear_pool(max_workers: int | None = None, compartir_cache: bool = True, hilos: bool | None = None):
+    """
+    Crear un ProcessPoolExecutor cuyos workers inicializan REFPROP con la misma configuración
+    que el proceso principal (backend y DLL, caché en disco, caché en memoria compartida, tablas P-H,
+    servidor de propiedades y modelos del agua / glicol ya calculados).
+    Si compartir_cache es True y todavía no hay caché compartida se crea una con el tamaño por defecto,
+    que se mantiene entre pools sucesivos.
+
+    Con hilos=True (o REFPROP_POOL=hilos) se crea un ThreadPoolExecutor en el que cada hilo tiene
+    su propia instancia de REFPROP: los argumentos y resultados no se serializan y las cachés del
+    proceso se comparten directamente, sin memoria compartida.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from functools import partial
+
+    if hilos is None:
+        hilos = MODO_POOL == "hilos"
+    if hilos:
+        return ThreadPoolExecutor(max_workers=max_workers or os.cpu_count(),
+                                  initializer=init_refprop_hilo, initargs=(RUTA_DLL, BACKEND))
+
+    if compartir_cache and CACHE_COMPARTIDA is None:
+        activar_cache_compartida()
+
+    inicializador = partial(init_refprop, RUTA_DLL,
+                            CACHE_DISCO.ruta if CACHE_DISCO is not None else None,
+                            (CACHE_COMPARTIDA.nombre, CACHE_COMPARTIDA.n_registros)
+                            if compartir_cache and CACHE_COMPARTIDA is not None else None,
+                            [tabla.ruta for tabla in TABLAS_PH.values()],
+                            BACKEND,
+                            CLIENTE_SERVIDOR.ruta if CLIENTE_SERVIDOR is not None else None,
+                            list(MODELOS_SECUNDARIOS.values()))
+    return ProcessPoolExecutor(max_workers=max_workers, initializer=inicializador)
 
 def diagrama_PH(fluido: str | list[str], mezcla: list[float], P_min: float, P_max: float, H_min: float,
                 H_max: float, num_puntos_sat: int, num_puntos_temp: int, base_log: float,
                 play: bool | None = None, puntos: list[TPoint] | None = None) -> None:
-    
+    import subprocess, json
+
     # Nombre del script donde se genera la imagen
     script_imagen = "refprop_graph.py"
 
@@ -0,0 +1,71 @@
+import os, sys, math
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ciclo_basico_binario as ciclo
+from refprop_utils import CicloOutput
+
+def _marcha(calcular, approach_ini = ciclo.APPROACH_INI, approach_max = ciclo.APPROACH_MAX, step = 0.5):
+    # Búsqueda de antes: subir el approach de 0.5 en 0.5 K hasta que el pinch llega a 1 K
+    approach = approach_ini
+    while approach < approach_max:
+        resultado = calcular("F", [1.0], "intermedia", approach)
+        if resultado.error is not None or resultado.pinch >= 1:
+            return resultado
+        approach += step
+    return CicloOutput(fluido="F", mezcla=[1.0], water_config="intermedia", error="PinchBajo")
+
+def _ciclo_falso(pinch, error_desde: float | None = None):
+    llamadas = []
+    def calcular(fluido, mezcla, water_config, approach):
+        llamadas.append(approach)
+        if error_desde is not None and approach >= error_desde:
+            return CicloOutput(fluido=fluido, mezcla=mezcla, water_config=water_config, error="Bifásico")
+        return CicloOutput(fluido=fluido, mezcla=mezcla, water_config=water_config,
+                           pinch=pinch(approach), approach_k=approach)
+    return calcular, llamadas
+
+@pytest.mark.parametrize("pinch", [
+    lambda a: a - 9.3,
+    lambda a: 4 * (1 - math.exp(-(a - 6) / 3)) - 1.5,
+    lambda a: 0.02 * (a - 6) ** 2 - 0.2,
+])
+def test_mismo_approach_que_la_marcha(monkeypatch, pinch):
+    calcular, _ = _ciclo_falso(pinch)
+    marcha = _marcha(calcular)
+
+    monkeypatch.setattr(ciclo, "calcular_ciclo", calcular)
+    resultado = ciclo.calcular_ciclo_basico("F", [1.0], "intermedia")
+    assert resultado.error is None and resultado.pinch >= ciclo.PINCH_MIN
+    # La marcha se pasa del approach mínimo hasta 0.5 K; la búsqueda, como mucho la tolerancia
+    assert marcha.approach_k - 0.5 < resultado.approach_k <= marcha.approach_k + ciclo.TOLERANCIA_APPROACH
+
+def test_menos_ciclos_que_la_marcha(monkeypatch):
+    # Approach mínimo lejos del inicial: la marcha necesita 25 ciclos
+    calcular, llamadas = _ciclo_falso(lambda a: a - 17.3)
+    _marcha(calcular)
+    n_marcha = len(llamadas)
+    llamadas.clear()
+    monkeypatch.setattr(ciclo, "calcular_ciclo", calcular)
+    ciclo.calcular_ciclo_basico("F", [1.0], "intermedia")
+    assert len(llamadas) < n_marcha
+
+def test_error_antes_del_pinch(monkeypatch):
+    calcular, _ = _ciclo_falso(lambda a: a - 12, error_desde = 9)
+    monkeypatch.setattr(ciclo, "calcular_ciclo", calcular)
+    assert ciclo.calcular_ciclo_basico("F", [1.0], "intermedia").error == _marcha(calcular).error == "Bifásico"
+
+def test_error_en_el_approach_inicial(monkeypatch):
+    calcular, llamadas = _ciclo_falso(lambda a: a - 12, error_desde = 0)
+    monkeypatch.setattr(ciclo, "calcular_ciclo", calcular)
+    assert ciclo.calcular_ciclo_basico("F", [1.0], "intermedia").error == "Bifásico"
+    assert llamadas == [ciclo.APPROACH_INI]
+
+def test_pinch_bajo(monkeypatch):
+    calcular, llamadas = _ciclo_falso(lambda a: 0.5)
+    monkeypatch.setattr(ciclo, "calcular_ciclo", calcular)
+    assert ciclo.calcular_ciclo_basico("F", [1.0], "intermedia").error == "PinchBajo"
+    assert llamadas == [ciclo.APPROACH_INI, ciclo.APPROACH_MAX]
+    assert _marcha(calcular).error == "PinchBajo"
@@ -0,0 +1,60 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import refprop_utils
+from refprop_utils import CacheResultados
+
+BASE = ("PROPANE", "H", "TP")
+
+def _clave(cache: CacheResultados, a: float, b: float = 5.0, mezcla = (1.0,)) -> tuple:
+    return cache.clave(BASE, a, b, list(mezcla))
+
+def test_expulsa_el_menos_usado():
+    cache = CacheResultados(tamano = 3)
+    for a in (1, 2, 3):
+        cache.guardar(_clave(cache, a), [a])
+    # Leer el 1 lo pasa al final: el siguiente en salir es el 2
+    assert cache.obtener(_clave(cache, 1)) == [1]
+    cache.guardar(_clave(cache, 4), [4])
+    assert cache.obtener(_clave(cache, 2)) is None
+    assert [cache.obtener(_clave(cache, a)) for a in (1, 3, 4)] == [[1], [3], [4]]
+    estadisticas = cache.estadisticas()
+    assert (estadisticas["entradas"], estadisticas["expulsados"]) == (3, 1)
+    assert (estadisticas["aciertos"], estadisticas["fallos"]) == (4, 1)
+
+def test_reducir_el_tamano():
+    cache = CacheResultados(tamano = 10)
+    for a in range(10):
+        cache.guardar(_clave(cache, a), [a])
+    cache.configurar(tamano = 4)
+    assert len(cache.datos) == 4 and cache.expulsados == 6
+    # Se quedan los más recientes
+    assert [cache.obtener(_clave(cache, a)) for a in (5, 6)] == [None, [6]]
+
+def test_tolerancia_y_composicion():
+    cache = CacheResultados(tolerancia = 1e-3, decimales_mezcla = 4)
+    cache.guardar(_clave(cache, 10.0, mezcla = (0.5, 0.5)), [1.0])
+    # Dentro de la tolerancia y del redondeo de la composición es la misma entrada
+    assert cache.obtener(_clave(cache, 10.0002, mezcla = (0.50001, 0.49999))) == [1.0]
+    assert cache.obtener(_clave(cache, 10.002, mezcla = (0.5, 0.5))) is None
+    # Cambiar la tolerancia cambia las claves: la caché se vacía
+    cache.configurar(tolerancia = 0)
+    assert not cache.datos
+    cache.guardar(_clave(cache, 10.0), [1.0])
+    assert cache.obtener(_clave(cache, 10.0 + 1e-12)) is None
+
+def test_rprop_sin_llamadas_repetidas():
+    refprop_utils.init_refprop(backend = "sintetico")
+    rp = refprop_utils.RP
+    primero = refprop_utils.rprop("PROPANE;BUTANE", "H", [0.5, 0.5], T = 10, P = 5)
+    llamadas = rp.llamadas
+    assert refprop_utils.rprop("PROPANE;BUTANE", "H", [0.5, 0.5], T = 10, P = 5) == primero
+    assert rp.llamadas == llamadas
+    # Desactivada (modo exacto) cada consulta llega al DLL
+    refprop_utils.configurar_cache_rprop(activa = False)
+    try:
+        assert refprop_utils.rprop("PROPANE;BUTANE", "H", [0.5, 0.5], T = 10, P = 5) == primero
+        assert rp.llamadas == llamadas + 1
+    finally:
+        refprop_utils.configurar_cache_rprop(activa = True)
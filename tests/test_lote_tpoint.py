@@ -0,0 +1,63 @@
+import os, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import refprop_utils
+from refprop_utils import LoteTPoint, TPoint, estado_saturacion
+
+FLUIDOS = "PROPANE;BUTANE"
+MEZCLAS = [[0.5, 0.5], [0.3, 0.7]]
+
+def _init():
+    refprop_utils.init_refprop(backend="sintetico")
+    return refprop_utils.RP, refprop_utils._mezclas()
+
+def test_lote_una_carga_por_mezcla():
+    rp, mezclas = _init()
+    with LoteTPoint():
+        puntos = []
+        # Mezclas alternadas: fuera del lote serían cuatro SETUP
+        for fluidos, T in zip([FLUIDOS, "DME;PROPYLENE"] * 2, (-10, 0, 10, 20)):
+            punto = TPoint(fluidos, MEZCLAS[0], T = T, P = 30)
+            punto.pedir("H", "D")
+            puntos.append(punto)
+    assert mezclas.estadisticas()["fallos"] == 2
+    # Cada grupo (mezcla, entradas) es una sola llamada a calcular_array
+    llamadas = rp.llamadas
+    assert all(p.D > 0 for p in puntos)
+    assert rp.llamadas == llamadas
+
+def test_lote_igual_que_puntos_sueltos():
+    _init()
+    with LoteTPoint():
+        sat = estado_saturacion(FLUIDOS, MEZCLAS[0], P = 5)
+        punto = TPoint(FLUIDOS, MEZCLAS[0], T = 40, P = 5)
+        punto.pedir("H", "S")
+    refprop_utils.CACHE_RESULTADOS.limpiar()
+    suelto = TPoint(FLUIDOS, MEZCLAS[0], T = 40, P = 5)
+    assert (punto.H, punto.S) == (suelto.H, suelto.S)
+    assert sat.T_rocio == estado_saturacion(FLUIDOS, MEZCLAS[0], P = 5).T_rocio
+
+def test_lote_usa_las_caches():
+    rp, _ = _init()
+    with LoteTPoint():
+        punto = TPoint(FLUIDOS, MEZCLAS[0], T = 40, P = 5)
+        punto.pedir("H")
+    llamadas = rp.llamadas
+    # Mismo estado por la consulta suelta y por otro lote: sale de la LRU sin llamar al DLL
+    assert refprop_utils.compilar_consulta(FLUIDOS, "H", ("T", "P"))(40, 5, MEZCLAS[0]) == punto.H
+    with LoteTPoint():
+        repetido = TPoint(FLUIDOS, MEZCLAS[0], T = 40, P = 5)
+        repetido.pedir("H")
+    assert repetido.H == punto.H
+    assert rp.llamadas == llamadas
+
+def test_ciclo_repetido_sin_llamadas():
+    from ciclo_basico_binario import calcular_ciclo
+
+    rp, _ = _init()
+    primero = calcular_ciclo(FLUIDOS, MEZCLAS[0], "intermedia", 5)
+    llamadas = rp.llamadas
+    segundo = calcular_ciclo(FLUIDOS, MEZCLAS[0], "intermedia", 5)
+    assert rp.llamadas == llamadas
+    assert (segundo.COP, segundo.error) == (primero.COP, primero.error)
@@ -0,0 +1,78 @@
+import os, sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import refprop_utils
+from refprop_backends import BackendGrabacion, BackendReproduccion, BackendSintetico, ErrorReproduccion
+
+MEZCLAS = ["PROPANE;BUTANE", "DME;PROPYLENE"]
+COMPOSICION = [0.5, 0.5]
+T = np.linspace(-20, 20, 9)
+
+def _barridos() -> dict[str, np.ndarray]:
+    resultados = {}
+    for fluidos in MEZCLAS:
+        consulta = refprop_utils.RPQuery(fluidos, "H;D", COMPOSICION, "TP")
+        resultados[fluidos], errores = consulta.calcular_barrido(T, 40, fase="liquido")
+        assert not errores.any()
+    return resultados
+
+@pytest.fixture
+def sin_cache():
+    refprop_utils.configurar_cache_rprop(activa=False)
+    yield
+    refprop_utils.configurar_cache_rprop(activa=True)
+
+def test_reproduccion_cambiando_de_mezcla(tmp_path, sin_cache):
+    ruta = str(tmp_path / "traza")
+    refprop_utils.init_refprop(backend=f"grabar:{ruta}|sintetico")
+    grabados = _barridos()
+    refprop_utils.RP.volcar()
+    assert not np.array_equal(grabados[MEZCLAS[0]], grabados[MEZCLAS[1]])
+
+    refprop_utils.init_refprop(backend=f"reproducir:{ruta}")
+    reproducidos = _barridos()
+    for fluidos in MEZCLAS:
+        assert np.array_equal(grabados[fluidos], reproducidos[fluidos])
+
+def test_reproduccion_con_otra_mezcla_cargada(tmp_path):
+    ruta = str(tmp_path / "traza")
+    grabacion = BackendGrabacion(BackendSintetico(), ruta)
+    for fluidos, T_K in zip(MEZCLAS, (250.0, 260.0)):
+        grabacion.SETUPdll(2, fluidos, "", "DEF")
+        grabacion.TPRHOdll(T_K, 4000.0, COMPOSICION, 1, 0, 0.0)
+    grabacion.volcar()
+
+    reproduccion = BackendReproduccion(ruta)
+    reproduccion.SETUPdll(2, MEZCLAS[0], "", "DEF")
+    reproduccion.TPRHOdll(250.0, 4000.0, COMPOSICION, 1, 0, 0.0)
+    # La llamada de la segunda mezcla no vale con la primera cargada
+    with pytest.raises(ErrorReproduccion, match="DME;PROPYLENE"):
+        reproduccion.TPRHOdll(260.0, 4000.0, COMPOSICION, 1, 0, 0.0)
+
+class _SinteticoDesplazado(BackendSintetico):
+    # Otra "versión" del backend: las mismas llamadas dan otra densidad
+    def TPRHOdll(self, T, P, z, kph, kguess, D):
+        res = super().TPRHOdll(T, P, z, kph, kguess, D)
+        return res._replace(D=res.D + 1.0)
+
+def test_grabacion_nueva_borra_las_anteriores(tmp_path):
+    ruta = str(tmp_path / "traza")
+    anterior = BackendGrabacion(_SinteticoDesplazado(), ruta)
+    anterior.SETUPdll(2, MEZCLAS[0], "", "DEF")
+    anterior.TPRHOdll(250.0, 4000.0, COMPOSICION, 1, 0, 0.0)
+    anterior.volcar()
+    # Traza de otro proceso de la grabación anterior
+    os.rename(anterior.ruta_fichero, f"{ruta}.1.rptrace")
+
+    grabacion = BackendGrabacion(BackendSintetico(), ruta)
+    grabacion.SETUPdll(2, MEZCLAS[0], "", "DEF")
+    grabado = grabacion.TPRHOdll(250.0, 4000.0, COMPOSICION, 1, 0, 0.0)
+    grabacion.volcar()
+    assert not os.path.exists(f"{ruta}.1.rptrace")
+
+    reproduccion = BackendReproduccion(ruta)
+    reproduccion.SETUPdll(2, MEZCLAS[0], "", "DEF")
+    assert reproduccion.TPRHOdll(250.0, 4000.0, COMPOSICION, 1, 0, 0.0).D == grabado.D
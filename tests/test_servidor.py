@@ -0,0 +1,51 @@
+import os, sys, time, subprocess
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import refprop_utils
+from refprop_utils import LoteTPoint, TPoint, estado_saturacion, rprop
+
+FLUIDOS = "PROPANE;BUTANE"
+MEZCLA = [0.5, 0.5]
+
+@pytest.fixture
+def cliente(tmp_path):
+    ruta = str(tmp_path / "refprop.sock")
+    entorno = dict(os.environ, REFPROP_BACKEND="sintetico")
+    entorno.pop("REFPROP_SERVIDOR", None)
+    proceso = subprocess.Popen([sys.executable, os.path.join(RAIZ, "refprop_servidor.py"), ruta],
+                               cwd=tmp_path, env=entorno, stdout=subprocess.DEVNULL)
+    try:
+        limite = time.monotonic() + 30
+        while not os.path.exists(ruta):
+            assert proceso.poll() is None and time.monotonic() < limite, "El servidor no ha arrancado"
+            time.sleep(0.05)
+        refprop_utils.init_refprop(servidor=ruta)
+        yield refprop_utils.CLIENTE_SERVIDOR
+    finally:
+        refprop_utils.desconectar_servidor_refprop()
+        proceso.terminate()
+        proceso.wait()
+
+def test_lote_en_una_peticion(cliente):
+    antes = cliente.estadisticas()["peticiones"]
+    with LoteTPoint():
+        sat = estado_saturacion(FLUIDOS, MEZCLA, P = 5)
+        punto = TPoint(FLUIDOS, MEZCLA, T = 40, P = 5)
+        punto.pedir("H", "S")
+    # Dos grupos (P-Q y T-P) en una sola ida y vuelta
+    assert cliente.estadisticas()["peticiones"] == antes + 1
+
+    refprop_utils.CACHE_RESULTADOS.limpiar()
+    assert [punto.H, punto.S] == rprop(FLUIDOS, "H;S", MEZCLA, T = 40, P = 5)
+    assert sat.T_rocio == rprop(FLUIDOS, "T", MEZCLA, P = 5, Q = 1)
+
+def test_consultar_varias_igual_que_sueltas(cliente):
+    consultas = [(FLUIDOS, "H;D", "TP", [10.0, 20.0], [5.0, 5.0], MEZCLA, None),
+                 ("PROPANE", "T", "PQ", [5.0], [0.0], [1.0], None)]
+    for (out, errores, _), consulta in zip(cliente.consultar_varias(consultas), consultas):
+        suelta, errores_suelta, _ = cliente.consultar(*consulta)
+        assert (out == suelta).all() and (errores == errores_suelta).all()
@@ -0,0 +1,61 @@
+import os, sys, json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import refprop_utils
+import ciclo_basico_binario as ciclo
+
+@pytest.fixture
+def referencia(tmp_path, monkeypatch):
+    refprop_utils.init_refprop(backend="sintetico")
+    monkeypatch.setattr(ciclo, "RUTA_VALORES_REFERENCIA", str(tmp_path / "valores_referencia.json"))
+    ciclo.VALORES_REFERENCIA.clear()
+    yield ciclo.RUTA_VALORES_REFERENCIA
+    ciclo.VALORES_REFERENCIA.clear()
+    refprop_utils.activar_splines_saturacion(False)
+    refprop_utils.configurar_cache_rprop(activa=True)
+
+def _ciclos_propano(monkeypatch) -> list[str]:
+    calculados = []
+    original = ciclo.calcular_ciclo_basico
+    def contar(fluido, mezcla, water_config):
+        calculados.append(water_config)
+        return original(fluido, mezcla, water_config)
+    monkeypatch.setattr(ciclo, "calcular_ciclo_basico", contar)
+    return calculados
+
+def test_valores_guardados_en_disco(referencia, monkeypatch):
+    calculados = _ciclos_propano(monkeypatch)
+    valores = ciclo.calcular_valores_referencia("intermedia")
+    ciclo.VALORES_REFERENCIA.clear()
+    # Otro proceso (memoria vacía) los lee del fichero sin volver a calcular el ciclo
+    assert ciclo.calcular_valores_referencia("intermedia") == valores
+    assert calculados == ["intermedia"]
+
+def test_invalidar_una_water_config(referencia, monkeypatch):
+    calculados = _ciclos_propano(monkeypatch)
+    ciclo.calcular_valores_referencia("intermedia")
+    ciclo.calcular_valores_referencia("baja")
+    ciclo.invalidar_valores_referencia("intermedia")
+    with open(referencia, encoding="utf-8") as f:
+        assert [dato["water_config"] for dato in json.load(f).values()] == ["baja"]
+    ciclo.calcular_valores_referencia("intermedia")
+    ciclo.calcular_valores_referencia("baja")
+    assert calculados == ["intermedia", "baja", "intermedia"]
+
+    ciclo.invalidar_valores_referencia()
+    assert not os.path.exists(referencia)
+
+def test_modos_de_refprop_en_la_clave(referencia):
+    claves = {ciclo._clave_referencia("intermedia")}
+    refprop_utils.activar_splines_saturacion(True)
+    claves.add(ciclo._clave_referencia("intermedia"))
+    refprop_utils.configurar_cache_rprop(activa=False)
+    claves.add(ciclo._clave_referencia("intermedia"))
+    assert len(claves) == 3
+
+def test_clave_sin_refprop_cargado(referencia, monkeypatch):
+    monkeypatch.setattr(refprop_utils, "RP", None)
+    assert json.loads(ciclo._clave_referencia("intermedia"))["version_refprop"] is None